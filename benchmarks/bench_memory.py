@@ -0,0 +1,77 @@
+import os
+import sys
+import tracemalloc
+from io import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from synthetic import generate
+
+from pysubconv.formats.base import Metadata
+from pysubconv.formats.srt import SrtFormat
+from pysubconv.utils.token import Token, TokenType, TextToken, StyleToken
+from pysubconv.utils.tokenizer import Tokenizer
+
+# the previous token layout: a __dict__ and a children list per token and a
+# new object for every line break, end and closing style
+class LegacyToken:
+    def __init__(self, type, parent = None):
+        self.parent = parent
+        self.type = type
+        self.children = list()
+
+    def append(self, child):
+        child.parent = self
+        self.children.append(child)
+        return child
+
+class LegacyTextToken(LegacyToken):
+    def __init__(self, data = None):
+        super().__init__(TokenType.TEXT)
+        self.data = data
+
+class LegacyStyleToken(LegacyToken):
+    def __init__(self, format_class, style_type, style_data = None, format_data = None):
+        super().__init__(TokenType.STYLE)
+        self.format_class = format_class
+        self.style_type = style_type
+        self.style_data = style_data
+        self.format_data = format_data
+
+def copy_tree(token, token_class, text_class, style_class, share_leaves):
+    if share_leaves and token.parent is None and token.type != TokenType.ROOT:
+        return token
+    if token.type == TokenType.TEXT:
+        copy = text_class(token.data)
+    elif token.type == TokenType.STYLE:
+        copy = style_class(token.format_class, token.style_type, token.style_data, token.format_data)
+    else:
+        copy = token_class(token.type)
+
+    for c in token.children:
+        copy.append(copy_tree(c, token_class, text_class, style_class, share_leaves))
+    return copy
+
+# both layouts are measured by copying the same trees, so text data is shared
+# and only the token objects are counted
+def measure(trees, *args):
+    tracemalloc.start()
+    copies = [copy_tree(t, *args) for t in trees]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, len(copies)
+
+def main(cues = 50000):
+    trees = [Tokenizer.tokenize(c) for c in SrtFormat.parse_cue(StringIO(generate('srt', cues, 'font')), Metadata())]
+    tokens = sum(1 for t in trees for _ in Token.depth_first_generator(t))
+
+    legacy, _ = measure(trees, LegacyToken, LegacyTextToken, LegacyStyleToken, False)
+    compact, _ = measure(trees, Token, TextToken, StyleToken, True)
+
+    print('{0} cues, {1} tokens'.format(cues, tokens))
+    print('{0:>8} {1:>10.1f} MiB {2:>8.1f} B/token'.format('legacy', legacy / 2 ** 20, legacy / tokens))
+    print('{0:>8} {1:>10.1f} MiB {2:>8.1f} B/token'.format('compact', compact / 2 ** 20, compact / tokens))
+    print('{0:>8} {1:>10.1f}x'.format('ratio', legacy / compact))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
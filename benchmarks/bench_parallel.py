@@ -0,0 +1,36 @@
+import os
+import sys
+import time
+from io import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from synthetic import STYLES, generate
+
+from pysubconv import convert
+
+# Compares a serial convert() from SRT to MicroDVD with jobs > 1. The CPU
+# time of the parent process is the serial part of a parallel conversion,
+# serial time / parent CPU time bounds the speedup with unlimited cores,
+# so the bound is meaningful on machines with fewer cores than jobs too.
+
+class NullStream:
+    def write(self, text):
+        pass
+
+def measure(text, jobs):
+    started = time.perf_counter()
+    cpu = time.process_time()
+    convert(StringIO(text), 'srt', 'microdvd', NullStream(), jobs=jobs)
+    return time.perf_counter() - started, time.process_time() - cpu
+
+def main(cues = 20000, jobs = 4):
+    print('{0:>8} {1:>10} {2:>12} {3:>14} {4:>8}'.format('style', 'serial s', 'parallel s', 'parent cpu s', 'bound'))
+    for style in STYLES:
+        text = generate('srt', cues, style)
+        serial = measure(text, 1)[0]
+        wall, parent = measure(text, jobs)
+        print('{0:>8} {1:>10.2f} {2:>12.2f} {3:>14.2f} {4:>7.1f}x'.format(style, serial, wall, parent, serial / parent))
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
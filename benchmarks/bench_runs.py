@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import tracemalloc
+from io import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from synthetic import STYLES, generate
+
+from pysubconv import convert
+from pysubconv.formats.base import Metadata
+from pysubconv.formats.srt import SrtFormat
+from pysubconv.utils.runs import StyleRuns
+from pysubconv.utils.tokenizer import Tokenizer
+
+# Compares the token tree and the flat style runs of the same cues: the peak
+# of the memory allocated while building the model of one cue, averaged
+# over the cues, and the cues/sec of a full convert() to MicroDVD with
+# either style model. Runs are smaller and faster for plain cues only, cues
+# with styles allocate about as much and convert 5-20% slower.
+
+class NullStream:
+    def write(self, text):
+        pass
+
+def peak_allocations(build, cues):
+    total = 0
+    tracemalloc.start()
+    for cue in cues:
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        model = build(cue)
+        total += tracemalloc.get_traced_memory()[1] - current
+        del model
+    tracemalloc.stop()
+    return total / len(cues)
+
+def rate(text, style_model, repeat = 3):
+    best = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = convert(StringIO(text), 'srt', 'microdvd', NullStream(), style_model=style_model)
+        best = max(best, count / (time.perf_counter() - started))
+    return best
+
+def main(cues = 10000):
+    print('{0:>8} {1:>6} {2:>12} {3:>12}'.format('style', 'model', 'peak B/cue', 'cues/sec'))
+    for style in STYLES:
+        text = generate('srt', cues, style)
+        parsed = list(SrtFormat.parse_cue(StringIO(text), Metadata()))
+        for model, build in (('tree', Tokenizer.tokenize), ('runs', StyleRuns.from_cue)):
+            print('{0:>8} {1:>6} {2:>12.1f} {3:>12.0f}'.format(style, model, peak_allocations(build, parsed), rate(text, model)))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,71 @@
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pysubconv.formats import format_registry
+from pysubconv.formats.base import Cue
+from pysubconv.utils.token import Token, TokenType, TextToken
+from pysubconv.utils.tokenizer import Tokenizer
+
+# the previous tokenizer: one re.search per style pattern and format on every
+# iteration, slicing the consumed part off the line and looking formats up
+# on every match
+def legacy_first_style_match(sf, text, current):
+    if not sf.can_match(current):
+        return None
+
+    matches = [m for m in (style_re.search(text) for style_re, handler in sf.style_patterns) if m]
+    if not matches:
+        return None
+    return min(matches, key=lambda o: o.start())
+
+def legacy_tokenize(cue):
+    root = Token(TokenType.ROOT)
+    current = root
+
+    lines = cue.text.split('\n')
+    for index, line in enumerate(lines):
+        while line:
+            matches = [(sf, legacy_first_style_match(sf, line, current)) for sf in format_registry]
+            matches = [m for m in matches if m[1] is not None]
+
+            if not matches:
+                current.append(TextToken(line))
+                break
+
+            best_format, best_match = min(matches, key=lambda o: o[1].start())
+            if best_match.start() > 0:
+                current.append(TextToken(line[0:best_match.start()]))
+            line = line[best_match.end():]
+
+            # the sliced line needs a match positioned at 0 for process_match
+            current = best_format.process_match(best_match.re.match(best_match.string, best_match.start()), current)
+
+        if index < len(lines) - 1:
+            current = Tokenizer.process_closing_token(current, TokenType.NEWLINE)
+
+    Tokenizer.process_closing_token(current, TokenType.END)
+    return root
+
+def styled_text(styles_per_line, lines=2):
+    word = '<i>Hello</i> <b>there</b> <font color="#0080FF">you</font> '
+    return '\n'.join([word * (styles_per_line // 3)] * lines)
+
+def main():
+    print('{0:>16} {1:>12} {2:>12} {3:>8}'.format('styles per line', 'legacy (ms)', 'scanner (ms)', 'speedup'))
+    for styles in (3, 30, 150, 600):
+        cue = Cue(1, None, None, styled_text(styles))
+        number = max(1, 600 // styles)
+
+        legacy_tokens = [repr(t) for t in Token.depth_first_generator(legacy_tokenize(cue))]
+        assert legacy_tokens == [repr(t) for t in Token.depth_first_generator(Tokenizer.tokenize(cue))]
+
+        legacy = min(timeit.repeat(lambda: legacy_tokenize(cue), number=number, repeat=3)) / number
+        scanner = min(timeit.repeat(lambda: Tokenizer.tokenize(cue), number=number, repeat=3)) / number
+
+        print('{0:>16} {1:>12.3f} {2:>12.3f} {3:>7.1f}x'.format(styles, legacy * 1000, scanner * 1000, legacy / scanner))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from io import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from synthetic import FORMATS, STYLES, generate
+
+from pysubconv import convert
+from pysubconv.formats import format_registry
+from pysubconv.formats.base import Metadata
+from pysubconv.utils.tokenizer import Tokenizer
+
+# Times parse_cue, Tokenizer.tokenize and write_cue separately for every
+# from -> to format pair on synthetic inputs and reports cues/sec per stage
+# and the peak memory of a full convert().
+#
+#   python benchmarks/run.py --sizes 1000,100000 --styles plain,font
+#   python benchmarks/run.py --save       store the results as the baseline
+#   python benchmarks/run.py --compare    fail on regressions against it
+#
+# Baselines depend on the machine, store them on the one that compares.
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+class NullStream:
+    def write(self, text):
+        pass
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+# stage rates are the best of repeat runs
+def run_case(from_name, to_name, cues, style, memory = True, repeat = 3):
+    metadata = Metadata()
+    metadata.fps = 25
+    from_format = format_registry.get(from_name)
+    to_format = format_registry.get(to_name)
+    text = generate(from_name, cues, style)
+
+    def tokenize():
+        for cue in parsed:
+            cue.tree = Tokenizer.tokenize(cue)
+
+    def write():
+        out = NullStream()
+        for cue in parsed:
+            to_format.write_cue(cue, metadata, out)
+
+    result = {'parse': 0, 'tokenize': 0, 'write': 0}
+    for _ in range(repeat):
+        parsed, parse_time = timed(lambda: list(from_format.parse_cue(StringIO(text), metadata)))
+        _, tokenize_time = timed(tokenize)
+        _, write_time = timed(write)
+
+        result['parse'] = max(result['parse'], cues / parse_time)
+        result['tokenize'] = max(result['tokenize'], cues / tokenize_time)
+        result['write'] = max(result['write'], cues / write_time)
+
+    if memory:
+        del parsed
+        tracemalloc.start()
+        convert(StringIO(text), from_format, to_format, NullStream(), metadata)
+        result['peak_kib'] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+
+    return result
+
+def case_name(from_name, to_name, cues, style):
+    return '{0}->{1} {2} {3}'.format(from_name, to_name, cues, style)
+
+def main():
+    parser = argparse.ArgumentParser(description='pysubconv benchmarks')
+    parser.add_argument('--sizes', default='1000', help='comma separated cue counts')
+    parser.add_argument('--styles', default=','.join(STYLES), help='comma separated style densities')
+    parser.add_argument('--formats', default=','.join(FORMATS), help='comma separated formats')
+    parser.add_argument('--repeat', type=int, default=3, help='timing runs per case, the best one counts')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory measurement')
+    parser.add_argument('--save', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--compare', action='store_true', help='compare against the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown')
+    args = parser.parse_args()
+
+    formats = args.formats.split(',')
+    results = {}
+    print('{0:<32} {1:>12} {2:>12} {3:>12} {4:>10}'.format('case', 'parse/s', 'tokenize/s', 'write/s', 'peak KiB'))
+    for cues in [int(n) for n in args.sizes.split(',')]:
+        for style in args.styles.split(','):
+            for from_name in formats:
+                for to_name in formats:
+                    name = case_name(from_name, to_name, cues, style)
+                    result = results[name] = run_case(from_name, to_name, cues, style, not args.no_memory, args.repeat)
+                    print('{0:<32} {1:>12.0f} {2:>12.0f} {3:>12.0f} {4:>10}'.format(
+                        name, result['parse'], result['tokenize'], result['write'],
+                        '{0:.0f}'.format(result['peak_kib']) if 'peak_kib' in result else '-'))
+
+    if args.save:
+        with open(BASELINES, 'w') as f:
+            json.dump({'machine': platform.platform(), 'python': platform.python_version(), 'results': results}, f, indent=1, sort_keys=True)
+
+    if args.compare:
+        if not os.path.exists(BASELINES):
+            print('No baseline stored, run with --save first')
+            return 2
+
+        with open(BASELINES) as f:
+            baselines = json.load(f)['results']
+
+        regressions = []
+        for name, result in results.items():
+            baseline = baselines.get(name)
+            if not baseline:
+                continue
+            for stage in ('parse', 'tokenize', 'write'):
+                if result[stage] < baseline[stage] * (1 - args.tolerance):
+                    regressions.append('{0} {1}: {2:.0f}/s, baseline {3:.0f}/s'.format(name, stage, result[stage], baseline[stage]))
+            if 'peak_kib' in result and 'peak_kib' in baseline and result['peak_kib'] > baseline['peak_kib'] * (1 + args.tolerance):
+                regressions.append('{0} memory: {1:.0f} KiB, baseline {2:.0f} KiB'.format(name, result['peak_kib'], baseline['peak_kib']))
+
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        return 1 if regressions else 0
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+from io import StringIO
+
+# Generates synthetic subtitle files of a given size and style density. Every
+# style is expressed in the closest markup each format supports, MPL2 only
+# knows italics.
+
+STYLES = ('plain', 'italic', 'font', 'multi')
+FORMATS = ('srt', 'microdvd', 'mpl2')
+
+LINES = [
+    ('Hello there!', 'How are you today?'),
+    ('- Who did that?', '- Made him an offer he could not refuse.'),
+    ('Lorem ipsum dolor sit amet,', 'consectetur adipiscing elit.'),
+]
+
+def style_line(format_name, style, line, index):
+    if style == 'plain':
+        return line
+
+    if format_name == 'srt':
+        if style == 'italic':
+            words = line.split(' ')
+            return ' '.join('<i>{0}</i>'.format(w) if i % 2 == 0 else w for i, w in enumerate(words))
+        if style == 'font':
+            return '<font color="#0080FF"><font face="Arial"><i>{0}</i></font></font>'.format(line)
+        if style == 'multi':
+            return '<b><i>{0}</i></b>'.format(line)
+    elif format_name == 'microdvd':
+        if style == 'italic':
+            return '{y:i}' + line
+        if style == 'font':
+            return '{c:$FF8000}{f:Arial}{y:i}' + line
+        if style == 'multi':
+            return ('{Y:i,b}' if index == 0 else '') + line
+    elif format_name == 'mpl2':
+        return '/' + line
+
+    raise Exception('Unknown style: {0}'.format(style))
+
+def write_cue(out, format_name, style, index):
+    start = index * 2500
+    end = start + 2000
+    lines = [style_line(format_name, style, line, i) for i, line in enumerate(LINES[index % len(LINES)])]
+
+    if format_name == 'srt':
+        out.write('{0}\n{1} --> {2}\n{3}\n\n'.format(index + 1, format_srt_time(start), format_srt_time(end), '\n'.join(lines)))
+    elif format_name == 'microdvd':
+        out.write('{{{0}}}{{{1}}}{2}\n'.format(start * 25 // 1000, end * 25 // 1000, '|'.join(lines)))
+    elif format_name == 'mpl2':
+        out.write('[{0}][{1}]{2}\n'.format(start // 100, end // 100, '|'.join(lines)))
+    else:
+        raise Exception('Unknown format: {0}'.format(format_name))
+
+def format_srt_time(ms):
+    return '{:02}:{:02}:{:02},{:03}'.format(ms // 3600000, ms // 60000 % 60, ms // 1000 % 60, ms % 1000)
+
+def write_synthetic(out, format_name, cues, style = 'plain'):
+    for index in range(cues):
+        write_cue(out, format_name, style, index)
+
+def generate(format_name, cues, style = 'plain'):
+    out = StringIO()
+    write_synthetic(out, format_name, cues, style)
+    return out.getvalue()
@@ -0,0 +1,126 @@
+import asyncio
+import codecs
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from .formats.base import Metadata
+from .formats.detect import SNIFF_LINES, detect_format
+from .pipeline import CHUNK_SIZE, get_format, render_cues
+
+# cues tokenized and written per step of convert_async
+BATCH_SIZE = 64
+
+# Yields the '\n' terminated lines of an async iterator of bytes or str
+# chunks of any size, e.g. an asyncio.StreamReader, decoding bytes
+# incrementally.
+async def iter_lines(chunks, encoding = 'utf-8'):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    async for chunk in chunks:
+        if isinstance(chunk, (bytes, bytearray)):
+            chunk = decoder.decode(chunk)
+        if not chunk:
+            continue
+
+        pending += chunk
+        start = 0
+        end = pending.find('\n')
+        while end >= 0:
+            yield pending[start:end + 1]
+            start = end + 1
+            end = pending.find('\n', start)
+        pending = pending[start:]
+
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+# async counterpart of SubtitleFormat.parse_cue over an async iterator of chunks
+async def parse_cue_async(format_class, chunks, metadata, encoding = 'utf-8'):
+    parser = format_class.create_parser(metadata)
+    async for line in iter_lines(chunks, encoding):
+        cue = parser.feed(line)
+        if cue is not None:
+            yield cue
+
+    cue = parser.close()
+    if cue is not None:
+        yield cue
+
+async def prepend(items, lines):
+    for item in items:
+        yield item
+    async for line in lines:
+        yield line
+
+# Converts an async iterator of chunks and yields the output in chunks of
+# about chunk_size characters. The input is only read as fast as the output is
+# consumed. Batches of batch_size cues are tokenized and written in executor
+# (None runs them on the loop, yielding control between batches), so
+# concurrent conversions can share one event loop.
+async def convert_async(chunks, from_format, to_format, metadata = None, executor = None,
+                        encoding = 'utf-8', batch_size = BATCH_SIZE, chunk_size = CHUNK_SIZE):
+    metadata = metadata or Metadata()
+    to_format = get_format(to_format)
+    lines = iter_lines(chunks, encoding)
+
+    if from_format is None:
+        prefix = []
+        async for line in lines:
+            prefix.append(line)
+            if len(prefix) >= SNIFF_LINES:
+                break
+        from_format, _ = detect_format(prefix)
+        lines = prepend(prefix, lines)
+    else:
+        from_format = get_format(from_format)
+
+    loop = asyncio.get_running_loop()
+    parser = from_format.create_parser(metadata)
+    batch = []
+    pending = []
+    pending_size = 0
+
+    async def render(cues):
+        if executor is None:
+            await asyncio.sleep(0)
+            return render_cues(cues, to_format, metadata)
+        if isinstance(executor, ThreadPoolExecutor):
+            # executor threads don't get the task's context, with the active stats
+            return await loop.run_in_executor(executor, contextvars.copy_context().run, render_cues, cues, to_format, metadata)
+        return await loop.run_in_executor(executor, render_cues, cues, to_format, metadata)
+
+    async for line in lines:
+        cue = parser.feed(line)
+        if cue is None:
+            continue
+
+        batch.append(cue)
+        if len(batch) >= batch_size:
+            output = await render(batch)
+            batch = []
+
+            pending.append(output)
+            pending_size += len(output)
+            if pending_size >= chunk_size:
+                yield ''.join(pending)
+                pending = []
+                pending_size = 0
+
+    cue = parser.close()
+    if cue is not None:
+        batch.append(cue)
+    if batch:
+        pending.append(await render(batch))
+
+    output = ''.join(pending)
+    if output:
+        yield output
+
+# Converts an asyncio.StreamReader into an asyncio.StreamWriter, waiting for
+# the writer to drain after every chunk.
+async def convert_stream_async(reader, writer, from_format, to_format, metadata = None, executor = None,
+                               encoding = 'utf-8', **options):
+    async for chunk in convert_async(reader, from_format, to_format, metadata, executor, encoding, **options):
+        writer.write(chunk.encode(encoding))
+        await writer.drain()
@@ -0,0 +1,300 @@
+import struct
+import sys
+from array import array
+from enum import Enum
+
+from .formats import format_registry
+from .formats.base import Cue, Metadata
+from .pipeline import CHUNK_SIZE, ChunkedWriter, get_format
+from .utils.token import StyleType, Token, TokenType, unflatten_tree
+
+# Compact binary form of parsed and tokenized cues, all numbers little endian:
+#
+#   header   32 bytes: magic b'PSCB', version u16, 0 u16, cue count n u32,
+#            token count t u32, string count s u32, string data size d u32,
+#            8 zero bytes
+#   index    n x i64, the cue index or -1 for None
+#   start    n x i64, milliseconds
+#   end      n x i64, milliseconds
+#   text     n x u32, string id of the cue text
+#   cues     n + 1 x u32, first token of every cue, the last is t
+#   tokens   t x 4 u32 records of the pre-order token trees:
+#              type | style type << 8 | data kind << 16, TokenType and StyleType values
+#              child count
+#              data, a string id for TEXT, style data of the data kind for STYLE
+#              style format, string id of 'format name' or
+#              'format name:Enum.member' with the format data, e.g.
+#              'microdvd:StyleRange.ALL', NONE for other tokens
+#   strings  s + 1 x u32 offsets into the string data, then d bytes of UTF-8
+#
+# Strings are stored once however often they are used. Columns are read
+# through memoryviews of the buffer, nothing is copied on load.
+
+MAGIC = b'PSCB'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIII8x')
+
+# u32 words of a token record
+RECORD_SIZE = 4
+
+# no string
+NONE = 0xFFFFFFFF
+
+# kinds of style data: None, a string id or a 0xRRGGBB color
+DATA_NONE = 0
+DATA_STRING = 1
+DATA_COLOR = 2
+
+TOKEN_TYPES = {t.value: t for t in TokenType}
+STYLE_TYPES = {t.value: t for t in StyleType}
+
+class StringTable:
+    def __init__(self):
+        self.ids = {}
+        self.offsets = array('I', [0])
+        self.data = bytearray()
+
+    def add(self, text):
+        id = self.ids.get(text)
+        if id is None:
+            id = self.ids[text] = len(self.ids)
+            self.data += text.encode('utf-8', 'surrogatepass')
+            self.offsets.append(len(self.data))
+        return id
+
+def little_endian(values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+# returns the binary form of cues, tokenizing them unless they are already
+def dump(cues):
+    strings = StringTable()
+    index, start, end = array('q'), array('q'), array('q')
+    texts, offsets, records = array('I'), array('I', [0]), array('I')
+
+    for cue in cues:
+        index.append(-1 if cue.index is None else cue.index)
+        start.append(cue.start_ms)
+        end.append(cue.end_ms)
+        texts.append(strings.add(cue.text))
+
+        for token in Token.depth_first_generator(cue.tree):
+            records.extend(encode_token(token, strings))
+        offsets.append(len(records) // RECORD_SIZE)
+
+    sections = [index, start, end, texts, offsets, records, strings.offsets]
+    header = HEADER.pack(MAGIC, VERSION, 0, len(index), len(records) // RECORD_SIZE, len(strings.ids), len(strings.data))
+    return b''.join([header] + [little_endian(s) for s in sections] + [bytes(strings.data)])
+
+def encode_token(token, strings):
+    if token.type == TokenType.TEXT:
+        return (TokenType.TEXT.value | DATA_STRING << 16, 0, strings.add(token.data), NONE)
+    if token.type != TokenType.STYLE:
+        return (token.type.value, len(token.children), 0, NONE)
+
+    data = token.style_data
+    if data is None:
+        kind, data = DATA_NONE, 0
+    elif isinstance(data, str):
+        kind, data = DATA_STRING, strings.add(data)
+    elif isinstance(data, tuple) and len(data) == 3:
+        kind, data = DATA_COLOR, data[0] << 16 | data[1] << 8 | data[2]
+    else:
+        raise Exception('Unsupported style data: {0!r}'.format(data))
+
+    # format data is None or an Enum defined on the format class, e.g. MicroDVDFormat.StyleRange
+    style_format = token.format_class.name
+    format_data = token.format_data
+    if isinstance(format_data, Enum):
+        style_format += ':' + type(format_data).__name__ + '.' + format_data.name
+    elif format_data is not None:
+        raise Exception('Unsupported format data: {0!r}'.format(format_data))
+
+    return (TokenType.STYLE.value | token.style_type.value << 8 | kind << 16, len(token.children), data, strings.add(style_format))
+
+# Cues loaded from the binary form in a bytes-like buffer (bytes, mmap or a
+# memoryview). Writers read the columns through CueView and TokenView
+# flyweights, so no Cue or Token objects are built; cue(i) rebuilds a Cue.
+class BinaryCues:
+    def __init__(self, buffer):
+        view = memoryview(buffer).cast('B')
+        if len(view) < HEADER.size:
+            raise Exception('Not a binary cue file')
+
+        magic, version, flags, count, token_count, string_count, string_size = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise Exception('Not a binary cue file')
+        if version != VERSION:
+            raise Exception('Unsupported binary cue file version: {0}'.format(version))
+
+        self.count = count
+        self.token_count = token_count
+        self.cache = {}
+        self.style_formats = {}
+
+        pos = HEADER.size
+        def column(typecode, length):
+            nonlocal pos
+            size = length * array(typecode).itemsize
+            if pos + size > len(view):
+                raise Exception('Truncated binary cue file')
+
+            data = view[pos:pos + size]
+            pos += size
+            if sys.byteorder != 'little':
+                values = array(typecode, data)
+                values.byteswap()
+                return values
+            return data.cast(typecode)
+
+        self.index = column('q', count)
+        self.start = column('q', count)
+        self.end = column('q', count)
+        self.text = column('I', count)
+        self.offsets = column('I', count + 1)
+        self.records = column('I', token_count * RECORD_SIZE)
+        self.string_offsets = column('I', string_count + 1)
+        if pos + string_size > len(view):
+            raise Exception('Truncated binary cue file')
+        self.string_data = view[pos:pos + string_size]
+
+    def __len__(self):
+        return self.count
+
+    # strings are decoded once, on first use
+    def get_string(self, id):
+        text = self.cache.get(id)
+        if text is None:
+            text = self.cache[id] = str(self.string_data[self.string_offsets[id]:self.string_offsets[id + 1]], 'utf-8', 'surrogatepass')
+        return text
+
+    # yields the same TokenView moved over the pre-order tokens of cue i
+    def iter_tokens(self, i, view = None):
+        view = view or TokenView(self)
+        for position in range(self.offsets[i], self.offsets[i + 1]):
+            view.base = position * RECORD_SIZE
+            yield view
+
+    def iter_views(self):
+        view = CueView(self)
+        for i in range(self.count):
+            view.position = i
+            yield view
+
+    # returns (format class, format data) of a style format string id
+    def get_style_format(self, id):
+        style_format = self.style_formats.get(id)
+        if style_format is None:
+            name, separator, format_data = self.get_string(id).partition(':')
+            format_class = format_registry.get(name)
+            if format_data:
+                enum_name, member = format_data.split('.')
+                format_data = getattr(format_class, enum_name)[member]
+            style_format = self.style_formats[id] = (format_class, format_data or None)
+        return style_format
+
+    def cue(self, i):
+        cue = Cue(None if self.index[i] < 0 else self.index[i], self.start[i], self.end[i], self.get_string(self.text[i]))
+        cue.tree = unflatten_tree(self.flat_records(i))
+        return cue
+
+    def cues(self):
+        for i in range(self.count):
+            yield self.cue(i)
+
+    # the records of cue i in the form of flatten_tree
+    def flat_records(self, i):
+        records = []
+        for token in self.iter_tokens(i):
+            if token.type == TokenType.TEXT:
+                records.append((TokenType.TEXT.value, token.data))
+            elif token.type == TokenType.STYLE:
+                records.append((TokenType.STYLE.value, token.children, token.style_type.value, token.style_data,
+                                token.format_class, token.format_data))
+            else:
+                records.append((token.type.value, token.children))
+        return records
+
+    # writes every cue straight from the buffer, returns the number of cues
+    def write(self, to_format, out_stream, metadata = None, chunk_size = CHUNK_SIZE):
+        metadata = metadata or Metadata()
+        to_format = get_format(to_format)
+        out = ChunkedWriter(out_stream, chunk_size)
+        token = TokenView(self)
+        for cue in self.iter_views():
+            to_format.write_cue(cue, metadata, out, self.iter_tokens(cue.position, token))
+        out.flush()
+        return self.count
+
+# Flyweight of the cue at position, with the attributes writers use
+class CueView:
+    __slots__ = ('cues', 'position')
+
+    def __init__(self, cues, position = 0):
+        self.cues = cues
+        self.position = position
+
+    @property
+    def index(self):
+        index = self.cues.index[self.position]
+        return None if index < 0 else index
+
+    @property
+    def start_ms(self):
+        return self.cues.start[self.position]
+
+    @property
+    def end_ms(self):
+        return self.cues.end[self.position]
+
+    @property
+    def text(self):
+        return self.cues.get_string(self.cues.text[self.position])
+
+# Flyweight of the token record starting at base, with the attributes of
+# TextToken and StyleToken. Only valid until it is moved to the next token.
+class TokenView:
+    __slots__ = ('cues', 'records', 'base')
+
+    def __init__(self, cues):
+        self.cues = cues
+        self.records = cues.records
+        self.base = 0
+
+    @property
+    def type(self):
+        return TOKEN_TYPES[self.records[self.base] & 0xFF]
+
+    @property
+    def children(self):
+        return self.records[self.base + 1]
+
+    @property
+    def data(self):
+        return self.cues.get_string(self.records[self.base + 2])
+
+    @property
+    def style_type(self):
+        return STYLE_TYPES[self.records[self.base] >> 8 & 0xFF]
+
+    @property
+    def style_data(self):
+        kind = self.records[self.base] >> 16 & 0xFF
+        data = self.records[self.base + 2]
+        if kind == DATA_STRING:
+            return self.cues.get_string(data)
+        if kind == DATA_COLOR:
+            return (data >> 16, data >> 8 & 0xFF, data & 0xFF)
+        return None
+
+    @property
+    def format_class(self):
+        id = self.records[self.base + 3]
+        return None if id == NONE else self.cues.get_style_format(id)[0]
+
+    @property
+    def format_data(self):
+        id = self.records[self.base + 3]
+        return None if id == NONE else self.cues.get_style_format(id)[1]
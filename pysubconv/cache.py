@@ -0,0 +1,98 @@
+import hashlib
+import os
+import tempfile
+
+# On-disk cache of conversion outputs, content addressed by the input text,
+# the formats, the metadata and the library version. Entries are written to a
+# temporary file and renamed, so several processes can share a directory.
+# When the total size exceeds max_size the least recently used entries,
+# by modification time which hits refresh, are removed.
+class ConversionCache:
+    def __init__(self, directory, max_size = 256 * 2 ** 20):
+        self.directory = directory
+        self.max_size = max_size
+        # estimate of the directory size, only rescanned when it exceeds max_size
+        self.size = None
+        os.makedirs(directory, exist_ok=True)
+
+    # text is the input text or its raw bytes-like buffer together with the encoding
+    @staticmethod
+    def key(text, from_format, to_format, metadata, encoding = None):
+        from . import __version__
+
+        h = hashlib.sha256()
+        description = [__version__, from_format.name, to_format.name] + ['{0}={1!r}'.format(k, v) for k, v in sorted(vars(metadata).items())]
+        if encoding is not None:
+            description.append('encoding=' + encoding)
+        h.update('\0'.join(description).encode('utf-8'))
+        h.update(b'\0')
+        h.update(text.encode('utf-8', 'surrogatepass') if isinstance(text, str) else text)
+        return h.hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    # returns (cue count, output) or None
+    def get(self, key):
+        path = self.get_path(key)
+        try:
+            with open(path, encoding='utf-8', newline='') as f:
+                count = int(f.readline())
+                output = f.read()
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        return count, output
+
+    def put(self, key, count, output):
+        path = self.get_path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, partial = tempfile.mkstemp(dir=directory, prefix='.', suffix='.part')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+                f.write('{0}\n'.format(count))
+                f.write(output)
+            os.replace(partial, path)
+        except BaseException:
+            os.remove(partial)
+            raise
+
+        if self.size is None:
+            self.size = self.scan_size()
+        else:
+            self.size += os.path.getsize(path)
+
+        if self.size > self.max_size:
+            self.evict()
+
+    def entries(self):
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def scan_size(self):
+        return sum(size for mtime, size, path in self.entries())
+
+    # removes the least recently used entries until the cache fits in 90% of max_size
+    def evict(self):
+        entries = sorted(self.entries())
+        size = sum(size for mtime, size, path in entries)
+        for mtime, entry_size, path in entries:
+            if size <= self.max_size * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= entry_size
+        self.size = size
@@ -0,0 +1,231 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import chain
+
+from .cache import ConversionCache
+from .formats import format_registry
+from .formats.base import Metadata
+from .follow import follow
+from .pipeline import convert_buffer
+from .reader import map_file
+from .utils.instrumentation import Stats, collect_stats
+from .validate import Validator
+
+# issues of a file printed by --validate
+MAX_PRINTED_ISSUES = 10
+
+def find_inputs(patterns, extensions):
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, dirs, files in os.walk(pattern):
+                dirs.sort()
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in extensions:
+                        paths.append((os.path.join(root, name), pattern))
+        elif os.path.isfile(pattern):
+            paths.append((pattern, None))
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                raise Exception('No such file: {0}'.format(pattern))
+            base = glob_base(pattern)
+            paths.extend((path, base) for path in matches if os.path.isfile(path))
+
+    # keep the first occurrence of every file
+    seen = set()
+    return [(path, base) for path, base in paths if not (os.path.abspath(path) in seen or seen.add(os.path.abspath(path)))]
+
+# the leading directories of a glob pattern without wildcards, the outputs
+# of its matches keep their path below it
+def glob_base(pattern):
+    base = os.path.dirname(pattern)
+    while glob.has_magic(base):
+        base = os.path.dirname(base)
+    return base or os.curdir
+
+# output files mirror the input directory tree below output_dir
+def get_output_path(path, base, output_dir, to_format):
+    stem = os.path.splitext(path)[0]
+    output = stem + to_format.extensions[0]
+    if os.path.abspath(output) == os.path.abspath(path):
+        output = stem + '.' + to_format.name + to_format.extensions[0]
+
+    if output_dir:
+        relative = os.path.relpath(output, base) if base else os.path.basename(output)
+        output = os.path.join(output_dir, relative)
+    return output
+
+# ConversionCache per (directory, size in MiB) of the process, so its size
+# estimate is kept between files and the directory only scanned once
+caches = {}
+
+def get_cache(cache_dir, cache_size = None):
+    cache = caches.get((cache_dir, cache_size))
+    if cache is None:
+        cache = ConversionCache(cache_dir, cache_size * 2 ** 20) if cache_size else ConversionCache(cache_dir)
+        caches[(cache_dir, cache_size)] = cache
+    return cache
+
+# runs in the worker processes, so it only takes picklable arguments;
+# encoding=None sniffs the input encoding, the output is written in
+# output_encoding, by default UTF-8.
+# validate is None, 'check' or 'fix', a file with errors left fails
+def convert_file(path, output, from_name, to_name, fps, encoding, jobs = 1, stats = False, cache_dir = None, cache_size = None,
+                 output_encoding = None, validate = None):
+    if stats:
+        with collect_stats() as collected:
+            result = convert_file(path, output, from_name, to_name, fps, encoding, jobs, False, cache_dir, cache_size, output_encoding,
+                                  validate)
+        return result[:5] + (collected,)
+
+    started = time.perf_counter()
+    try:
+        metadata = Metadata()
+        if fps:
+            metadata.fps = fps
+
+        cache = get_cache(cache_dir, cache_size) if cache_dir else None
+
+        directory = os.path.dirname(output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        validator = Validator(fix=validate == 'fix') if validate else None
+
+        # failed conversions must not leave partial output behind
+        partial = output + '.part'
+        try:
+            with map_file(path) as buffer, open(partial, 'w', encoding=output_encoding or 'utf-8') as out_stream:
+                count = convert_buffer(buffer, from_name, to_name, out_stream, metadata, encoding, jobs=jobs, cache=cache,
+                                       validator=validator)
+            if validator is not None:
+                print_issues(path, validator.report)
+                errors = validator.report.errors
+                if errors:
+                    raise Exception('{0} invalid cues, first {1}'.format(len(errors), errors[0]))
+            os.replace(partial, output)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+
+        return path, output, count, None, time.perf_counter() - started, None
+    except Exception as e:
+        return path, output, 0, '{0}: {1}'.format(type(e).__name__, e), time.perf_counter() - started, None
+
+def print_issues(path, report):
+    for issue in report.issues[:MAX_PRINTED_ISSUES]:
+        print('{0}: {1}'.format(path, issue), file=sys.stderr)
+    if len(report.issues) > MAX_PRINTED_ISSUES:
+        print('{0}: {1} more issues'.format(path, len(report.issues) - MAX_PRINTED_ISSUES), file=sys.stderr)
+
+def parse_args(args):
+    names = [sf.name for sf in format_registry]
+
+    parser = argparse.ArgumentParser(prog='pysubconv', description='Convert subtitle files between formats.')
+    parser.add_argument('inputs', nargs='+', help='input files, glob patterns or directories')
+    parser.add_argument('-t', '--to', required=True, choices=names, help='target format')
+    parser.add_argument('-f', '--from', dest='from_format', choices=names, help='input format, detected when omitted')
+    parser.add_argument('-o', '--output-dir', help='output directory, next to the inputs when omitted')
+    parser.add_argument('--fps', type=float, help='frame rate of frame based formats')
+    parser.add_argument('--encoding', help='encoding of the input files, detected when omitted')
+    parser.add_argument('--output-encoding', help='encoding of the output files, UTF-8 when omitted')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes, 0 uses every core')
+    parser.add_argument('--cache-dir', help='directory of a conversion cache shared between runs')
+    parser.add_argument('--cache-size', type=float, help='cache size limit in MiB, 256 by default')
+    parser.add_argument('--stats', action='store_true', help='print counters and timings of the conversion stages')
+    parser.add_argument('--validate', action='store_true', help='check the cues for overlaps, bad times and order, files with errors fail')
+    parser.add_argument('--fix', action='store_true', help='like --validate, but reorder, clip and renumber the cues where possible')
+    parser.add_argument('--follow', action='store_true', help='keep converting cues appended to a single input until interrupted')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only print failures and the summary')
+    return parser.parse_args(args)
+
+def main(args = None):
+    args = parse_args(sys.argv[1:] if args is None else args)
+    to_format = format_registry.get(args.to)
+
+    extensions = set(format_registry.extensions)
+    try:
+        inputs = find_inputs(args.inputs, extensions)
+    except Exception as e:
+        print('pysubconv: {0}'.format(e), file=sys.stderr)
+        return 2
+
+    if args.follow:
+        if len(inputs) != 1:
+            print('pysubconv: --follow takes a single input file', file=sys.stderr)
+            return 2
+        return follow_file(inputs[0][0], get_output_path(*inputs[0], args.output_dir, to_format), args)
+
+    # inputs with the same output, e.g. a.srt and a.txt, fail after the first
+    tasks = []
+    conflicts = []
+    outputs = {}
+    for path, base in inputs:
+        output = get_output_path(path, base, args.output_dir, to_format)
+        first = outputs.setdefault(os.path.abspath(output), path)
+        if first == path:
+            tasks.append((path, output, args.from_format, args.to, args.fps, args.encoding))
+        else:
+            conflicts.append((path, output, 0, 'output {0} is also written from {1}'.format(output, first), 0, None))
+    options = {'stats': args.stats, 'cache_dir': args.cache_dir, 'cache_size': args.cache_size, 'output_encoding': args.output_encoding,
+               'validate': 'fix' if args.fix else 'check' if args.validate else None}
+
+    jobs = args.jobs or os.cpu_count() or 1
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(convert_file, *task, **options) for task in tasks]
+            results = report(inputs, chain(conflicts, (f.result() for f in as_completed(futures))), args.quiet)
+    else:
+        # a single file is still split over the workers by cue
+        results = report(inputs, chain(conflicts, (convert_file(*task, jobs=jobs, **options) for task in tasks)), args.quiet)
+
+    failed = [r for r in results if r[3]]
+    cues = sum(r[2] for r in results)
+    print('{0} converted, {1} failed, {2} cues'.format(len(results) - len(failed), len(failed), cues), file=sys.stderr)
+
+    if args.stats:
+        total = Stats()
+        for result in results:
+            if result[5]:
+                total.merge(result[5])
+        print(total.report(), file=sys.stderr)
+
+    return 1 if failed else 0
+
+# converts cues as they are appended to path, output is written and flushed as it arrives
+def follow_file(path, output, args):
+    metadata = Metadata()
+    if args.fps:
+        metadata.fps = args.fps
+
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if not args.quiet:
+        print('following {0} -> {1}, interrupt to stop'.format(path, output), file=sys.stderr)
+    try:
+        with open(output, 'w', encoding=args.output_encoding or 'utf-8') as out_stream:
+            count = follow(path, args.from_format, args.to, out_stream, metadata, args.encoding)
+    except Exception as e:
+        print('FAILED {0}: {1}: {2}'.format(path, type(e).__name__, e), file=sys.stderr)
+        return 1
+
+    print('{0} cues'.format(count), file=sys.stderr)
+    return 0
+
+def report(tasks, results, quiet):
+    done = []
+    for path, output, count, error, elapsed, stats in results:
+        done.append((path, output, count, error, elapsed, stats))
+        progress = '[{0}/{1}]'.format(len(done), len(tasks))
+        if error:
+            print('{0} FAILED {1}: {2}'.format(progress, path, error), file=sys.stderr)
+        elif not quiet:
+            print('{0} {1} -> {2} ({3} cues, {4:.2f}s)'.format(progress, path, output, count, elapsed), file=sys.stderr)
+    return done
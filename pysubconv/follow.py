@@ -0,0 +1,176 @@
+import codecs
+import os
+import time
+
+import regex as re
+
+from .formats import format_registry
+from .formats.base import Metadata
+from .formats.detect import SNIFF_LINES, detect_format
+from .pipeline import get_format
+from .reader import get_offset, is_ascii_compatible, sniff_encoding
+
+# seconds between polls of follow
+POLL_INTERVAL = 1.0
+
+NON_ASCII_RE = re.compile(rb'[\x80-\xff]')
+
+# Parses a file that keeps growing, e.g. written by a live encoder. Every
+# poll() reads only the bytes appended since the last one and feeds the
+# complete lines to the format's incremental parser, whose state is kept
+# between polls, so a poll costs O(new data). A file that shrinks was
+# replaced and is read again from the start. Without from_format the format
+# is known from an extension used by a single format or detected from the
+# lines received so far, waiting for more lines while that fails.
+class Follower:
+    def __init__(self, path, from_format = None, metadata = None, encoding = None):
+        self.path = path
+        if from_format is None:
+            candidates = format_registry.get_by_extension(os.path.splitext(path)[1])
+            from_format = candidates[0] if len(candidates) == 1 else None
+        self.from_format = get_format(from_format) if from_format is not None else None
+        self.metadata = metadata or Metadata()
+        self.encoding = encoding
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.decoder = None
+        # whether the encoding was guessed from ASCII data, see start_decoder
+        self.guessed = False
+        # bytes of a line with non-ASCII bytes held until it is complete, see guess_again
+        self.undecoded = b''
+        self.pending = ''
+        # lines kept until there are enough to detect the format
+        self.lines = []
+        self.parser = None
+
+    # returns the cues completed by the data appended since the last poll
+    def poll(self):
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < self.offset:
+                self.reset()
+            f.seek(self.offset)
+            data = f.read()
+        if not data:
+            return []
+        self.offset += len(data)
+
+        if self.decoder is None:
+            data = data[self.start_decoder(data):]
+        elif self.guessed:
+            data = self.guess_again(self.undecoded + data)
+
+        lines = (self.pending + self.decoder.decode(data)).split('\n')
+        self.pending = lines.pop()
+        return self.feed(lines)
+
+    # Creates the decoder of data, the data appended first or since an
+    # encoding was guessed from ASCII data only, and returns the offset of the
+    # text after a byte order mark. A guess from ASCII data is made again
+    # when the first complete line with other bytes arrives.
+    def start_decoder(self, data):
+        encoding = self.encoding
+        if encoding is None:
+            # complete lines only, a character may be cut at the end
+            sample = data[:data.rfind(b'\n') + 1]
+            if not sample or self.guessed and sample.isascii():
+                sample = data
+            encoding, skip = sniff_encoding(sample)
+            self.guessed = sample.isascii() and is_ascii_compatible(encoding)
+        else:
+            skip = get_offset(data, encoding)
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        return skip
+
+    # The data decoded so far was ASCII, which reads the same in any guess.
+    # The encoding is guessed again from the first line of data with other
+    # bytes once it is complete, a cut character would not decode in any
+    # encoding but a single byte one. Returns the data to decode now, the
+    # lines before that one while it is held back.
+    def guess_again(self, data):
+        self.undecoded = b''
+        match = NON_ASCII_RE.search(data)
+        if match is None:
+            return data
+
+        start = data.rfind(b'\n', 0, match.start()) + 1
+        if data.find(b'\n', match.start()) < 0:
+            self.undecoded = data[start:]
+            return data[:start]
+        self.start_decoder(data[start:])
+        return data
+
+    # ends the input, the last cue may not be complete before the file is
+    def close(self):
+        if self.undecoded:
+            self.start_decoder(self.undecoded)
+            self.pending += self.decoder.decode(self.undecoded)
+            self.undecoded = b''
+        lines = [self.pending] if self.pending else []
+        self.pending = ''
+        cues = self.feed(lines, final=True)
+        if self.parser is not None:
+            cue = self.parser.close()
+            if cue is not None:
+                cues.append(cue)
+        return cues
+
+    def feed(self, lines, final = False):
+        if self.parser is None:
+            self.lines.extend(lines)
+            if not self.detect(final):
+                return []
+            lines, self.lines = self.lines, []
+
+        cues = []
+        for line in lines:
+            cue = self.parser.feed(line)
+            if cue is not None:
+                cues.append(cue)
+        return cues
+
+    def detect(self, final):
+        if self.from_format is None:
+            if not self.lines:
+                return False
+            try:
+                self.from_format = detect_format(self.lines)[0]
+            except Exception:
+                if len(self.lines) < SNIFF_LINES and not final:
+                    return False
+                raise
+
+        self.parser = self.from_format.create_parser(self.metadata)
+        return True
+
+# Converts the cues of a growing file to to_format as they are completed,
+# flushing out_stream after every poll with new cues. Runs until stop(), if
+# given, returns True or until KeyboardInterrupt, then converts the rest of
+# the file. Returns the number of cues.
+def follow(path, from_format, to_format, out_stream, metadata = None, encoding = None,
+           interval = POLL_INTERVAL, stop = None):
+    metadata = metadata or Metadata()
+    to_format = get_format(to_format)
+    follower = Follower(path, from_format, metadata, encoding)
+
+    count = 0
+    while True:
+        stopping = stop is not None and stop()
+        cues = follower.poll()
+        if stopping:
+            cues += follower.close()
+
+        for cue in cues:
+            to_format.write_cue(cue, metadata, out_stream)
+        if cues:
+            out_stream.flush()
+        count += len(cues)
+
+        if stopping:
+            return count
+
+        try:
+            time.sleep(interval)
+        except KeyboardInterrupt:
+            stop = lambda: True
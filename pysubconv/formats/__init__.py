@@ -0,0 +1,4 @@
+from .registry import format_registry, register_format
+
+# importing the built-in formats registers them
+from . import microdvd, mpl2, srt
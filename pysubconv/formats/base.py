@@ -1,38 +1,217 @@
+from io import StringIO
+
+from ..utils.timing import to_milliseconds, to_timedelta
+from ..utils.token import Token
+
 # TODO: refactor to parser and writer class? 
 class SubtitleFormat():    
+    # set by FormatRegistry.register
+    name = None
+    extensions = ()
+
+    # (compiled style regex, name of the classmethod creating its tokens),
+    # searched by the tokenizer in priority order
+    style_patterns = ()
+
+    # StyleType -> str.format template of the written style, the token's
+    # style_data is passed as the only argument
+    style_templates = {}
+
+    # characters every match of style_patterns starts with, texts without any
+    # of them skip the style scan; None when any character can start a style
+    trigger_chars = None
+
+    # whether cue times are stored in frames, converted at metadata.fps
+    frame_based = False
+
+    # called once on registration to precompute lookup tables
     @classmethod
-    def parse_cue(cls, stream, metadata):
-        raise NotImplementedError
+    def build_dispatch(cls):
+        cls.match_handlers = {style_re: getattr(cls, handler) for style_re, handler in cls.style_patterns}
 
+    # returns an object with feed(line) and close() methods that return a
+    # completed Cue or None, so parsing can be driven line by line
     @classmethod
-    def write_cue(cls, cue, metadata, out):
+    def create_parser(cls, metadata):
         raise NotImplementedError
 
     @classmethod
-    def get_first_style_match(cls, text, current):
+    def parse_cue(cls, stream, metadata):
+        parser = cls.create_parser(metadata)
+        for line in stream:
+            cue = parser.feed(line)
+            if cue is not None:
+                yield cue
+
+        cue = parser.close()
+        if cue is not None:
+            yield cue
+
+    # yields the cues of an ASCII compatible bytes-like buffer (bytes or
+    # mmap) starting at offset, formats override it to find the cues without
+    # decoding the whole buffer
+    @classmethod
+    def parse_buffer(cls, buffer, metadata, encoding, offset = 0):
+        return cls.parse_cue(StringIO(bytes(buffer[offset:]).decode(encoding), newline=None), metadata)
+
+    # tokens, if given, is the pre-order token list of cue.tree, so several
+    # formats can write a cue from a single traversal. body, if given, is the
+    # output of write_tokens for the cue, rendered before, and is written
+    # instead of the tokens. runs, if given, is the StyleRuns of the cue and
+    # is written with write_runs instead of the tree.
+    @classmethod
+    def write_cue(cls, cue, metadata, out, tokens = None, body = None, runs = None):
         raise NotImplementedError
 
+    # writes the text of cue between the prefix and suffix of write_cue, from
+    # body, runs or tokens as described there
+    @classmethod
+    def write_body(cls, cue, out, tokens = None, body = None, runs = None):
+        if body is not None:
+            out.write(body)
+        elif runs is not None:
+            cls.write_runs(runs, out)
+        else:
+            cls.write_tokens(Token.depth_first_generator(cue.tree) if tokens is None else tokens, out)
+
+    # returns a score in [0, 1] of how well the given leading lines match this format
+    @classmethod
+    def sniff(cls, lines):
+        return 0
+
+    # whether style_patterns may match while current is the innermost open token
+    @classmethod
+    def can_match(cls, current):
+        return True
+
+    @classmethod
+    def has_match_guard(cls):
+        return cls.can_match.__func__ is not SubtitleFormat.can_match.__func__
+
+    @classmethod
+    def has_closing_tokens(cls):
+        return cls.process_closing_token.__func__ is not SubtitleFormat.process_closing_token.__func__
+
     @classmethod
     def process_match(cls, match, current):
-        raise NotImplementedError
+        return cls.match_handlers[match.re](match, current)
 
     @classmethod
     def write_tokens(cls, token_stream, out):
         raise NotImplementedError
 
+    # writes utils.runs.StyleRuns with the same output as write_tokens of the
+    # tree, formats override it to write the runs without tokens
+    @classmethod
+    def write_runs(cls, runs, out):
+        cls.write_tokens(runs.tokens(), out)
+
     @classmethod
     def process_closing_token(cls, current, token):
         return current
 
+# Parser of formats with one cue per line, format_class.parse_line(index, line, metadata) creates the cues
+class LineCueParser:
+    def __init__(self, format_class, metadata):
+        self.format_class = format_class
+        self.metadata = metadata
+        self.index = 0
+
+    def feed(self, line):
+        self.index += 1
+        return self.format_class.parse_line(self.index, line, self.metadata)
+
+    def close(self):
+        return None
+
+# parse_buffer of formats with one cue per line, format_class.cue_bytes_re
+# matches a whole line with start, end and text groups, in this order, and
+# format_class.make_cue(index, start, end, text, metadata) creates the cues.
+# Lines are matched in the raw buffer, only the texts are decoded, and
+# stripped after decoding like the text parser does. A line the byte regex
+# doesn't match, e.g. one starting with non-ASCII whitespace, is
+# decoded and left to format_class.parse_line.
+def parse_line_buffer(format_class, buffer, metadata, encoding, offset = 0):
+    make_cue = format_class.make_cue
+    size = len(buffer)
+    pos = offset
+    index = 0
+    while pos < size:
+        for match in format_class.cue_bytes_re.finditer(buffer, pos):
+            if match.start() != pos:
+                break
+
+            start, end, text = match.groups()
+            index += 1
+            yield make_cue(index, int(start), int(end), text.decode(encoding).rstrip(), metadata)
+            pos = match.end() + 1
+
+        if pos >= size:
+            return
+
+        end = buffer.find(b'\n', pos)
+        end = size if end < 0 else end
+        line = bytes(buffer[pos:end]).decode(encoding)
+        index += 1
+        try:
+            cue = format_class.parse_line(index, line, metadata)
+        except Exception:
+            raise Exception('Invalid line format: {0}'.format(line.strip()))
+        yield cue
+        pos = end + 1
+
 class Metadata:
     def __init__(self):
         self.fps = 23.976
 
-# TODO: refactor 'tree'?
+# start_ms and end_ms are integer milliseconds, start and end are timedelta views of them.
+# tree is the token tree of text, tokenized on first access and cached until text changes.
 class Cue:
     def __init__(self, index, start, end, text):
         self.index = index
-        self.start = start
-        self.end = end
-        self.text = text
-        self.tree = None
\ No newline at end of file
+        self.start_ms = to_milliseconds(start)
+        self.end_ms = to_milliseconds(end)
+        self._text = text
+        self._tree = None
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        self._text = value
+        self._tree = None
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            # imported here, the tokenizer depends on the format registry
+            from ..utils.tokenizer import Tokenizer
+            self._tree = Tokenizer.tokenize(self)
+        return self._tree
+
+    # None drops the cached tree, it is tokenized again on the next access
+    @tree.setter
+    def tree(self, value):
+        self._tree = value
+
+    @property
+    def is_tokenized(self):
+        return self._tree is not None
+
+    @property
+    def start(self):
+        return to_timedelta(self.start_ms)
+
+    @start.setter
+    def start(self, value):
+        self.start_ms = to_milliseconds(value)
+
+    @property
+    def end(self):
+        return to_timedelta(self.end_ms)
+
+    @end.setter
+    def end(self, value):
+        self.end_ms = to_milliseconds(value)
\ No newline at end of file
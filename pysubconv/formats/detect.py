@@ -0,0 +1,23 @@
+from itertools import chain, islice
+
+from .registry import format_registry
+
+# number of leading lines used to guess the format, independent of the file size
+SNIFF_LINES = 32
+
+# returns (format, stream) where stream yields every line of the input again,
+# including the sniffed prefix, without seeking or re-reading the source
+def detect_format(stream, formats=None, max_lines=SNIFF_LINES):
+    stream = iter(stream)
+    prefix = list(islice(stream, max_lines))
+
+    best_format, best_score = None, 0
+    for sf in formats or format_registry:
+        score = sf.sniff(prefix)
+        if score > best_score:
+            best_format, best_score = sf, score
+
+    if not best_format:
+        raise Exception('Could not detect subtitle format')
+
+    return best_format, chain(prefix, stream)
@@ -1,75 +1,119 @@
-from .base import SubtitleFormat, Cue
+from .base import SubtitleFormat, Cue, LineCueParser, parse_line_buffer
 from enum import Enum
-from datetime import timedelta
-from ..utils.token import StyleToken, StyleType, TokenType, Token
+from ..utils.token import StyleToken, StyleType, TokenType
+from ..utils.timing import frames_to_milliseconds, milliseconds_to_frames
+
+from .registry import register_format
 
 import regex as re
 
+@register_format('microdvd', ['.sub', '.txt'])
 class MicroDVDFormat(SubtitleFormat):
+    cue_re = re.compile(r'^{(?P<start_frame>\d+)}{(?P<end_frame>\d+)}(?P<text>.*)$')
+    cue_bytes_re = re.compile(rb'[ \t\r\f\v]*\{(?P<start>\d+)\}\{(?P<end>\d+)\}(?P<text>[^\n]*)')
     style_re = re.compile(r'{(?P<type>[yYcCfFsS]):(?P<data>.*?)}')
+    style_patterns = ((style_re, 'process_style'),)
+
+    trigger_chars = '{'
+    frame_based = True
+    style_types = {
+        'i': StyleType.ITALICS_START,
+        'b': StyleType.BOLD_START,
+        'u': StyleType.UNDERLINE_START,
+        's': StyleType.STRIKETHROUGH_START,
+    }
+    # style type and the classmethod parsing its data
+    data_style_types = {
+        'c': (StyleType.FONTCOLOR_START, 'parse_color'),
+        'f': (StyleType.FONTNAME_START, None),
+        's': (StyleType.FONTSIZE_START, None),
+    }
+
+    # StyleType -> (control code, data template), see build_dispatch
+    style_codes = {
+        StyleType.ITALICS_START: ('y', 'i'),
+        StyleType.BOLD_START: ('y', 'b'),
+        StyleType.UNDERLINE_START: ('y', 'u'),
+        StyleType.STRIKETHROUGH_START: ('y', 's'),
+        StyleType.FONTNAME_START: ('f', '{0}'),
+        StyleType.FONTSIZE_START: ('s', '{0}'),
+        StyleType.FONTCOLOR_START: ('c', '${0[2]:02X}{0[1]:02X}{0[0]:02X}'),
+    }
 
     class StyleRange(Enum):
         ONE_LINE = 1
         ALL = 2
 
     @classmethod
-    def parse_cue(cls, stream, metadata):
-        cue_re = re.compile(r'^{(?P<start_frame>\d+)}{(?P<end_frame>\d+)}(?P<text>.*)$')
+    def create_parser(cls, metadata):
+        return LineCueParser(cls, metadata)
 
-        index = 0
-        for line in stream:
-            index += 1
-            line = line.strip()
+    @classmethod
+    def parse_line(cls, index, line, metadata):
+        line = line.strip()
 
-            match = cue_re.match(line)
-            if not match:
-                raise Exception()
+        match = cls.cue_re.match(line)
+        if not match:
+            raise Exception()
+
+        return cls.make_cue(index, int(match.group('start_frame')), int(match.group('end_frame')), match.group('text'), metadata)
+
+    @classmethod
+    def parse_buffer(cls, buffer, metadata, encoding, offset = 0):
+        return parse_line_buffer(cls, buffer, metadata, encoding, offset)
 
-            start_time = timedelta(seconds=int(match.group('start_frame')) / metadata.fps)
-            end_time = timedelta(seconds=int(match.group('end_frame')) / metadata.fps)
-            text = match.group('text')
+    # times are in frames
+    @classmethod
+    def make_cue(cls, index, start, end, text, metadata):
+        start_time = frames_to_milliseconds(start, metadata.fps)
+        end_time = frames_to_milliseconds(end, metadata.fps)
+        return Cue(index, start_time, end_time, '\n'.join(text.split('|')))
 
-            yield Cue(index, start_time, end_time, '\n'.join(text.split('|')))
+    @classmethod
+    def sniff(cls, lines):
+        lines = [line.strip() for line in lines if line.strip()]
+        if not lines:
+            return 0
+        return sum(1 for line in lines if cls.cue_re.match(line)) / len(lines)
 
     @classmethod
-    def write_cue(cls, cue, metadata, out):
-        frame_start = str(int(round(cue.start.total_seconds() * metadata.fps)))
-        frame_end = str(int(round(cue.end.total_seconds() * metadata.fps)))
+    def write_cue(cls, cue, metadata, out, tokens = None, body = None, runs = None):
+        frame_start = str(milliseconds_to_frames(cue.start_ms, metadata.fps))
+        frame_end = str(milliseconds_to_frames(cue.end_ms, metadata.fps))
         out.write('{' + frame_start + '}{' + frame_end + '}')
-        cls.write_tokens(Token.depth_first_generator(cue.tree), out)
+        cls.write_body(cue, out, tokens, body, runs)
         out.write('\n')
 
     @classmethod
-    def get_first_style_match(cls, text, current):
-        return re.search(cls.style_re, text) or None
+    def build_dispatch(cls):
+        super().build_dispatch()
+
+        # {y:i} applies to one line, {Y:i} to the whole cue
+        cls.range_templates = {}
+        for srange in cls.StyleRange:
+            cls.range_templates[srange] = {}
+            for style_type, (code, data) in cls.style_codes.items():
+                code = code.upper() if srange == cls.StyleRange.ALL else code
+                cls.range_templates[srange][style_type] = '{{' + code + ':' + data + '}}'
 
     @classmethod
-    def process_match(cls, match, current):
+    def process_style(cls, match, current):
         type_g = match.group('type')
         data_g = match.group('data')
 
         srange = cls.StyleRange.ALL if type_g.isupper() else cls.StyleRange.ONE_LINE
-        if type_g == 'y' or type_g == 'Y':
+        type_g = type_g.lower()
+        if type_g == 'y':
             for x in data_g.split(','):
-                if x == 'i':
-                    new_token = StyleType.ITALICS_START
-                elif x == 'b':
-                    new_token = StyleType.BOLD_START
-                elif x == 'u':
-                    new_token = StyleType.UNDERLINE_START
-                elif x == 's':
-                    new_token = StyleType.STRIKETHROUGH_START
-
-                current = current.append(StyleToken(cls, new_token, format_data=srange))
+                new_type = cls.style_types.get(x)
+                if not new_type:
+                    raise Exception('Unsupported style: {0}'.format(x))
+
+                current = current.append(StyleToken(cls, new_type, format_data=srange))
             return current
-        elif type_g == 'c' or type_g == 'C':
-            return current.append(StyleToken(cls, StyleType.FONTCOLOR_START, cls.parse_color(data_g), srange))
-        elif type_g == 'f' or type_g == 'F':
-            return current.append(StyleToken(cls, StyleType.FONTNAME_START, data_g, srange))
-        elif type_g == 's' or type_g == 'S':
-            return current.append(StyleToken(cls, StyleType.FONTSIZE_START, data_g, srange))
 
-        raise Exception('Could not create token')
+        new_type, parse_data = cls.data_style_types[type_g]
+        return current.append(StyleToken(cls, new_type, getattr(cls, parse_data)(data_g) if parse_data else data_g, srange))
 
     @staticmethod
     def parse_color(text):
@@ -87,6 +131,7 @@ class MicroDVDFormat(SubtitleFormat):
 
     @classmethod
     def write_tokens(cls, token_stream, out):
+        templates = cls.range_templates
         can_write_style = True
         for token in token_stream:
             if token.type == TokenType.TEXT:
@@ -96,21 +141,25 @@ class MicroDVDFormat(SubtitleFormat):
                 out.write('|')
                 can_write_style = True
             elif can_write_style and token.type == TokenType.STYLE:
-                is_multi = token.format_data == cls.StyleRange.ALL
-                if token.style_type == StyleType.ITALICS_START:
-                    out.write('{' + ('Y' if is_multi else 'y') + ':i}')
-                elif token.style_type == StyleType.BOLD_START:
-                    out.write('{' + ('Y' if is_multi else 'y') + ':b}')
-                elif token.style_type == StyleType.UNDERLINE_START:
-                    out.write('{' + ('Y' if is_multi else 'y') + ':u}')
-                elif token.style_type == StyleType.STRIKETHROUGH_START:
-                    out.write('{' + ('Y' if is_multi else 'y') + ':s}')
-                elif token.style_type == StyleType.FONTNAME_START:
-                    out.write('{' + ('F' if is_multi else 'f') + ':' + token.style_data + '}')
-                elif token.style_type == StyleType.FONTSIZE_START:
-                    out.write('{' + ('S' if is_multi else 's') + ':' + str(token.style_data) + '}')
-                elif token.style_type == StyleType.FONTCOLOR_START:
-                    out.write('{' + ('C' if is_multi else 'c') + ':$' + ''.join(['%02X' % x for x in token.style_data[::-1]]) + '}')
+                srange = cls.StyleRange.ALL if token.format_data == cls.StyleRange.ALL else cls.StyleRange.ONE_LINE
+                template = templates[srange].get(token.style_type)
+                if template:
+                    out.write(template.format(token.style_data))
+
+    # styles are only written at the start of a line, like write_tokens
+    @classmethod
+    def write_runs(cls, runs, out):
+        templates = cls.range_templates
+        can_write_style = True
+        for item in runs.items():
+            if item.__class__ is str:
+                out.write(item.replace('\n', '|'))
+                can_write_style = item[-1] == '\n'
+            elif can_write_style:
+                srange = cls.StyleRange.ALL if item.format_data == cls.StyleRange.ALL else cls.StyleRange.ONE_LINE
+                template = templates[srange].get(item.style_type)
+                if template:
+                    out.write(template.format(item.style_data))
 
     @classmethod
     def process_closing_token(cls, current, token):
@@ -1,57 +1,65 @@
-from .base import SubtitleFormat, Cue
+from .base import SubtitleFormat, Cue, LineCueParser, parse_line_buffer
 from enum import Enum
-from datetime import timedelta
-from ..utils.token import StyleToken, StyleType, TokenType, Token
+from ..utils.token import StyleToken, StyleType, TokenType
+
+from .registry import register_format
 
 import regex as re
 
+@register_format('mpl2', ['.txt'])
 class MPL2Format(SubtitleFormat):
-    style_re = re.compile(r'^/')
+    cue_re = re.compile(r'^\[(?P<start_time>\d+)\]\[(?P<end_time>\d+)\](?P<text>.*)$')
+    cue_bytes_re = re.compile(rb'[ \t\r\f\v]*\[(?P<start>\d+)\]\[(?P<end>\d+)\](?P<text>[^\n]*)')
+    # \G anchors the match to where the scan resumes, i.e. the line start or right after another style
+    style_re = re.compile(r'\G/')
+    style_patterns = ((style_re, 'process_style'),)
+
+    trigger_chars = '/'
+    style_templates = {StyleType.ITALICS_START: '/'}
 
     @classmethod
-    def parse_cue(cls, stream, metadata):
-        cue_re = re.compile(r'^\[(?P<start_time>\d+)\]\[(?P<end_time>\d+)\](?P<text>.*)$')
+    def create_parser(cls, metadata):
+        return LineCueParser(cls, metadata)
 
-        index = 0
-        for line in stream:
-            index += 1
-            line = line.strip()
+    @classmethod
+    def parse_line(cls, index, line, metadata):
+        line = line.strip()
 
-            match = cue_re.match(line)
-            if not match:
-                raise Exception('Invalid line format: {0}'.format(line))
+        match = cls.cue_re.match(line)
+        if not match:
+            raise Exception('Invalid line format: {0}'.format(line))
 
-            start_time = timedelta(seconds=int(match.group('start_time')) * 0.1)
-            end_time = timedelta(seconds=int(match.group('end_time')) * 0.1)
-            text = match.group('text')
+        return cls.make_cue(index, int(match.group('start_time')), int(match.group('end_time')), match.group('text'), metadata)
 
-            yield Cue(index, start_time, end_time, '\n'.join(text.split('|')))
+    @classmethod
+    def parse_buffer(cls, buffer, metadata, encoding, offset = 0):
+        return parse_line_buffer(cls, buffer, metadata, encoding, offset)
 
+    # times are in deciseconds
     @classmethod
-    def write_cue(cls, cue, metadata, out):
-        time_start = int(cue.start.total_seconds() * 10)
-        time_end = int(cue.end.total_seconds() * 10)
-        out.write('[{0}][{1}]'.format(time_start, time_end))
-        cls.write_tokens(Token.depth_first_generator(cue.tree), out)
-        out.write('\n')
+    def make_cue(cls, index, start, end, text, metadata):
+        return Cue(index, start * 100, end * 100, '\n'.join(text.split('|')))
 
     @classmethod
-    def get_first_style_match(cls, text, current):
-        if current.type != TokenType.ROOT:
-            return None
+    def sniff(cls, lines):
+        lines = [line.strip() for line in lines if line.strip()]
+        if not lines:
+            return 0
+        return sum(1 for line in lines if cls.cue_re.match(line)) / len(lines)
 
-        s = re.search(cls.style_re, text)
-        if not s or s.start() > 0:
-            return None
-        return s
+    @classmethod
+    def write_cue(cls, cue, metadata, out, tokens = None, body = None, runs = None):
+        out.write('[{0}][{1}]'.format(cue.start_ms // 100, cue.end_ms // 100))
+        cls.write_body(cue, out, tokens, body, runs)
+        out.write('\n')
 
     @classmethod
-    def process_match(cls, match, current):
-        if match.re == cls.style_re:
-            current = current.append(StyleToken(cls, StyleType.ITALICS_START))
-            return current
+    def can_match(cls, current):
+        return current.type == TokenType.ROOT
 
-        raise Exception('Could not create token')
+    @classmethod
+    def process_style(cls, match, current):
+        return current.append(StyleToken(cls, StyleType.ITALICS_START))
 
     @classmethod
     def write_tokens(cls, token_stream, out):
@@ -64,8 +72,22 @@ class MPL2Format(SubtitleFormat):
                 out.write('|')
                 can_write_style = True
             elif can_write_style and token.type == TokenType.STYLE:
-                if token.style_type == StyleType.ITALICS_START:
-                    out.write('/')
+                template = cls.style_templates.get(token.style_type)
+                if template:
+                    out.write(template)
+
+    # styles are only written at the start of a line, like write_tokens
+    @classmethod
+    def write_runs(cls, runs, out):
+        can_write_style = True
+        for item in runs.items():
+            if item.__class__ is str:
+                out.write(item.replace('\n', '|'))
+                can_write_style = item[-1] == '\n'
+            elif can_write_style:
+                template = cls.style_templates.get(item.style_type)
+                if template:
+                    out.write(template)
 
     @classmethod
     def process_closing_token(cls, current, token):
@@ -0,0 +1,62 @@
+from ..utils.scanner import StyleScanner
+
+# Keeps the known subtitle formats in registration order together with the
+# tables derived from them, so lookups during tokenizing and writing don't
+# have to reflect over SubtitleFormat subclasses.
+class FormatRegistry:
+    def __init__(self):
+        self.formats = []
+        self.names = {}
+        self.extensions = {}
+        self.closing_formats = []
+        self.scanner = StyleScanner(self.formats)
+        # union of the formats' trigger_chars, None if any format has none
+        self.trigger_chars = ''
+
+    def register(self, format_class, name, extensions=()):
+        name = name.lower()
+        if name in self.names:
+            raise Exception('Format already registered: {0}'.format(name))
+
+        format_class.name = name
+        format_class.extensions = tuple(e.lower() for e in extensions)
+        format_class.build_dispatch()
+
+        self.formats.append(format_class)
+        self.names[name] = format_class
+        for extension in format_class.extensions:
+            self.extensions.setdefault(extension, []).append(format_class)
+
+        self.closing_formats = [sf for sf in self.formats if sf.has_closing_tokens()]
+        self.scanner = StyleScanner(list(self.formats))
+        if any(sf.trigger_chars is None for sf in self.formats):
+            self.trigger_chars = None
+        else:
+            self.trigger_chars = ''.join(sorted(set(''.join(sf.trigger_chars for sf in self.formats))))
+        return format_class
+
+    def get(self, name):
+        sf = self.names.get(name.lower())
+        if not sf:
+            raise Exception('Unknown format: {0}'.format(name))
+        return sf
+
+    # all formats using the extension, e.g. '.txt' is shared by MicroDVD and MPL2
+    def get_by_extension(self, extension):
+        extension = extension.lower()
+        if not extension.startswith('.'):
+            extension = '.' + extension
+        return list(self.extensions.get(extension, []))
+
+    def __iter__(self):
+        return iter(list(self.formats))
+
+    def __len__(self):
+        return len(self.formats)
+
+format_registry = FormatRegistry()
+
+def register_format(name, extensions=()):
+    def decorator(format_class):
+        return format_registry.register(format_class, name, extensions)
+    return decorator
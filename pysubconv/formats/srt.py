@@ -1,203 +1,300 @@
 from .base import SubtitleFormat, Cue
 from enum import Enum
-from datetime import timedelta
-from ..utils.token import StyleToken, StyleType, TokenType, Token
+from ..utils.token import StyleToken, StyleType, TokenType
+from ..utils.timing import to_milliseconds
+
+from .registry import register_format
 
 import regex as re
 
+@register_format('srt', ['.srt'])
 class SrtFormat(SubtitleFormat):
     style_start_re = re.compile(r'[<{](?P<stype>[biu])[>}]')
     style_end_re = re.compile(r'[<{]\/(?P<stype>[biu])[>}]')
     font_start_re = re.compile(r'(?(DEFINE)(?P<fstyle> *(?P<ftype>face|color|size)=\"(?P<fdata>.*?)\" *))<font (?&fstyle)*>')
     font_end_re = re.compile(r'<\/font>')
+    style_patterns = (
+        (style_start_re, 'process_style_start'),
+        (style_end_re, 'process_style_end'),
+        (font_start_re, 'process_font_start'),
+        (font_end_re, 'process_font_end'),
+    )
+    trigger_chars = '<{'
+    index_re = re.compile(r'^(?P<index>\d+)$')
+    # a well formed cue block with 'HH:MM:SS,mmm' timestamps at the byte level,
+    # parse_buffer leaves anything else to SrtCueParser
+    block_bytes_re = re.compile(rb'\s*(\d+)[ \t\r\f\v]*\n[ \t\r\f\v]*'
+                                rb'(\d\d):(\d\d):(\d\d),(\d\d\d)[ \t]*-->[ \t]*(\d\d):(\d\d):(\d\d),(\d\d\d)[ \t\r\f\v]*(?:\n|\Z)'
+                                rb'((?:[ \t\r\f\v]*\S[^\n]*(?:\n|\Z))*)')
+    space_bytes_re = re.compile(rb'\s*')
+    timing_re = re.compile(r'(?P<hour>\d{1,2}):(?P<minute>\d{1,2}):(?P<second>\d{1,2}),(?P<millisecond>\d{3})')
+
+    style_types = {'i': StyleType.ITALICS_START, 'b': StyleType.BOLD_START, 'u': StyleType.UNDERLINE_START}
+    style_end_types = {'i': StyleType.ITALICS_END, 'b': StyleType.BOLD_END, 'u': StyleType.UNDERLINE_END}
+    font_types = {'face': StyleType.FONTNAME_START, 'color': StyleType.FONTCOLOR_START, 'size': StyleType.FONTSIZE_START}
+    font_end_types = {
+        StyleType.FONTNAME_START: StyleType.FONTNAME_END,
+        StyleType.FONTCOLOR_START: StyleType.FONTCOLOR_END,
+        StyleType.FONTSIZE_START: StyleType.FONTSIZE_END,
+    }
+
+    style_templates = {
+        StyleType.ITALICS_START: '<i>',
+        StyleType.ITALICS_END: '</i>',
+        StyleType.BOLD_START: '<b>',
+        StyleType.BOLD_END: '</b>',
+        StyleType.UNDERLINE_START: '<u>',
+        StyleType.UNDERLINE_END: '</u>',
+        StyleType.FONTNAME_START: '<font face="{0}">',
+        StyleType.FONTNAME_END: '</font>',
+        StyleType.FONTSIZE_START: '<font size="{0}">',
+        StyleType.FONTSIZE_END: '</font>',
+        StyleType.FONTCOLOR_START: '<font color="#{0[0]:02X}{0[1]:02X}{0[2]:02X}">',
+        StyleType.FONTCOLOR_END: '</font>',
+    }
 
     @classmethod
-    def parse_cue(cls, stream, metadata):
-        index_re = re.compile(r'^(?P<index>\d+)$')
-        timing_re = re.compile(r'(?P<hour>\d{1,2}):(?P<minute>\d{1,2}):(?P<second>\d{1,2}),(?P<millisecond>\d{3})')
-
-        class StateType(Enum):
-            INDEX = 1
-            TIMINGS = 2
-            TEXT = 3
+    def create_parser(cls, metadata):
+        return SrtCueParser(cls, metadata)
 
-        state = StateType.INDEX
+    @classmethod
+    def parse_buffer(cls, buffer, metadata, encoding, offset = 0):
+        block_re = cls.block_bytes_re
+        size = len(buffer)
+        pos = offset
+        while True:
+            match = block_re.match(buffer, pos)
+            if match:
+                index, h1, m1, s1, ms1, h2, m2, s2, ms2, text = match.groups()
+                # the last cue is dropped without text, like SrtCueParser.close does
+                if not text and match.end() >= size:
+                    return
+
+                start = int(h1) * 3600000 + int(m1) * 60000 + int(s1) * 1000 + int(ms1)
+                end = int(h2) * 3600000 + int(m2) * 60000 + int(s2) * 1000 + int(ms2)
+                pos = match.end()
+
+                # \S only knows ASCII whitespace, a line of e.g. NBSPs is blank to
+                # the line parser and ends the cue there
+                lines = text.decode(encoding).split('\n')
+                if lines[-1] == '':
+                    lines.pop()
+                for i, line in enumerate(lines):
+                    line = lines[i] = line.strip()
+                    if not line:
+                        del lines[i:]
+                        pos = match.start(10) + sum(len(raw) + 1 for raw in text.split(b'\n')[:i + 1])
+                        break
+
+                yield Cue(int(index), start, end, '\n'.join(lines))
+                continue
 
-        # TODO: unnecessary line strips?
-        text = ''
-        index = start_time = end_time = None
-        for line in stream:
+            pos = cls.space_bytes_re.match(buffer, pos).end()
+            if pos >= size:
+                return
+
+            # feeds the decoded lines of anything unusual to the line parser
+            # until it completes a cue
+            parser = cls.create_parser(metadata)
+            cue = None
+            while cue is None and pos < size:
+                end = buffer.find(b'\n', pos)
+                end = size if end < 0 else end + 1
+                cue = parser.feed(buffer[pos:end].decode(encoding))
+                pos = end
+
+            if cue is None:
+                cue = parser.close()
+            if cue is not None:
+                yield cue
+
+    # score = fraction of cue blocks starting with an index line followed by a timing line
+    @classmethod
+    def sniff(cls, lines):
+        blocks = hits = 0
+        block_line = 0
+        previous = None
+        for line in lines:
             line = line.strip()
-
             if not line:
-                if state == StateType.TEXT:
-                    yield Cue(index, start_time, end_time, text.strip())
-                    text = ''
-                    start_time = end_time = None
-                    state = StateType.INDEX
+                block_line = 0
                 continue
 
-            if state == StateType.INDEX:
-                match = index_re.match(line)
-
-                if not match:
-                    raise Exception('Invalid index: {0}'.format(line))
-
-                index = int(match.group('index'))
-
-                state = StateType.TIMINGS
-            elif state == StateType.TIMINGS:
-                # TODO: add subrip text position support 
-                if '-->' not in line:
-                    raise Exception('Invalid timing format: {0}'.format(line))
+            if block_line == 0:
+                blocks += 1
+            elif block_line == 1 and cls.index_re.match(previous) and '-->' in line and cls.timing_re.match(line):
+                hits += 1
 
-                timings = line.split('-->')
-                if len(timings) != 2:
-                    raise Exception('Invalid timing format: {0}'.format(line))
+            block_line += 1
+            previous = line
 
-                start_match = timing_re.match(timings[0].strip())
-                end_match = timing_re.match(timings[1].strip())
+        if not blocks:
+            return 0
+        return hits / blocks
 
-                if not start_match or not end_match:
-                    raise Exception('Invalid timing format: {0}'.format(line))
-
-                start_time = timedelta(hours=int(start_match.group('hour')),
-                                       minutes=int(start_match.group('minute')),
-                                       seconds=int(start_match.group('second')),
-                                       milliseconds=int(start_match.group('millisecond')))
-                end_time =   timedelta(hours=int(end_match.group('hour')),
-                                       minutes=int(end_match.group('minute')),
-                                       seconds=int(end_match.group('second')),
-                                       milliseconds=int(end_match.group('millisecond')))
-
-                state = StateType.TEXT
-            elif state == StateType.TEXT:
-                text += line + '\n'
+    # returns milliseconds of a 'HH:MM:SS,mmm' timestamp or None if it is invalid
+    @classmethod
+    def parse_time(cls, text):
+        # fast path for the fixed layout, the regex also allows single digit fields
+        if len(text) == 12 and text[2] == ':' and text[5] == ':' and text[8] == ',':
+            digits = text[0:2] + text[3:5] + text[6:8] + text[9:12]
+            if digits.isascii() and digits.isdigit():
+                n = int(digits)
+                return n // 10000000 * 3600000 + n // 100000 % 100 * 60000 + n % 100000
+
+        match = cls.timing_re.match(text)
+        if not match:
+            return None
 
-        if index and start_time and end_time and text.strip():
-            yield Cue(index, start_time, end_time, text.strip())
+        return (int(match.group('hour')) * 3600000 + int(match.group('minute')) * 60000 +
+                int(match.group('second')) * 1000 + int(match.group('millisecond')))
 
     @staticmethod
     def format_time(time):
-        s = time.total_seconds()
-        return '{:02}:{:02}:{:02},{:03}'.format(int(s // 3600), int(s % 3600 // 60), int(s % 60), int(time.microseconds / 1000))
+        ms = to_milliseconds(time)
+        return '{:02}:{:02}:{:02},{:03}'.format(ms // 3600000, ms // 60000 % 60, ms // 1000 % 60, ms % 1000)
 
     @classmethod
-    def write_cue(cls, cue, metadata, out):
+    def write_cue(cls, cue, metadata, out, tokens = None, body = None, runs = None):
         out.write(str(cue.index) + '\n')
-        out.write('{0} --> {1}'.format(cls.format_time(cue.start), cls.format_time(cue.end)) + '\n')
-        cls.write_tokens(Token.depth_first_generator(cue.tree), out)
+        out.write(cls.format_time(cue.start_ms) + ' --> ' + cls.format_time(cue.end_ms) + '\n')
+        cls.write_body(cue, out, tokens, body, runs)
         out.write('\n\n')
 
     @classmethod
-    def get_first_style_match(cls, text, current):
-        style_res = [cls.style_start_re, cls.style_end_re, cls.font_start_re, cls.font_end_re]
-        matches = list(filter(None, [re.search(r, text) for r in style_res]))
-        if not matches:
-            return None
-        return min(matches, key=lambda o: o.start())
+    def process_style_start(cls, match, current):
+        return current.append(StyleToken(cls, cls.style_types[match.group('stype')]))
 
     @classmethod
-    def process_match(cls, match, current):
-        if match.re == cls.style_start_re:
-            stype_g = match.group('stype')
+    def process_style_end(cls, match, current):
+        current.parent.append(StyleToken.shared(cls, cls.style_end_types[match.group('stype')]))
+        return current.parent
+
+    @classmethod
+    def process_font_start(cls, match, current):
+        ftype_c = match.captures('ftype')
+        fdata_c = match.captures('fdata')
+
+        while ftype_c and fdata_c:
+            new_type = cls.font_types[ftype_c.pop()]
+            fdata = fdata_c.pop()
+
+            if new_type == StyleType.FONTCOLOR_START:
+                fdata = cls.parse_color(fdata)
+
+            current = current.append(StyleToken(cls, new_type, fdata))
 
-            if stype_g == 'i':
-                new_type = StyleType.ITALICS_START
-            elif stype_g == 'b':
-                new_type = StyleType.BOLD_START
-            elif stype_g == 'u':
-                new_type = StyleType.UNDERLINE_START
+        return current
 
+    @classmethod
+    def process_font_end(cls, match, current):
+        while isinstance(current, StyleToken) and current.format_class == cls:
+            new_type = cls.font_end_types.get(current.style_type)
             if not new_type:
-                raise Exception('Unsupported style')
-
-            return current.append(StyleToken(cls, new_type))
-        elif match.re == cls.style_end_re:
-            stype_g = match.group('stype')
-
-            if stype_g == 'i':
-                new_type = StyleType.ITALICS_END
-            elif stype_g == 'b':
-                new_type = StyleType.BOLD_END
-            elif stype_g == 'u':
-                new_type = StyleType.UNDERLINE_END
-
-            current.parent.append(StyleToken(cls, new_type))
-            return current.parent
-        elif match.re == cls.font_start_re:
-            ftype_c = match.captures('ftype')
-            fdata_c = match.captures('fdata')
-
-            while ftype_c and fdata_c:
-                ftype = ftype_c.pop()
-                fdata = fdata_c.pop()
-
-                if ftype == 'face':
-                    new_type = StyleType.FONTNAME_START
-                elif ftype == 'color':
-                    new_type = StyleType.FONTCOLOR_START
-                    color_re = re.compile(r'#([0-9a-fA-F]{2})([0-9a-fA-F]{2})([0-9a-fA-F]{2})')
-                    match = color_re.match(fdata)
-
-                    if not match:
-                        raise Exception()
-
-                    fdata = (int(match.group(1), 16), int(match.group(2), 16), int(match.group(3), 16))
-                elif ftype == 'size':
-                    new_type = StyleType.FONTSIZE_START
-                else:
-                    raise Exception()
-
-                current = current.append(StyleToken(cls, new_type, fdata))
-
-            return current
-        elif match.re == cls.font_end_re:
-            while isinstance(current, StyleToken) and current.format_class == cls:
-                if current.style_type == StyleType.FONTNAME_START:
-                    new_type = StyleType.FONTNAME_END
-                elif current.style_type == StyleType.FONTCOLOR_START:
-                    new_type = StyleType.FONTCOLOR_END
-                elif current.style_type == StyleType.FONTSIZE_START:
-                    new_type = StyleType.FONTSIZE_END
-                else:
-                    break
-
-                current.parent.append(StyleToken(cls, new_type))
-                current = current.parent
-            return current
-
-        raise Exception('Could not create token')
+                break
+
+            current.parent.append(StyleToken.shared(cls, new_type))
+            current = current.parent
+        return current
+
+    @staticmethod
+    def parse_color(text):
+        color_re = re.compile(r'#([0-9a-fA-F]{2})([0-9a-fA-F]{2})([0-9a-fA-F]{2})')
+        match = color_re.match(text)
+
+        if not match:
+            raise Exception()
+
+        return (int(match.group(1), 16), int(match.group(2), 16), int(match.group(3), 16))
 
     @classmethod
     def write_tokens(cls, token_stream, out):
+        templates = cls.style_templates
         for token in token_stream:
             if token.type == TokenType.TEXT:
                 out.write(token.data)
             elif token.type == TokenType.NEWLINE:
                 out.write('\n')
             elif token.type == TokenType.STYLE:
-                if token.style_type == StyleType.ITALICS_START:
-                    out.write('<i>')
-                elif token.style_type == StyleType.ITALICS_END:
-                    out.write('</i>')
-                elif token.style_type == StyleType.BOLD_START:
-                    out.write('<b>')
-                elif token.style_type == StyleType.BOLD_END:
-                    out.write('</b>')
-                elif token.style_type == StyleType.UNDERLINE_START:
-                    out.write('<u>')
-                elif token.style_type == StyleType.UNDERLINE_END:
-                    out.write('</u>')
-                elif token.style_type == StyleType.FONTNAME_START:
-                    out.write('<font face="{0}">'.format(token.style_data))
-                elif token.style_type == StyleType.FONTNAME_END:
-                    out.write('</font>')
-                elif token.style_type == StyleType.FONTSIZE_START:
-                    out.write('<font size="{0}">'.format(token.style_data))
-                elif token.style_type == StyleType.FONTSIZE_END:
-                    out.write('</font>')
-                elif token.style_type == StyleType.FONTCOLOR_START:
-                    out.write('<font color="#{0}">'.format(''.join(['%02X' % x for x in token.style_data])))
-                elif token.style_type == StyleType.FONTCOLOR_END:
-                    out.write('</font>')
+                template = templates.get(token.style_type)
+                if template:
+                    out.write(template.format(token.style_data))
+
+    @classmethod
+    def write_runs(cls, runs, out):
+        templates = cls.style_templates
+        for item in runs.items():
+            if item.__class__ is str:
+                out.write(item)
+            else:
+                template = templates.get(item.style_type)
+                if template:
+                    out.write(template.format(item.style_data))
+
+# Keeps the INDEX/TIMINGS/TEXT state between lines, a cue is complete at the
+# blank line following its text.
+class SrtCueParser:
+    class StateType(Enum):
+        INDEX = 1
+        TIMINGS = 2
+        TEXT = 3
+
+    def __init__(self, format_class, metadata):
+        self.format_class = format_class
+        self.metadata = metadata
+        self.state = self.StateType.INDEX
+        self.text = []
+        self.index = self.start_time = self.end_time = None
+
+    def feed(self, line):
+        # TODO: unnecessary line strips?
+        line = line.strip()
+        StateType = self.StateType
+
+        if not line:
+            if self.state == StateType.TEXT:
+                cue = Cue(self.index, self.start_time, self.end_time, '\n'.join(self.text).strip())
+                self.text = []
+                self.start_time = self.end_time = None
+                self.state = StateType.INDEX
+                return cue
+            return None
+
+        if self.state == StateType.INDEX:
+            match = self.format_class.index_re.match(line)
+
+            if not match:
+                raise Exception('Invalid index: {0}'.format(line))
+
+            self.index = int(match.group('index'))
+
+            self.state = StateType.TIMINGS
+        elif self.state == StateType.TIMINGS:
+            # TODO: add subrip text position support 
+            if '-->' not in line:
+                raise Exception('Invalid timing format: {0}'.format(line))
+
+            timings = line.split('-->')
+            if len(timings) != 2:
+                raise Exception('Invalid timing format: {0}'.format(line))
+
+            self.start_time = self.format_class.parse_time(timings[0].strip())
+            self.end_time = self.format_class.parse_time(timings[1].strip())
+
+            if self.start_time is None or self.end_time is None:
+                raise Exception('Invalid timing format: {0}'.format(line))
+
+            self.state = StateType.TEXT
+        elif self.state == StateType.TEXT:
+            self.text.append(line)
+
+        return None
+
+    # returns the last cue if the input did not end with a blank line
+    def close(self):
+        text = '\n'.join(self.text).strip()
+        if self.index and self.start_time is not None and self.end_time is not None and text:
+            self.text = []
+            self.state = self.StateType.INDEX
+            return Cue(self.index, self.start_time, self.end_time, text)
+        return None
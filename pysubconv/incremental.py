@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import tempfile
+from io import StringIO
+
+from .formats.base import Metadata
+from .formats.detect import detect_format
+from .pipeline import CHUNK_SIZE, ChunkedWriter, get_format
+from .utils import instrumentation
+from .utils.token import Token
+
+MANIFEST_VERSION = 1
+
+# Sidecar JSON file of an incremental conversion. For every target format it
+# maps the fingerprint of a cue text to the text's rendered tokens, i.e.
+# everything write_cue writes except the index and timing, which are cheap
+# to write and change whenever a cue is inserted or deleted before them.
+# A manifest of another library version is ignored.
+class Manifest:
+    def __init__(self, path):
+        from . import __version__
+
+        self.path = path
+        self.version = __version__
+        self.targets = {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('manifest') == MANIFEST_VERSION and data.get('version') == __version__:
+                self.targets = data['targets']
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    def get(self, name):
+        return self.targets.get(name, {})
+
+    def set(self, name, bodies):
+        self.targets[name] = bodies
+
+    # written to a temporary file and renamed, so a failed run keeps the old manifest
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, partial = tempfile.mkstemp(dir=directory, prefix='.', suffix='.part')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'manifest': MANIFEST_VERSION, 'version': self.version, 'targets': self.targets}, f)
+            os.replace(partial, self.path)
+        except BaseException:
+            os.remove(partial)
+            raise
+
+def fingerprint(text):
+    return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()[:32]
+
+# Converts like convert, but only tokenizes and renders cues whose text is
+# not in the manifest of a previous run; the others are spliced from it
+# behind a freshly written index and timing. Afterwards the manifest keeps
+# exactly the cues of this input. Stats count 'incremental.reused' and
+# 'incremental.rendered' cues.
+# Returns the number of converted cues.
+def convert_incremental(in_stream, from_format, to_format, out_stream, manifest_path, metadata = None, chunk_size = CHUNK_SIZE):
+    metadata = metadata or Metadata()
+    to_format = get_format(to_format)
+    if from_format is None:
+        from_format, in_stream = detect_format(in_stream)
+    else:
+        from_format = get_format(from_format)
+
+    manifest = Manifest(manifest_path)
+    previous = manifest.get(to_format.name)
+    bodies = {}
+    out = ChunkedWriter(out_stream, chunk_size, 'write.{0}.chars'.format(to_format.name))
+
+    count = reused = 0
+    for cue in from_format.parse_cue(in_stream, metadata):
+        key = fingerprint(cue.text)
+        body = bodies.get(key)
+        if body is None:
+            body = previous.get(key)
+            if body is None:
+                rendered = StringIO()
+                to_format.write_tokens(Token.depth_first_generator(cue.tree), rendered)
+                body = rendered.getvalue()
+            else:
+                reused += 1
+            bodies[key] = body
+        else:
+            reused += 1
+
+        to_format.write_cue(cue, metadata, out, body=body)
+        count += 1
+    out.flush()
+
+    manifest.set(to_format.name, bodies)
+    manifest.save()
+
+    stats = instrumentation.active.get()
+    if stats is not None:
+        stats.count('incremental.reused', reused)
+        stats.count('incremental.rendered', count - reused)
+
+    return count
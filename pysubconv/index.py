@@ -0,0 +1,139 @@
+from bisect import bisect_left
+
+from .formats.base import Cue, Metadata
+from .formats.detect import detect_format
+from .pipeline import CHUNK_SIZE, ChunkedWriter, get_format, write_cues
+from .utils.timing import to_milliseconds
+
+# Node of a centered interval tree, by_start and by_end are the cue positions
+# active at center sorted by ascending start and descending end.
+class IntervalNode:
+    __slots__ = ('center', 'by_start', 'by_end', 'left', 'right')
+
+    def __init__(self, center, by_start, by_end):
+        self.center = center
+        self.by_start = by_start
+        self.by_end = by_end
+        self.left = None
+        self.right = None
+
+# Time index over parsed cues. A cue is active from its start up to, but not
+# including, its end. at(time) and between(start, end) take O(log n + k) time
+# for k results and return the cues ordered by start, then input order.
+# Times are milliseconds or timedeltas.
+class CueIndex:
+    def __init__(self, cues):
+        self.cues = sorted(cues, key=lambda cue: cue.start_ms)
+        self.starts = [cue.start_ms for cue in self.cues]
+        self.root = self.build_tree()
+
+    # reads a whole stream, from_format=None detects the format
+    @classmethod
+    def read(cls, in_stream, from_format = None, metadata = None):
+        metadata = metadata or Metadata()
+        if from_format is None:
+            from_format, in_stream = detect_format(in_stream)
+        else:
+            from_format = get_format(from_format)
+        return cls(from_format.parse_cue(in_stream, metadata))
+
+    def __len__(self):
+        return len(self.cues)
+
+    # every level holds the cues active at the start of its median cue, the
+    # cues ending before go left and the ones starting after go right, so the
+    # depth is O(log n); zero length cues are never active and are left out
+    def build_tree(self):
+        cues = self.cues
+        positions = [i for i, cue in enumerate(cues) if cue.end_ms > cue.start_ms]
+        root = None
+        stack = [(positions, None, False)]
+        while stack:
+            positions, parent, is_right = stack.pop()
+            if not positions:
+                continue
+
+            center = cues[positions[len(positions) // 2]].start_ms
+            left, right, active = [], [], []
+            for i in positions:
+                cue = cues[i]
+                if cue.end_ms <= center:
+                    left.append(i)
+                elif cue.start_ms > center:
+                    right.append(i)
+                else:
+                    active.append(i)
+
+            node = IntervalNode(center, active, sorted(active, key=lambda i: cues[i].end_ms, reverse=True))
+            if parent is None:
+                root = node
+            elif is_right:
+                parent.right = node
+            else:
+                parent.left = node
+
+            stack.append((left, node, False))
+            stack.append((right, node, True))
+        return root
+
+    def find_active(self, time):
+        cues = self.cues
+        found = []
+        node = self.root
+        while node is not None:
+            if time < node.center:
+                # every cue of the node ends after center
+                for i in node.by_start:
+                    if cues[i].start_ms > time:
+                        break
+                    found.append(i)
+                node = node.left
+            else:
+                # every cue of the node starts at or before center
+                for i in node.by_end:
+                    if cues[i].end_ms <= time:
+                        break
+                    found.append(i)
+                node = node.right
+        found.sort()
+        return found
+
+    # cues active at time
+    def at(self, time):
+        return [self.cues[i] for i in self.find_active(to_milliseconds(time))]
+
+    # cues active at any time from start up to, but not including, end
+    def between(self, start, end):
+        return [self.cues[i] for i in self.find_between(to_milliseconds(start), to_milliseconds(end))]
+
+    def find_between(self, start, end):
+        if end <= start:
+            return []
+
+        # cues starting before start that are still active, then every cue starting in the range
+        found = [i for i in self.find_active(start) if self.starts[i] < start]
+        found.extend(range(bisect_left(self.starts, start), bisect_left(self.starts, end)))
+        return found
+
+    # Writes the cues of between(start, end) to to_format, numbered from 1. With
+    # rebase the times are moved so start becomes 0, clipping cues that began
+    # earlier. Only the written cues are tokenized, their trees are kept.
+    # Returns the number of written cues.
+    def extract(self, start, end, to_format, out_stream, metadata = None, rebase = False, chunk_size = CHUNK_SIZE):
+        metadata = metadata or Metadata()
+        to_format = get_format(to_format)
+        start = to_milliseconds(start)
+        offset = start if rebase else 0
+
+        out = ChunkedWriter(out_stream, chunk_size)
+        count = write_cues(self.clip_cues(self.between(start, end), offset), to_format, metadata, out)
+        out.flush()
+        return count
+
+    @staticmethod
+    def clip_cues(cues, offset):
+        for index, cue in enumerate(cues, 1):
+            copy = Cue(index, max(cue.start_ms - offset, 0), max(cue.end_ms - offset, 0), cue.text)
+            # tokenizes the indexed cue once, later extracts reuse its tree
+            copy.tree = cue.tree
+            yield copy
@@ -0,0 +1,217 @@
+import heapq
+
+from .formats.base import Cue, Metadata
+from .formats.detect import detect_format
+from .pipeline import CHUNK_SIZE, ChunkedWriter, get_format, tokenize_cues, write_cues
+from .utils import instrumentation
+from .utils.token import END_TOKEN, NEWLINE_TOKEN, StyleToken, StyleType, Token, TokenEvent, TokenType, flatten_tree, unflatten_tree
+
+# An input of merge, from_format=None detects the format. style, if given,
+# is applied to the track's lines in combined cues: a StyleType such as
+# StyleType.ITALICS_START or a (StyleType, style_data) tuple such as
+# (StyleType.FONTCOLOR_START, (255, 255, 0)).
+# The cues of a track must be in start order, see Validator for others.
+class Track:
+    def __init__(self, in_stream, from_format = None, metadata = None, style = None):
+        self.in_stream = in_stream
+        self.from_format = from_format
+        self.metadata = metadata or Metadata()
+        self.style = style
+        self.parsed = None
+
+    # a track of cues parsed before, from_format is only used for the style tokens
+    @classmethod
+    def from_cues(cls, cues, from_format = None, style = None):
+        track = cls(None, from_format, style=style)
+        track.parsed = cues
+        return track
+
+    def cues(self):
+        if self.parsed is not None:
+            return iter(self.parsed)
+
+        in_stream = self.in_stream
+        if self.from_format is None:
+            self.from_format, in_stream = detect_format(in_stream)
+        return get_format(self.from_format).parse_cue(in_stream, self.metadata)
+
+    def get_style(self):
+        if self.style is None or isinstance(self.style, StyleType):
+            return self.style, None
+        return self.style
+
+# Merges the tracks lazily by start time, ties in track order, and numbers
+# the cues from 1. Only the next cue of every track is read ahead.
+# With combine the timeline is cut wherever a cue starts or ends, and every
+# piece with cues active becomes one cue with their lines in track order,
+# styled per track; zero length cues are passed on as they are. Memory then
+# also depends on the number of cues active at once.
+# Stats count 'merge.cues', the merged cues.
+def merge_cues(tracks, combine = False):
+    tracks = [t if isinstance(t, Track) else Track.from_cues(t) for t in tracks]
+    streams = [numbered_cues(track, number) for number, track in enumerate(tracks)]
+    cues = heapq.merge(*streams, key=lambda item: item[0].start_ms)
+    if combine:
+        cues = segment_cues(cues, tracks)
+    else:
+        cues = (cue for cue, number in cues)
+
+    count = 0
+    for count, cue in enumerate(cues, 1):
+        cue.index = count
+        yield cue
+
+    stats = instrumentation.active.get()
+    if stats is not None:
+        stats.count('merge.cues', count)
+
+def numbered_cues(track, number):
+    for cue in track.cues():
+        yield cue, number
+
+# Sweep over the merged (cue, track number) pairs, active holds the cues
+# covering time.
+def segment_cues(cues, tracks):
+    active = []
+    time = None
+    for cue, number in cues:
+        if active:
+            yield from cut_segments(active, time, cue.start_ms, tracks)
+        time = cue.start_ms
+        if cue.end_ms <= cue.start_ms:
+            yield cue
+            continue
+
+        active.append((cue, number))
+        active.sort(key=lambda item: item[1])
+
+    if active:
+        yield from cut_segments(active, time, None, tracks)
+
+# yields the pieces from time up to until, None for the end, removing the
+# cues that end before until from active
+def cut_segments(active, time, until, tracks):
+    while active:
+        end = min(cue.end_ms for cue, number in active)
+        if until is not None and until < end:
+            end = until
+        if end > time:
+            yield combine_cues(active, time, end, tracks)
+            time = end
+
+        active[:] = [(cue, number) for cue, number in active if cue.end_ms > time]
+        if until is not None and time >= until:
+            break
+
+def combine_cues(active, start, end, tracks):
+    if len(active) == 1 and tracks[active[0][1]].style is None:
+        cue = active[0][0]
+        if cue.start_ms == start and cue.end_ms == end:
+            return cue
+
+        piece = Cue(None, start, end, cue.text)
+        piece.tree = copy_tree(cue.tree)
+        return piece
+
+    root = Token(TokenType.ROOT)
+    for i, (cue, number) in enumerate(active):
+        if i:
+            root.append(NEWLINE_TOKEN)
+        append_lines(root, copy_tree(cue.tree), tracks[number])
+    root.append(END_TOKEN)
+
+    combined = Cue(None, start, end, '\n'.join(cue.text for cue, number in active))
+    combined.tree = root
+    return combined
+
+# the trees of cues active in several pieces are copied, a token has a single parent
+def copy_tree(root):
+    return unflatten_tree(flatten_tree(root))
+
+# Appends the tokens of a cue's tree to root, without the END token. With a
+# track style every line is wrapped into a style token of its own, so line
+# based formats, which only write styles at the start of a line, keep it.
+# Style tokens spanning line breaks, e.g. MicroDVD {Y:b}a|b, are closed at
+# the break and opened again inside the style of the next line.
+def append_lines(root, tree, track):
+    style_type, style_data = track.get_style()
+    if style_type is None:
+        for token in tree.children:
+            if token.type != TokenType.END:
+                root.append(token)
+        return
+
+    format_class = get_format(track.from_format) if track.from_format is not None else None
+    # the open style token of the line, root for a line starting with the
+    # style already, and the style tokens of the tree entered but not exited
+    # as [token, its copy in the line] lists, the copy None from a line break
+    # until the next token of the line
+    line = None
+    opened = []
+    # a style exited before the line after its break had any token, its end
+    # token is dropped
+    stale = None
+    for event, token in Token.walk(tree):
+        if token is tree or token.type == TokenType.END:
+            continue
+
+        if event == TokenEvent.EXIT:
+            if token._children:
+                entry = opened.pop()
+                if entry[1] is None:
+                    stale = entry[0]
+            continue
+
+        if stale is not None:
+            ends = is_end_of(token, stale)
+            stale = None
+            if ends:
+                continue
+
+        if token.type == TokenType.NEWLINE:
+            for entry in reversed(opened):
+                if entry[1] is not None:
+                    entry[1].parent.append(entry[1].get_closing_token())
+                    entry[1] = None
+            if line is not None and line is not root:
+                root.append(line.get_closing_token())
+            line = None
+            root.append(token)
+            continue
+
+        if line is None:
+            first = opened[0][0] if opened else token
+            if first.type == TokenType.STYLE and first.style_type == style_type and first.style_data == style_data:
+                line = root
+            else:
+                line = root.append(StyleToken(format_class, style_type, style_data))
+        parent = line
+        for entry in opened:
+            if entry[1] is None:
+                entry[1] = parent.append(copy_style(entry[0]))
+            parent = entry[1]
+
+        if token._children:
+            opened.append([token, parent.append(copy_style(token))])
+        else:
+            parent.append(token)
+
+    if line is not None and line is not root:
+        root.append(line.get_closing_token())
+
+def copy_style(token):
+    return StyleToken(token.format_class, token.style_type, token.style_data, token.format_data)
+
+# whether token is the end token of the style token start
+def is_end_of(token, start):
+    return (token.type == TokenType.STYLE and token.format_class == start.format_class and
+            token.style_type.value == start.style_type.value | 0b10000000)
+
+# Merges the tracks to to_format, see merge_cues. Returns the number of cues.
+def merge(tracks, to_format, out_stream, metadata = None, combine = False, chunk_size = CHUNK_SIZE):
+    metadata = metadata or Metadata()
+    to_format = get_format(to_format)
+    out = ChunkedWriter(out_stream, chunk_size, 'write.{0}.chars'.format(to_format.name))
+    count = write_cues(tokenize_cues(merge_cues(tracks, combine)), to_format, metadata, out)
+    out.flush()
+    return count
@@ -0,0 +1,410 @@
+from collections import deque
+from io import StringIO
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from queue import Queue
+from threading import Thread
+from time import perf_counter
+
+from .formats import format_registry
+from .formats.base import Cue, Metadata
+from .formats.detect import detect_format
+from .reader import detect_buffer, get_offset, has_byte_lines, iter_buffer_lines, parse_buffer, sniff_encoding
+from .transcode import get_transcoder, transcode
+from .utils import instrumentation
+from .utils.runs import StyleRuns
+from .utils.token import Token
+from .utils.tokenizer import Tokenizer
+
+# characters buffered before they are written to the output stream
+CHUNK_SIZE = 64 * 1024
+
+# cues sent to a worker process at once when tokenizing in parallel
+JOB_CHUNK_SIZE = 256
+
+# cues passed to a writer thread of convert_many at once, and the number of
+# such batches queued per thread before the parser waits for it
+WRITE_BATCH_SIZE = 64
+WRITE_QUEUE_SIZE = 16
+
+# cue text models of convert: a token tree per cue or flat StyleRuns, see
+# utils/runs.py. runs only pay off for plain cues, which they write without
+# tokens; styled cues still allocate a token per style start in the format
+# handlers, plus a cursor, and build 5-20% slower than trees, see
+# benchmarks/bench_runs.py. tree is the default.
+STYLE_MODELS = ('tree', 'runs')
+
+# Collects small writes and passes them to the underlying stream in chunks.
+# The written characters are counted as stats_name in stats, by default the
+# active Stats.
+class ChunkedWriter:
+    def __init__(self, out, chunk_size = CHUNK_SIZE, stats_name = None, stats = None):
+        self.out = out
+        self.chunk_size = chunk_size
+        self.parts = []
+        self.size = 0
+        self.stats_name = stats_name
+        self.stats = stats
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.out.write(''.join(self.parts))
+
+            stats = self.stats if self.stats is not None else instrumentation.active.get()
+            if stats is not None and self.stats_name:
+                stats.count(self.stats_name, self.size)
+
+            self.parts = []
+            self.size = 0
+
+def get_format(value):
+    if isinstance(value, str):
+        return format_registry.get(value)
+    return value
+
+# cues tokenized before, e.g. by a CueIndex, keep their cached trees
+def tokenize_cues(cues, stats = None):
+    if stats is None:
+        for cue in cues:
+            if not cue.is_tokenized:
+                cue.tree = Tokenizer.tokenize(cue)
+            yield cue
+    else:
+        for cue in cues:
+            if not cue.is_tokenized:
+                started = perf_counter()
+                cue.tree = Tokenizer.tokenize(cue)
+                stats.add_time('tokenize', perf_counter() - started)
+            yield cue
+
+# tokenizes and writes a batch of cues, returning the output; runs in
+# executors, so it only takes picklable arguments
+def render_cues(cues, to_format, metadata, style_model = 'tree'):
+    out = StringIO()
+    if style_model == 'runs':
+        write_runs(cues, to_format, metadata, out)
+    else:
+        write_cues(tokenize_cues(cues), to_format, metadata, out)
+    return out.getvalue()
+
+# runs in the worker processes, the cues are sent as (index, start, end, text) tuples
+def render_records(records, to_format, metadata, style_model):
+    return render_cues([Cue(*record) for record in records], to_format, metadata, style_model)
+
+# Tokenizes and writes chunks of cues in a process pool and yields
+# (cue count, output) of every chunk in the input order, so only the cue
+# texts and the output cross processes. At most two chunks per worker are in
+# flight, so memory stays bounded.
+# Formats registered at runtime are only known to the workers if the pool
+# forks, other start methods only see formats registered on import.
+def render_cues_parallel(cues, to_format, metadata, jobs, job_chunk_size = JOB_CHUNK_SIZE, style_model = 'tree'):
+    cues = iter(cues)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        while True:
+            while len(pending) < jobs * 2:
+                records = [(cue.index, cue.start_ms, cue.end_ms, cue.text) for cue in islice(cues, job_chunk_size)]
+                if not records:
+                    break
+                pending.append((len(records), executor.submit(render_records, records, to_format, metadata, style_model)))
+
+            if not pending:
+                break
+
+            count, future = pending.popleft()
+            yield count, future.result()
+
+def write_cues(cues, to_format, metadata, out, stats = None):
+    count = 0
+    if stats is None:
+        for cue in cues:
+            to_format.write_cue(cue, metadata, out)
+            count += 1
+    else:
+        name = 'write.' + str(to_format.name)
+        for cue in cues:
+            started = perf_counter()
+            to_format.write_cue(cue, metadata, out)
+            stats.add_time(name, perf_counter() - started)
+            count += 1
+        stats.count(name + '.cues', count)
+    return count
+
+# writes the StyleRuns of the cues, which tokenizes only cues with style
+# markup and drops their trees after building the runs
+def write_runs(cues, to_format, metadata, out, stats = None):
+    count = 0
+    if stats is None:
+        for cue in cues:
+            to_format.write_cue(cue, metadata, out, runs=StyleRuns.from_cue(cue))
+            count += 1
+    else:
+        name = 'write.' + str(to_format.name)
+        for cue in cues:
+            started = perf_counter()
+            runs = StyleRuns.from_cue(cue)
+            written = perf_counter()
+            to_format.write_cue(cue, metadata, out, runs=runs)
+            stats.add_time('runs', written - started)
+            stats.add_time(name, perf_counter() - written)
+            count += 1
+        stats.count(name + '.cues', count)
+    return count
+
+# Converts in_stream to to_format one cue at a time, so memory use does not
+# depend on the length of the input. Formats can be format classes or
+# registered names, from_format=None detects the input format.
+# jobs > 1 tokenizes and writes chunks of job_chunk_size cues in that many
+# processes.
+# With a ConversionCache the whole input is read and hashed first, hits are
+# written out without parsing.
+# MPL2 <-> MicroDVD is transcoded line by line without tokenizing, whatever
+# jobs is, see transcode.py.
+# A Validator checks, and may fix, the parsed cues before they are converted,
+# its report is kept on it; the cache and the transcoder are not used then.
+# style_model is one of STYLE_MODELS, both write the same output.
+# Returns the number of converted cues.
+def convert(in_stream, from_format, to_format, out_stream, metadata = None, chunk_size = CHUNK_SIZE,
+            jobs = 1, job_chunk_size = JOB_CHUNK_SIZE, cache = None, validator = None, style_model = 'tree'):
+    metadata = metadata or Metadata()
+    to_format = get_format(to_format)
+    if from_format is None:
+        from_format, in_stream = detect_format(in_stream)
+    else:
+        from_format = get_format(from_format)
+
+    if validator is None:
+        if cache is not None:
+            return convert_cached(in_stream, from_format, to_format, out_stream, metadata, cache,
+                                  chunk_size=chunk_size, jobs=jobs, job_chunk_size=job_chunk_size, style_model=style_model)
+
+        if get_transcoder(from_format, to_format):
+            return convert_lines(in_stream, from_format, to_format, out_stream, metadata, chunk_size)
+
+    cues = from_format.parse_cue(in_stream, metadata)
+    return convert_cues(cues, from_format, to_format, out_stream, metadata, chunk_size, jobs, job_chunk_size, validator, style_model)
+
+# Converts a bytes-like buffer, e.g. a memory mapped file, finding the cues at
+# the byte level. The encoding is sniffed when it is None. Otherwise like convert.
+def convert_buffer(buffer, from_format, to_format, out_stream, metadata = None, encoding = None, chunk_size = CHUNK_SIZE,
+                   jobs = 1, job_chunk_size = JOB_CHUNK_SIZE, cache = None, validator = None, style_model = 'tree'):
+    metadata = metadata or Metadata()
+    to_format = get_format(to_format)
+    if encoding is None:
+        encoding, offset = sniff_encoding(buffer)
+    else:
+        offset = get_offset(buffer, encoding)
+
+    if from_format is None:
+        from_format = detect_buffer(buffer, encoding, offset)
+    else:
+        from_format = get_format(from_format)
+
+    if validator is None:
+        if cache is not None:
+            key = cache.key(buffer, from_format, to_format, metadata, encoding)
+            return write_cached(cache, key, out_stream, lambda output: convert_buffer(
+                buffer, from_format, to_format, output, metadata, encoding, chunk_size, jobs, job_chunk_size, style_model=style_model))
+
+        if get_transcoder(from_format, to_format) and has_byte_lines(buffer, encoding, offset):
+            return convert_lines(iter_buffer_lines(buffer, encoding, offset), from_format, to_format, out_stream, metadata, chunk_size)
+
+    cues = parse_buffer(buffer, from_format, metadata, encoding, offset)
+    return convert_cues(cues, from_format, to_format, out_stream, metadata, chunk_size, jobs, job_chunk_size, validator, style_model)
+
+# validates, tokenizes and writes the lazily parsed cues, the stages shared by convert and convert_buffer
+def convert_cues(cues, from_format, to_format, out_stream, metadata, chunk_size = CHUNK_SIZE,
+                 jobs = 1, job_chunk_size = JOB_CHUNK_SIZE, validator = None, style_model = 'tree'):
+    if style_model not in STYLE_MODELS:
+        raise Exception('Unknown style model: {0}'.format(style_model))
+
+    stats = instrumentation.active.get()
+    out = ChunkedWriter(out_stream, chunk_size, 'write.{0}.chars'.format(to_format.name))
+    if stats is not None:
+        name = 'parse.' + str(from_format.name)
+        cues = stats.timed(cues, name, name + '.cues')
+    if validator is not None:
+        cues = validator.validate(cues, from_format, metadata)
+
+    if jobs > 1:
+        # the workers' own stats are not collected, 'render' is the time
+        # spent waiting for them, including parsing the chunks submitted
+        chunks = render_cues_parallel(cues, to_format, metadata, jobs, job_chunk_size, style_model)
+        if stats is not None:
+            chunks = stats.timed(chunks, 'render')
+        count = 0
+        for size, output in chunks:
+            out.write(output)
+            count += size
+        if stats is not None:
+            stats.count('write.{0}.cues'.format(to_format.name), count)
+    elif style_model == 'runs':
+        count = write_runs(cues, to_format, metadata, out, stats)
+    else:
+        count = write_cues(tokenize_cues(cues, stats), to_format, metadata, out, stats)
+    out.flush()
+
+    return count
+
+def convert_lines(lines, from_format, to_format, out_stream, metadata, chunk_size = CHUNK_SIZE):
+    out = ChunkedWriter(out_stream, chunk_size, 'write.{0}.chars'.format(to_format.name))
+    count = transcode(lines, from_format, to_format, metadata, out)
+    out.flush()
+    return count
+
+def convert_cached(in_stream, from_format, to_format, out_stream, metadata, cache, **options):
+    text = ''.join(in_stream)
+    key = cache.key(text, from_format, to_format, metadata)
+    return write_cached(cache, key, out_stream, lambda output: convert(StringIO(text), from_format, to_format, output, metadata, **options))
+
+# writes the cached output of key, calling convert_to(output) to create it on a miss
+def write_cached(cache, key, out_stream, convert_to):
+    stats = instrumentation.active.get()
+
+    entry = cache.get(key)
+    if entry is None:
+        output = StringIO()
+        count = convert_to(output)
+        entry = (count, output.getvalue())
+        cache.put(key, *entry)
+
+        if stats is not None:
+            stats.count('cache.misses')
+    elif stats is not None:
+        stats.count('cache.hits')
+
+    out_stream.write(entry[1])
+    return entry[0]
+
+# An output of convert_many, metadata=None uses the metadata of the source
+class Target:
+    def __init__(self, to_format, out_stream, metadata = None):
+        self.to_format = get_format(to_format)
+        self.out_stream = out_stream
+        self.metadata = metadata
+
+class TargetWriter:
+    def __init__(self, target, metadata, chunk_size, stats):
+        self.to_format = target.to_format
+        self.metadata = target.metadata or metadata
+        self.name = 'write.' + str(self.to_format.name)
+        self.stats = stats
+        self.out = ChunkedWriter(target.out_stream, chunk_size, self.name + '.chars', stats)
+        self.count = 0
+
+    def write(self, cue, tokens):
+        if self.stats is None:
+            self.to_format.write_cue(cue, self.metadata, self.out, tokens)
+        else:
+            started = perf_counter()
+            self.to_format.write_cue(cue, self.metadata, self.out, tokens)
+            self.stats.add_time(self.name, perf_counter() - started)
+        self.count += 1
+
+    def close(self):
+        self.out.flush()
+        if self.stats is not None:
+            self.stats.count(self.name + '.cues', self.count)
+
+# Writes batches of (cue, tokens) from a bounded queue until it gets None.
+# After an error the queue is still drained, so the producer never blocks.
+class WriterThread(Thread):
+    def __init__(self, writer):
+        super().__init__(daemon=True)
+        self.writer = writer
+        self.queue = Queue(WRITE_QUEUE_SIZE)
+        self.error = None
+
+    def run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                break
+            if self.error is not None:
+                continue
+
+            try:
+                for cue, tokens in batch:
+                    self.writer.write(cue, tokens)
+            except Exception as e:
+                self.error = e
+
+        if self.error is None:
+            try:
+                self.writer.close()
+            except Exception as e:
+                self.error = e
+
+# Parses and tokenizes the input once and writes every cue to all targets,
+# Target objects or (to_format, out_stream[, metadata]) tuples, e.g. with a
+# different fps per MicroDVD target. Each tree is traversed once and the
+# token list is shared by the writers. With threads every target is written
+# by its own thread fed through a bounded queue, so slow sinks overlap.
+# Returns the number of cues.
+def convert_many(in_stream, from_format, targets, metadata = None, chunk_size = CHUNK_SIZE, threads = False):
+    metadata = metadata or Metadata()
+    targets = [t if isinstance(t, Target) else Target(*t) for t in targets]
+    if from_format is None:
+        from_format, in_stream = detect_format(in_stream)
+    else:
+        from_format = get_format(from_format)
+
+    stats = instrumentation.active.get()
+    cues = from_format.parse_cue(in_stream, metadata)
+    if stats is not None:
+        name = 'parse.' + str(from_format.name)
+        cues = stats.timed(cues, name, name + '.cues')
+    cues = tokenize_cues(cues, stats)
+
+    if threads:
+        return write_threaded(cues, targets, metadata, chunk_size, stats)
+
+    writers = [TargetWriter(target, metadata, chunk_size, stats) for target in targets]
+    count = 0
+    for cue in cues:
+        tokens = list(Token.depth_first_generator(cue.tree))
+        for writer in writers:
+            writer.write(cue, tokens)
+        count += 1
+
+    for writer in writers:
+        writer.close()
+    return count
+
+# the threads collect their own stats, merged into stats when they are done
+def write_threaded(cues, targets, metadata, chunk_size, stats):
+    threads = []
+    for target in targets:
+        thread = WriterThread(TargetWriter(target, metadata, chunk_size, None if stats is None else instrumentation.Stats()))
+        thread.start()
+        threads.append(thread)
+
+    count = 0
+    try:
+        while True:
+            batch = [(cue, list(Token.depth_first_generator(cue.tree))) for cue in islice(cues, WRITE_BATCH_SIZE)]
+            # a failed target stops the conversion early
+            if not batch or any(thread.error is not None for thread in threads):
+                break
+
+            for thread in threads:
+                thread.queue.put(batch)
+            count += len(batch)
+    finally:
+        for thread in threads:
+            thread.queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    for thread in threads:
+        if thread.error is not None:
+            raise thread.error
+        if stats is not None:
+            stats.merge(thread.writer.stats)
+    return count
@@ -0,0 +1,143 @@
+import codecs
+import mmap
+import os
+from contextlib import contextmanager
+from io import StringIO
+
+import regex as re
+
+from .formats.detect import detect_format
+
+# bytes of the input looked at to guess the encoding and the format
+SNIFF_SIZE = 64 * 1024
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+# syntax characters of the supported formats, see is_ascii_compatible
+SYNTAX = '\n0123456789[]{}<>/|:,-'
+
+HIGH_BYTES = bytes(range(0x80, 0x100))
+# a line break of universal newlines that byte level readers don't split at
+BARE_CR_RE = re.compile(rb'\r(?!\n)')
+# a byte of the upper half next to an ASCII letter
+MIXED_RE = re.compile(rb'[A-Za-z][\x80-\xFF]|[\x80-\xFF][A-Za-z]')
+
+# yields the file mapped into memory, empty files can not be mapped and yield b''
+@contextmanager
+def map_file(path):
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            yield b''
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield buffer
+
+# whether the syntax of the formats is encoded as plain ASCII bytes, so cue
+# boundaries can be found without decoding
+def is_ascii_compatible(encoding):
+    try:
+        return SYNTAX.encode(encoding) == SYNTAX.encode('ascii')
+    except (LookupError, UnicodeEncodeError):
+        return False
+
+# Whether the lines of the buffer can be found at the byte level: the
+# encoding is ASCII compatible and no line ends in a bare '\r', e.g. of a
+# classic Mac file, which only the text parsers' universal newlines split.
+def has_byte_lines(buffer, encoding, offset = 0):
+    return is_ascii_compatible(encoding) and not BARE_CR_RE.search(buffer, offset)
+
+# returns (encoding, offset of the text after a byte order mark)
+def get_bom(buffer):
+    for bom, encoding in BOMS:
+        if buffer[:len(bom)] == bom:
+            return encoding, len(bom)
+    return None, 0
+
+# returns (encoding, offset of the text) guessed from a byte order mark, zero
+# bytes of UTF-16 text and a UTF-8 trial decode. Otherwise the text is cp1250
+# or cp1251: cp1250 words are ASCII letters with a few accented letters of
+# the upper half in between, while cp1251 words are entirely Cyrillic, from
+# the upper half, and rarely touch an ASCII letter.
+def sniff_encoding(buffer):
+    encoding, offset = get_bom(buffer)
+    if encoding:
+        return encoding, offset
+
+    sample = bytes(buffer[:SNIFF_SIZE])
+    half = len(sample) // 2
+    if half:
+        even_zeros = sample[0::2].count(0)
+        odd_zeros = sample[1::2].count(0)
+        if odd_zeros > half * 0.4 and even_zeros < half * 0.05:
+            return 'utf-16-le', 0
+        if even_zeros > half * 0.4 and odd_zeros < half * 0.05:
+            return 'utf-16-be', 0
+
+    if is_utf8(buffer):
+        return 'utf-8', 0
+
+    high = len(sample) - len(sample.translate(None, HIGH_BYTES))
+    mixed = len(MIXED_RE.findall(sample))
+    return ('cp1251' if mixed < high * 0.25 else 'cp1250'), 0
+
+# validates the whole buffer in chunks, so a late invalid byte is not missed
+# and memory use does not depend on the file size
+def is_utf8(buffer):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for start in range(0, len(buffer), SNIFF_SIZE):
+            chunk = buffer[start:start + SNIFF_SIZE]
+            if not chunk.isascii():
+                decoder.decode(chunk)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+# returns the offset of the text, skipping a byte order mark of the given encoding
+def get_offset(buffer, encoding):
+    bom_encoding, offset = get_bom(buffer)
+    if bom_encoding and codecs.lookup(bom_encoding).name == codecs.lookup(encoding).name:
+        return offset
+    return 0
+
+# guesses the format from the leading lines of the buffer
+def detect_buffer(buffer, encoding, offset = 0, formats = None):
+    head = bytes(buffer[offset:offset + SNIFF_SIZE])
+    complete = offset + len(head) >= len(buffer)
+
+    lines = codecs.getincrementaldecoder(encoding)('replace').decode(head, final=complete).splitlines(True)
+    if not complete and len(lines) > 1:
+        # the last line may be cut
+        lines.pop()
+
+    return detect_format(lines, formats)[0]
+
+# yields the decoded lines of a buffer with byte lines, see has_byte_lines,
+# including the line breaks
+def iter_buffer_lines(buffer, encoding, offset = 0):
+    size = len(buffer)
+    pos = offset
+    while pos < size:
+        end = buffer.find(b'\n', pos)
+        end = size if end < 0 else end + 1
+        yield buffer[pos:end].decode(encoding)
+        pos = end
+
+# yields the cues of the buffer, only the cue texts are decoded when it has
+# byte lines, other input such as UTF-16 is decoded as a whole
+def parse_buffer(buffer, from_format, metadata, encoding = None, offset = None):
+    if encoding is None:
+        encoding, offset = sniff_encoding(buffer)
+    elif offset is None:
+        offset = get_offset(buffer, encoding)
+
+    if has_byte_lines(buffer, encoding, offset):
+        return from_format.parse_buffer(buffer, metadata, encoding, offset)
+
+    return from_format.parse_cue(StringIO(bytes(buffer[offset:]).decode(encoding), newline=None), metadata)
@@ -0,0 +1,119 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .formats.base import Cue, Metadata
+from .formats.detect import detect_format
+from .pipeline import CHUNK_SIZE, ChunkedWriter, get_format, write_cues
+from .utils.timing import to_milliseconds
+
+# Columnar cues: index, start and end (integer milliseconds) are int64 NumPy
+# arrays, text and tree are lists. Retiming operations work on the whole
+# columns in place and return the table, so they can be chained. Times that
+# would become negative are clipped to 0, which every format can write.
+class CueTable:
+    def __init__(self, index, start, end, text, tree = None):
+        if np is None:
+            raise ImportError('CueTable requires numpy, install pysubconv[numpy]')
+
+        self.index = np.array(index, dtype=np.int64)
+        self.start = np.array(start, dtype=np.int64)
+        self.end = np.array(end, dtype=np.int64)
+        self.text = list(text)
+        self.tree = list(tree) if tree is not None else [None] * len(self.text)
+
+        if not len(self.index) == len(self.start) == len(self.end) == len(self.text) == len(self.tree):
+            raise Exception('Columns of different lengths')
+
+    @classmethod
+    def from_cues(cls, cues):
+        index, start, end, text, tree = [], [], [], [], []
+        for cue in cues:
+            index.append(cue.index)
+            start.append(cue.start_ms)
+            end.append(cue.end_ms)
+            text.append(cue.text)
+            tree.append(cue.tree if cue.is_tokenized else None)
+        return cls(index, start, end, text, tree)
+
+    # reads a whole stream, from_format=None detects the format
+    @classmethod
+    def read(cls, in_stream, from_format = None, metadata = None):
+        metadata = metadata or Metadata()
+        if from_format is None:
+            from_format, in_stream = detect_format(in_stream)
+        else:
+            from_format = get_format(from_format)
+        return cls.from_cues(from_format.parse_cue(in_stream, metadata))
+
+    def __len__(self):
+        return len(self.text)
+
+    def to_cues(self):
+        for index, start, end, text, tree in zip(self.index.tolist(), self.start.tolist(), self.end.tolist(), self.text, self.tree):
+            cue = Cue(index, start, end, text)
+            if tree is not None:
+                cue.tree = tree
+            yield cue
+
+    # offset in milliseconds or a timedelta, negative to show cues earlier
+    def shift(self, offset):
+        offset = to_milliseconds(offset)
+        self.start += offset
+        self.end += offset
+        return self.clip()
+
+    # multiplies the distance of every time from origin by factor
+    def scale(self, factor, origin = 0):
+        origin = to_milliseconds(origin)
+        return self.transform(factor, origin, origin)
+
+    # keeps the frame numbers of subtitles timed for from_fps, e.g. a
+    # 23.976 fps MicroDVD file played with a 25 fps video
+    def convert_fps(self, from_fps, to_fps):
+        return self.scale(from_fps / to_fps)
+
+    # linear correction of a constant offset and drift, moving time source1
+    # to target1 and source2 to target2
+    def sync(self, source1, target1, source2, target2):
+        source1, target1, source2, target2 = (to_milliseconds(t) for t in (source1, target1, source2, target2))
+        if source1 == source2:
+            raise Exception('Sync points must have different source times')
+
+        return self.transform((target2 - target1) / (source2 - source1), source1, target1)
+
+    # maps every time t to target + round((t - source) * factor)
+    def transform(self, factor, source, target):
+        for column in (self.start, self.end):
+            times = column.astype(np.float64)
+            times -= source
+            times *= factor
+            np.rint(times, out=times)
+            times += target
+            column[:] = times
+        return self.clip()
+
+    def clip(self):
+        np.maximum(self.start, 0, out=self.start)
+        np.maximum(self.end, 0, out=self.end)
+        return self
+
+    def renumber(self, first = 1):
+        self.index[:] = np.arange(first, first + len(self))
+        return self
+
+    # writes every cue to out, trees missing from the table are tokenized once and kept
+    def write(self, to_format, out_stream, metadata = None, chunk_size = CHUNK_SIZE):
+        metadata = metadata or Metadata()
+        to_format = get_format(to_format)
+        out = ChunkedWriter(out_stream, chunk_size)
+        count = write_cues(self.tokenized_cues(), to_format, metadata, out)
+        out.flush()
+        return count
+
+    def tokenized_cues(self):
+        for i, cue in enumerate(self.to_cues()):
+            if self.tree[i] is None:
+                self.tree[i] = cue.tree
+            yield cue
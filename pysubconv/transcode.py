@@ -0,0 +1,81 @@
+from .formats.microdvd import MicroDVDFormat
+from .formats.mpl2 import MPL2Format
+from .utils import instrumentation
+from .utils.timing import frames_to_milliseconds, milliseconds_to_frames
+
+# Direct line by line conversion between the line based formats, rewriting the
+# timing prefix and the italics prefix of every '|' separated line without
+# building cues and token trees. A line that can't be mapped directly, i.e.
+# any other style or an invalid line, takes the general path, so the output
+# is the same as convert's.
+
+# returns the converted line or None
+def mpl2_to_microdvd(line, metadata):
+    match = MPL2Format.cue_re.match(line)
+    if not match:
+        return None
+
+    text = match.group('text')
+    if '<' in text or '{' in text:
+        return None
+
+    if '/' in text:
+        text = '|'.join('{y:i}' + part[1:] if part.startswith('/') else part for part in text.split('|'))
+
+    # deciseconds -> milliseconds -> frames, like MPL2Format.make_cue and MicroDVDFormat.write_cue
+    start = milliseconds_to_frames(int(match.group('start_time')) * 100, metadata.fps)
+    end = milliseconds_to_frames(int(match.group('end_time')) * 100, metadata.fps)
+    return '{' + str(start) + '}{' + str(end) + '}' + text + '\n'
+
+def microdvd_to_mpl2(line, metadata):
+    match = MicroDVDFormat.cue_re.match(line)
+    if not match:
+        return None
+
+    text = match.group('text')
+    if '<' in text:
+        return None
+
+    if '{' in text:
+        parts = []
+        for part in text.split('|'):
+            if part.startswith('{y:i}') or part.startswith('{Y:i}'):
+                part = '/' + part[5:]
+            if '{' in part:
+                return None
+            parts.append(part)
+        text = '|'.join(parts)
+
+    # frames -> milliseconds -> deciseconds, like MicroDVDFormat.make_cue and MPL2Format.write_cue
+    start = frames_to_milliseconds(int(match.group('start_frame')), metadata.fps) // 100
+    end = frames_to_milliseconds(int(match.group('end_frame')), metadata.fps) // 100
+    return '[' + str(start) + '][' + str(end) + ']' + text + '\n'
+
+# (from format, to format) -> function converting one stripped line
+transcoders = {
+    (MPL2Format, MicroDVDFormat): mpl2_to_microdvd,
+    (MicroDVDFormat, MPL2Format): microdvd_to_mpl2,
+}
+
+def get_transcoder(from_format, to_format):
+    return transcoders.get((from_format, to_format))
+
+# converts the lines of a from_format input to out, returns the number of cues
+def transcode(lines, from_format, to_format, metadata, out):
+    convert_line = transcoders[(from_format, to_format)]
+    index = fallbacks = 0
+    for line in lines:
+        index += 1
+        converted = convert_line(line.strip(), metadata)
+        if converted is None:
+            fallbacks += 1
+            to_format.write_cue(from_format.parse_line(index, line, metadata), metadata, out)
+        else:
+            out.write(converted)
+
+    stats = instrumentation.active.get()
+    if stats is not None:
+        stats.count('transcode.lines', index)
+        stats.count('transcode.fallbacks', fallbacks)
+
+    return index
@@ -0,0 +1,72 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Counters and timers of the conversion stages, keyed by dotted names such as
+# 'parse.srt.cues' or 'tokenize.regex_searches'. Nothing is collected unless a
+# collect_stats() block is active, instrumented code only checks whether
+# `active.get()` is None.
+class Stats:
+    def __init__(self):
+        self.counters = {}
+        self.timers = {}
+
+    def count(self, name, value = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_time(self, name, seconds):
+        self.timers[name] = self.timers.get(name, 0) + seconds
+
+    # yields the items of iterable, adding the time spent producing them to name
+    def timed(self, iterable, name, counter = None):
+        iterator = iter(iterable)
+        clock = time.perf_counter
+        while True:
+            started = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(name, clock() - started)
+                return
+            self.add_time(name, clock() - started)
+
+            if counter:
+                self.count(counter)
+            yield item
+
+    def merge(self, other):
+        for name, value in other.counters.items():
+            self.count(name, value)
+        for name, seconds in other.timers.items():
+            self.add_time(name, seconds)
+
+    def __getstate__(self):
+        return {'counters': self.counters, 'timers': self.timers}
+
+    def __setstate__(self, state):
+        self.counters = state['counters']
+        self.timers = state['timers']
+
+    def report(self):
+        lines = ['{0:<40} {1:>14}'.format(name, value) for name, value in sorted(self.counters.items())]
+        lines += ['{0:<40} {1:>13.3f}s'.format(name, seconds) for name, seconds in sorted(self.timers.items())]
+        return '\n'.join(lines)
+
+# the Stats of the innermost collect_stats() block, per thread and asyncio task
+active = ContextVar('active_stats', default=None)
+
+# Collects stats of everything converted inside the block. callback, if
+# given, is called with the Stats when the block exits.
+@contextmanager
+def collect_stats(callback = None):
+    previous = active.get()
+    stats = Stats()
+    token = active.set(stats)
+    try:
+        yield stats
+    finally:
+        active.reset(token)
+        if previous is not None:
+            previous.merge(stats)
+        if callback:
+            callback(stats)
@@ -0,0 +1,238 @@
+from .token import NEWLINE_TOKEN, StyleToken, TextToken, Token, TokenType, style_types
+
+# Style types are compared by their _value_, the Enum value property and
+# hashing members are slow; the bit of a kind in a run mask is 1 << kind.
+
+# Flat alternative to the token tree of a cue: text is the cue text without
+# markup, line breaks as '\n', and runs cover it in order with
+# (offset, length, mask, styles) tuples. mask has the bit 1 << kind of every
+# style kind active over the run, kind being the StyleType value without the
+# end flag, and styles refers to their start tokens, holding the style data,
+# in the order they were opened. Runs without a change of styles share the
+# tuple.
+#
+# A kind is active at most once: a start of an active kind, e.g. a nested
+# font color, replaces its data until its end, an end closes the innermost
+# start of its kind and an end without a start closes nothing. Writers emit
+# the tags of the kinds whose bit or data changed between two runs, so styles
+# opened and closed without text between them are dropped. The last run may
+# be empty, it closes the styles ended after the last text.
+class StyleRuns:
+    __slots__ = ('text', 'runs')
+
+    def __init__(self, text, runs):
+        self.text = text
+        self.runs = runs
+
+    # Runs of a cue. The text of a cue is scanned with the formats' style
+    # handlers without building a tree, a cue tokenized before is read from
+    # its tree, which may differ from the text, e.g. for merged cues.
+    @classmethod
+    def from_cue(cls, cue):
+        # imported here, the tokenizer depends on the format registry
+        from .tokenizer import Tokenizer
+
+        if cue.is_tokenized:
+            return cls.from_tree(cue.tree)
+        if Tokenizer.is_plain(cue.text):
+            return cls.plain(cue.text)
+
+        builder = RunBuilder()
+        Tokenizer.scan(cue.text, RootCursor(builder), builder.add_text)
+        return builder.finish()
+
+    @classmethod
+    def plain(cls, text):
+        return cls(text, [(0, len(text), 0, ())])
+
+    @classmethod
+    def from_tree(cls, root):
+        builder = RunBuilder()
+        for token in Token.depth_first_generator(root):
+            builder.add(token)
+        return builder.finish()
+
+    # Yields the text of every run as a str and, between runs, the end
+    # tokens of the styles closed, innermost first, and the start tokens of
+    # the styles opened, found from the masks of the runs.
+    def items(self):
+        text = self.text
+        previous_mask = 0
+        previous = ()
+        for offset, length, mask, styles in self.runs:
+            if styles is not previous:
+                closed = previous_mask & ~mask
+                opened = mask & ~previous_mask
+                kept = previous_mask & mask
+                if kept:
+                    # a kind kept with other data is closed and opened again,
+                    # there is at most one token per kind, so these are a
+                    # few compares
+                    for token in previous:
+                        if 1 << token.style_type._value_ & kept:
+                            for other in styles:
+                                if other.style_type is token.style_type:
+                                    if other is not token and (other.style_data != token.style_data or
+                                                               other.format_data != token.format_data):
+                                        closed |= 1 << token.style_type._value_
+                                        opened |= 1 << token.style_type._value_
+                                    break
+
+                if closed:
+                    for token in reversed(previous):
+                        if 1 << token.style_type._value_ & closed:
+                            yield get_end_token(token)
+                if opened:
+                    for token in styles:
+                        if 1 << token.style_type._value_ & opened:
+                            yield token
+                previous_mask = mask
+                previous = styles
+            if length:
+                yield text[offset:offset + length]
+
+    # the pre-order tokens of a tree write_tokens would write the runs from
+    def tokens(self):
+        for item in self.items():
+            if item.__class__ is not str:
+                yield item
+                continue
+
+            for index, line in enumerate(item.split('\n')):
+                if index:
+                    yield NEWLINE_TOKEN
+                if line:
+                    yield TextToken(line)
+
+# the shared end token of a start token, writers don't use the style data of ends
+def get_end_token(token):
+    return StyleToken.shared(token.format_class, style_types[token.style_type._value_ | 0b10000000], None, token.format_data)
+
+# Builds StyleRuns from texts and the tokens of a cue in pre-order.
+class RunBuilder:
+    __slots__ = ('parts', 'runs', 'opened', 'mask', 'styles', 'start', 'pos')
+
+    def __init__(self):
+        self.parts = []
+        self.runs = []
+        # the start tokens not ended yet, styles has the innermost of every kind
+        self.opened = []
+        self.mask = 0
+        self.styles = ()
+        self.start = self.pos = 0
+
+    def add_text(self, text):
+        self.parts.append(text)
+        self.pos += len(text)
+
+    def add(self, token):
+        type = token.type
+        if type is TokenType.STYLE:
+            value = token.style_type._value_
+            if value & 0b10000000:
+                self.close(value & 0b01111111)
+            else:
+                self.open(token)
+        elif type is TokenType.TEXT:
+            self.add_text(token.data)
+        elif type is TokenType.NEWLINE:
+            self.add_text('\n')
+
+    def open(self, token):
+        if self.pos > self.start:
+            self.runs.append((self.start, self.pos - self.start, self.mask, self.styles))
+            self.start = self.pos
+        self.opened.append(token)
+        bit = 1 << token.style_type._value_
+        if self.mask & bit:
+            self.update()
+        else:
+            self.mask |= bit
+            self.styles += (token,)
+
+    # ends the innermost style of the kind
+    def close(self, kind):
+        opened = self.opened
+        for i in range(len(opened) - 1, -1, -1):
+            if opened[i].style_type._value_ == kind:
+                break
+        else:
+            return
+
+        self.cut()
+        token = opened.pop(i)
+        styles = self.styles
+        if styles and styles[-1] is token and i == len(opened):
+            # the innermost style, ended with no other start of its kind open
+            for other in opened:
+                if other.style_type._value_ == kind:
+                    break
+            else:
+                self.mask &= ~(1 << kind)
+                self.styles = styles[:-1]
+                return
+        self.update()
+
+    def update(self):
+        mask = 0
+        styles = []
+        for token in reversed(self.opened):
+            bit = 1 << token.style_type._value_
+            if not mask & bit:
+                mask |= bit
+                styles.append(token)
+        styles.reverse()
+        self.mask = mask
+        self.styles = tuple(styles)
+
+    # ends the run with the styles before a change at pos, changes without
+    # text between them make one
+    def cut(self):
+        if self.pos > self.start:
+            self.runs.append((self.start, self.pos - self.start, self.mask, self.styles))
+            self.start = self.pos
+
+    def finish(self):
+        self.runs.append((self.start, self.pos - self.start, self.mask, self.styles))
+        return StyleRuns(''.join(self.parts), self.runs)
+
+# Stand-ins for the open token of the tree while the text of a cue is
+# scanned: the style handlers append their tokens to them as they would to
+# the tree, and they pass them on to a RunBuilder instead of keeping them as
+# children. An appended start token becomes the next open token, with the
+# cursor it was appended to as its parent.
+class CursorMixin:
+    __slots__ = ()
+
+    def append(self, child):
+        builder = self.builder
+        if child.type is TokenType.STYLE:
+            value = child.style_type._value_
+            if value & 0b10000000:
+                builder.close(value & 0b01111111)
+                return child
+            builder.open(child)
+            return StyleCursor(builder, child, self)
+        builder.add(child)
+        return child
+
+class RootCursor(CursorMixin, Token):
+    __slots__ = ('builder',)
+
+    def __init__(self, builder):
+        super().__init__(TokenType.ROOT)
+        self.builder = builder
+
+class StyleCursor(CursorMixin, StyleToken):
+    __slots__ = ('builder',)
+
+    # sets the slots of StyleToken itself, a cursor is made for every start
+    def __init__(self, builder, token, parent):
+        self.parent = parent
+        self.type = TokenType.STYLE
+        self._children = None
+        self.format_class = token.format_class
+        self.style_type = token.style_type
+        self.style_data = token.style_data
+        self.format_data = token.format_data
+        self.builder = builder
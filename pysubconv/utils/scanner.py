@@ -0,0 +1,48 @@
+import regex as re
+
+# Scans text for the style markup of several formats at once. Every style
+# pattern is wrapped in a named group of one alternation, so a line is walked
+# once from left to right using positions instead of slicing off the consumed
+# part. Formats whose patterns only apply in some contexts (see
+# SubtitleFormat.can_match) get a separate alternation per context.
+class StyleScanner:
+    def __init__(self, formats):
+        self.formats = formats
+        self.guarded = [sf for sf in formats if sf.has_match_guard()]
+        self.patterns = {}
+
+    def get_pattern(self, current):
+        key = tuple(sf.can_match(current) for sf in self.guarded)
+
+        entry = self.patterns.get(key)
+        if entry is None:
+            disabled = {sf for sf, enabled in zip(self.guarded, key) if not enabled}
+
+            alternatives = []
+            for sf in self.formats:
+                if sf in disabled:
+                    continue
+                for style_re, handler in sf.style_patterns:
+                    alternatives.append(('s{0}'.format(len(alternatives)), style_re, sf.match_handlers[style_re]))
+
+            groups = ['(?P<{0}>{1})'.format(name, style_re.pattern) for name, style_re, handler in alternatives]
+            entry = (re.compile('|'.join(groups)) if groups else None, alternatives)
+            self.patterns[key] = entry
+
+        return entry
+
+    # returns (handler, match) of the first style at or after pos, where match
+    # comes from the format's own pattern and handler creates its tokens
+    def search(self, text, pos, current):
+        pattern, alternatives = self.get_pattern(current)
+        if pattern is None:
+            return None
+
+        match = pattern.search(text, pos)
+        if not match:
+            return None
+
+        # lastgroup is unreliable when formats reuse inner group names
+        for name, style_re, handler in alternatives:
+            if match.start(name) >= 0:
+                return handler, style_re.match(text, match.start())
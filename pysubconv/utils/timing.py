@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+# Cue times are integer milliseconds. A millisecond is finer than a frame at
+# any practical frame rate, so frames -> ms -> frames at the same fps is exact.
+
+def to_milliseconds(value):
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, timedelta):
+        return (value.days * 86400 + value.seconds) * 1000 + (value.microseconds + 500) // 1000
+    raise TypeError('Unsupported time value: {0!r}'.format(value))
+
+def to_timedelta(ms):
+    if ms is None:
+        return None
+    return timedelta(milliseconds=ms)
+
+def frames_to_milliseconds(frame, fps):
+    return int(round(frame * 1000 / fps))
+
+def milliseconds_to_frames(ms, fps):
+    return int(round(ms * fps / 1000))
@@ -7,34 +7,77 @@ class TokenType(Enum):
     NEWLINE = 3
     END = 4
 
+class TokenEvent(Enum):
+    ENTER = 0
+    EXIT = 1
+
+# Tokens use __slots__ and only allocate a children list once something is
+# appended, since most tokens of a tree are leaves.
 class Token:
+    __slots__ = ('parent', 'type', '_children')
+
     def __init__(self, type, parent = None):
         self.parent = parent
         self.type = type
-        self.children = list()
+        self._children = None
+
+    @property
+    def children(self):
+        return self._children or ()
 
     def append(self, child):
-        child.parent = self
-        self.children.append(child)
+        child.adopt(self)
+        if self._children is None:
+            self._children = [child]
+        else:
+            self._children.append(child)
         return child
 
+    def adopt(self, parent):
+        self.parent = parent
+
     def print_tree(self, depth = 0):
-        print('\t' * depth, end='')
-        print(self.__repr__())
+        stack = [(self, depth)]
+        while stack:
+            token, depth = stack.pop()
+            print('\t' * depth, end='')
+            print(token.__repr__())
 
-        for c in self.children:
-            c.print_tree(depth + 1)
+            if token._children:
+                stack.extend((c, depth + 1) for c in reversed(token._children))
 
     def __repr__(self):
         return '[{0}]'.format( TokenType(self.type).name )
 
+    # pre-order traversal with an explicit stack, so the cost per token does
+    # not depend on the depth of the tree
     @classmethod
     def depth_first_generator(cls, token):
-        yield token
-        for c in token.children:
-            yield from cls.depth_first_generator(c)
+        stack = [token]
+        while stack:
+            token = stack.pop()
+            yield token
+
+            if token._children:
+                stack.extend(reversed(token._children))
+
+    # yields (TokenEvent.ENTER, token) before and (TokenEvent.EXIT, token)
+    # after the children of every token
+    @classmethod
+    def walk(cls, token):
+        stack = [(TokenEvent.ENTER, token)]
+        while stack:
+            event, token = stack.pop()
+            yield event, token
+
+            if event == TokenEvent.ENTER:
+                stack.append((TokenEvent.EXIT, token))
+                if token._children:
+                    stack.extend((TokenEvent.ENTER, c) for c in reversed(token._children))
 
 class TextToken(Token):    
+    __slots__ = ('data',)
+
     def __init__(self, data = None):
         super().__init__(TokenType.TEXT)
         self.data = data
@@ -63,6 +106,8 @@ class StyleType(Enum):
 # style_data = data that will be used by other formats
 # format_data = data that should only be used by current format
 class StyleToken(Token):
+    __slots__ = ('format_class', 'style_type', 'style_data', 'format_data')
+
     def __init__(self, format_class, style_type, style_data = None, format_data = None):
         super().__init__(TokenType.STYLE)
         self.format_class = format_class
@@ -72,7 +117,103 @@ class StyleToken(Token):
 
     # TODO: better way for closing type, see @StyleType
     def get_closing_token(self):
-        return StyleToken(self.format_class, StyleType(self.style_type.value + 0b10000000), self.style_data, self.format_data)
+        return StyleToken.shared(self.format_class, StyleType(self.style_type.value + 0b10000000), self.style_data, self.format_data)
+
+    # Returns an immutable instance shared by every tree, meant for leaves
+    # such as closing tokens. Only closing tokens without style data are
+    # interned, format data such as a StyleRange takes a few values, so the
+    # instances stay bounded; any other token is a new one.
+    @staticmethod
+    def shared(format_class, style_type, style_data = None, format_data = None):
+        if style_data is not None or not style_type.value & 0b10000000:
+            return StyleToken(format_class, style_type, style_data, format_data)
+
+        key = (format_class, style_type, format_data)
+        try:
+            token = shared_style_tokens.get(key)
+        except TypeError:
+            return StyleToken(format_class, style_type, style_data, format_data)
+
+        if token is None:
+            token = shared_style_tokens[key] = SharedStyleToken(format_class, style_type, None, format_data)
+        return token
 
     def __repr__(self):
-        return '{0}[{1}, {2}, {3}]'.format( super().__repr__(), StyleType(self.style_type).name, self.style_data, self.format_data)
\ No newline at end of file
+        return '{0}[{1}, {2}, {3}]'.format( super().__repr__(), StyleType(self.style_type).name, self.style_data, self.format_data)
+
+# Shared tokens have no parent and can not be modified or get children, so a
+# single instance can be appended to any number of trees.
+class SharedTokenMixin:
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError('Shared tokens are immutable')
+        object.__setattr__(self, name, value)
+
+    def adopt(self, parent):
+        pass
+
+class SharedToken(SharedTokenMixin, Token):
+    __slots__ = ()
+
+class SharedStyleToken(SharedTokenMixin, StyleToken):
+    __slots__ = ()
+
+NEWLINE_TOKEN = SharedToken(TokenType.NEWLINE)
+END_TOKEN = SharedToken(TokenType.END)
+shared_tokens = {TokenType.NEWLINE: NEWLINE_TOKEN, TokenType.END: END_TOKEN}
+shared_style_tokens = {}
+
+# Flattened pre-order form of a tree, a list of tuples that pickles much
+# smaller and faster than the linked tokens:
+#   TEXT:         (TokenType.TEXT.value, data)
+#   STYLE:        (TokenType.STYLE.value, child count, style type value, style_data, format_class, format_data)
+#   ROOT/NEWLINE/END: (type value, child count)
+def flatten_tree(root):
+    records = []
+    for token in Token.depth_first_generator(root):
+        if token.type == TokenType.TEXT:
+            records.append((TokenType.TEXT.value, token.data))
+        elif token.type == TokenType.STYLE:
+            records.append((TokenType.STYLE.value, len(token.children), token.style_type.value, token.style_data, token.format_class, token.format_data))
+        else:
+            records.append((token.type.value, len(token.children)))
+    return records
+
+# value -> member lookups of unflatten_tree, calling an Enum is much slower
+token_types = {type.value: type for type in TokenType}
+style_types = {type.value: type for type in StyleType}
+
+def unflatten_tree(records):
+    root = None
+    stack = []
+    for record in records:
+        type = token_types[record[0]]
+        children = 0
+        if type is TokenType.TEXT:
+            token = TextToken(record[1])
+        elif type is TokenType.STYLE:
+            children = record[1]
+            style_type = style_types[record[2]]
+            if record[2] & 0b10000000 and not children:
+                token = StyleToken.shared(record[4], style_type, record[3], record[5])
+            else:
+                token = StyleToken(record[4], style_type, record[3], record[5])
+        else:
+            children = record[1]
+            token = shared_tokens[type] if type in shared_tokens and not children else Token(type)
+
+        if stack:
+            parent = stack[-1]
+            parent[0].append(token)
+            parent[1] -= 1
+            if not parent[1]:
+                stack.pop()
+        else:
+            root = token
+
+        if children:
+            stack.append([token, children])
+
+    return root
@@ -1,46 +1,106 @@
-from .token import Token, TokenType, TextToken, StyleToken
-from ..formats.base import SubtitleFormat
+from . import instrumentation
+from .token import Token, TokenType, TextToken, StyleToken, shared_tokens, NEWLINE_TOKEN, END_TOKEN
+from ..formats.registry import format_registry
 
 class Tokenizer:
+    registry = format_registry
+
     @classmethod
     def tokenize(cls, cue):
+        if cls.is_plain(cue.text):
+            return cls.tokenize_plain(cue.text)
+
         root = Token(TokenType.ROOT)
-        current = root
+        searches = cls.scan(cue.text, root)
+
+        stats = instrumentation.active.get()
+        if stats is not None:
+            stats.count('tokenize.regex_searches', searches)
+            stats.count('tokenize.tokens', sum(1 for _ in Token.depth_first_generator(root)))
+
+        return root
+
+    # Appends the tokens of text to current, the open token of a tree, with
+    # the style handlers of the registered formats. add_text, if given, gets
+    # the texts between styles instead of TextTokens. Returns the number of
+    # style searches.
+    @classmethod
+    def scan(cls, text, current, add_text = None):
+        scanner = cls.registry.scanner
+        searches = 0
 
-        lines = cue.text.split('\n')
+        lines = text.split('\n')
         for index, line in enumerate(lines):
-            while line:
-                matches = [(sf, sf.get_first_style_match(line, current)) for sf in SubtitleFormat.__subclasses__()]
-                matches = [m for m in matches if m[1] is not None]
+            pos = 0
+            while pos < len(line):
+                found = scanner.search(line, pos, current)
+                searches += 1
 
-                if not matches:
-                    current.append(TextToken(line))
+                if not found:
+                    if add_text is None:
+                        current.append(TextToken(line[pos:]))
+                    else:
+                        add_text(line[pos:])
                     break
 
-                best_format, best_match = min(matches, key=lambda o: o[1].start())
-                if best_match.start() > 0:
-                    current.append(TextToken(line[0:best_match.start()]))
-                line = line[best_match.end():]
+                handler, best_match = found
+                if best_match.start() > pos:
+                    if add_text is None:
+                        current.append(TextToken(line[pos:best_match.start()]))
+                    else:
+                        add_text(line[pos:best_match.start()])
+                pos = best_match.end()
 
-                current = best_format.process_match(best_match, current)
+                current = handler(best_match, current)
 
             if index < len(lines) - 1:
                 current = cls.process_closing_token(current, TokenType.NEWLINE)
 
-        current = cls.process_closing_token(current, TokenType.END)
+        cls.process_closing_token(current, TokenType.END)
+        return searches
+
+    # whether no trigger character of a registered format is in text, so no style can start in it
+    @classmethod
+    def is_plain(cls, text):
+        triggers = cls.registry.trigger_chars
+        if triggers is None:
+            return False
+        for c in triggers:
+            if c in text:
+                return False
+        return True
+
+    # no style can start in text, so no style token is ever open and lines are
+    # only separated by line breaks
+    @classmethod
+    def tokenize_plain(cls, text):
+        root = Token(TokenType.ROOT)
+        lines = text.split('\n')
+        for index, line in enumerate(lines):
+            if index:
+                root.append(NEWLINE_TOKEN)
+            if line:
+                root.append(TextToken(line))
+        root.append(END_TOKEN)
+
+        stats = instrumentation.active.get()
+        if stats is not None:
+            stats.count('tokenize.tokens', 1 + len(root.children))
 
         return root
 
     # TODO: method naming
     @classmethod
     def process_closing_token(cls, current, type):
-        token = Token(type)
+        token = shared_tokens[type]
 
+        iterations = 0
         last_current = None
         while last_current != current:
             last_current = current
+            iterations += 1
 
-            for sf in SubtitleFormat.__subclasses__():
+            for sf in cls.registry.closing_formats:
                 # TODO: pass only type not whole token?
                 current = sf.process_closing_token(current, token)
 
@@ -48,4 +108,9 @@ class Tokenizer:
                 raise Exception('Malformed token tree')
 
         current.append(token)
+
+        stats = instrumentation.active.get()
+        if stats is not None:
+            stats.count('tokenize.closing_iterations', iterations)
+
         return current
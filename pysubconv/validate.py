@@ -0,0 +1,224 @@
+import heapq
+import math
+
+from .formats.base import Metadata
+from .utils import instrumentation
+
+# cues held back to sort nearly sorted input, a cue starting before every cue
+# already passed on is out of order beyond repair
+REORDER_WINDOW = 64
+
+# Issue kinds and whether they are errors, warnings alone don't fail a check
+NEGATIVE = 'negative'
+ZERO_LENGTH = 'zero_length'
+OVERLAP = 'overlap'
+ORDER = 'order'
+INDEX = 'index'
+FPS = 'fps'
+ERRORS = {NEGATIVE: True, ZERO_LENGTH: False, OVERLAP: True, ORDER: True, INDEX: True, FPS: False}
+
+# reading speeds in characters per second a real subtitle file has, the
+# median of the first FPS_SAMPLE_CUES cues outside the range suggests that
+# frame times were made at another frame rate
+READING_SPEED = (4, 30)
+TYPICAL_READING_SPEED = 15
+FPS_SAMPLE_CUES = 500
+FPS_MIN_CUES = 20
+STANDARD_FPS = (23.976, 24, 25, 29.97, 30, 50, 59.94, 60)
+
+# position is the 1-based position of the cue in the input, None for issues
+# of the whole file
+class Issue:
+    __slots__ = ('kind', 'position', 'index', 'message', 'fixed')
+
+    def __init__(self, kind, position, index, message, fixed = False):
+        self.kind = kind
+        self.position = position
+        self.index = index
+        self.message = message
+        self.fixed = fixed
+
+    @property
+    def is_error(self):
+        return ERRORS[self.kind]
+
+    def as_dict(self):
+        return {'kind': self.kind, 'position': self.position, 'index': self.index, 'message': self.message, 'fixed': self.fixed}
+
+    def __str__(self):
+        where = 'cue {0}'.format(self.position) if self.position is not None else 'file'
+        return '{0}: {1}: {2}{3}'.format(where, self.kind, self.message, ' (fixed)' if self.fixed else '')
+
+    def __repr__(self):
+        return 'Issue({0})'.format(self)
+
+class Report:
+    def __init__(self):
+        self.cues = 0
+        self.issues = []
+
+    def add(self, kind, position, index, message, fixed = False):
+        self.issues.append(Issue(kind, position, index, message, fixed))
+
+    # issues per kind
+    def counts(self):
+        counts = {}
+        for issue in self.issues:
+            counts[issue.kind] = counts.get(issue.kind, 0) + 1
+        return counts
+
+    # errors left in the output
+    @property
+    def errors(self):
+        return [issue for issue in self.issues if issue.is_error and not issue.fixed]
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def as_dict(self):
+        return {'cues': self.cues, 'ok': self.ok, 'counts': self.counts(), 'issues': [issue.as_dict() for issue in self.issues]}
+
+# Validation stage of the parsed cue stream, checking for end < start, zero
+# length cues, overlaps, cues out of order, indices out of sequence and, for
+# frame based formats, times made at another frame rate. Cues pass through a
+# heap of window cues in a single sweep, so n cues take O(n log window) time
+# and nearly sorted input is sorted. With fix the cues are passed on sorted,
+# end < start is swapped, overlaps are clipped to the start of the next cue
+# and the cues are numbered from 1; without fix they pass on unchanged.
+# The frame rate is only checked when the cues' from_format is given. The
+# report of the last validate() call is kept as report. Stats count
+# 'validate.issues' and 'validate.fixed'.
+class Validator:
+    def __init__(self, fix = False, window = REORDER_WINDOW):
+        self.fix = fix
+        self.window = max(window, 1)
+        self.report = Report()
+
+    def validate(self, cues, from_format = None, metadata = None):
+        self.from_format = from_format
+        self.metadata = metadata or Metadata()
+        self.report = report = Report()
+        heap = []
+        position = 0
+        previous_start = previous_index = None
+        # the last cue passed on when fixing, the cue ending last so far with
+        # its position and the latest start swept
+        self.pending = self.last = self.swept = None
+        self.emitted = 0
+        self.speeds = []
+        self.declared_fps = None
+
+        for cue in cues:
+            position += 1
+            self.check_cue(cue, position)
+
+            if previous_start is not None and cue.start_ms < previous_start:
+                # fixed if the window sorts it, see sweep
+                report.add(ORDER, position, cue.index, 'starts at {0} ms, before the previous cue at {1} ms'.format(cue.start_ms, previous_start),
+                           self.fix)
+            previous_start = cue.start_ms
+
+            if cue.index is not None:
+                if previous_index is not None and cue.index != previous_index + 1:
+                    report.add(INDEX, position, cue.index, 'follows index {0}'.format(previous_index), self.fix)
+                previous_index = cue.index
+
+            if not self.fix:
+                yield cue
+            heapq.heappush(heap, (cue.start_ms, position, cue))
+            if len(heap) > self.window:
+                yield from self.sweep(*heapq.heappop(heap))
+
+        while heap:
+            yield from self.sweep(*heapq.heappop(heap))
+        if self.pending is not None:
+            yield self.pending
+
+        report.cues = position
+        self.check_fps()
+        report.issues.sort(key=lambda issue: (issue.position is None, issue.position or 0))
+
+        stats = instrumentation.active.get()
+        if stats is not None:
+            stats.count('validate.issues', len(report.issues))
+            stats.count('validate.fixed', sum(1 for issue in report.issues if issue.fixed))
+
+    def check_cue(self, cue, position):
+        report = self.report
+        if cue.end_ms < cue.start_ms:
+            report.add(NEGATIVE, position, cue.index, 'ends at {0} ms, before its start at {1} ms'.format(cue.end_ms, cue.start_ms), self.fix)
+            if self.fix:
+                cue.start_ms, cue.end_ms = cue.end_ms, cue.start_ms
+        elif cue.end_ms == cue.start_ms:
+            # MicroDVD files may declare their frame rate in a first {1}{1}fps cue, see check_fps
+            if not (position == 1 and self.get_declared_fps(cue) is not None):
+                report.add(ZERO_LENGTH, position, cue.index, 'starts and ends at {0} ms'.format(cue.start_ms))
+
+        if self.from_format is not None and self.from_format.frame_based and len(self.speeds) < FPS_SAMPLE_CUES:
+            if position == 1:
+                self.declared_fps = self.get_declared_fps(cue)
+            if cue.end_ms > cue.start_ms:
+                self.speeds.append(len(cue.text.replace('\n', '')) * 1000 / (cue.end_ms - cue.start_ms))
+
+    # Called with the cues in start order, as far as the window allows. With
+    # fix one cue is held back, so its end can be clipped to the next start.
+    def sweep(self, start, position, cue):
+        report = self.report
+        if self.swept is not None and start < self.swept:
+            # out of order beyond the window, reported as ORDER
+            if self.fix:
+                for issue in reversed(report.issues):
+                    if issue.kind == ORDER and issue.position == position:
+                        issue.fixed = False
+                        break
+        elif self.last is not None and self.last[0].end_ms > start:
+            other, other_position = self.last
+            # only the cue passed on last can be clipped, and not if both cues start together
+            fixed = self.fix and other is self.pending and other.start_ms < start
+            report.add(OVERLAP, position, cue.index, 'starts at {0} ms, before cue {1} ends at {2} ms'.format(start, other_position, other.end_ms),
+                       fixed)
+        if self.fix and self.pending is not None and self.pending.start_ms < start < self.pending.end_ms:
+            self.pending.end_ms = start
+        if self.last is None or cue.end_ms > self.last[0].end_ms:
+            self.last = (cue, position)
+
+        self.swept = start if self.swept is None else max(self.swept, start)
+
+        if self.fix:
+            self.emitted += 1
+            cue.index = self.emitted
+            if self.pending is not None:
+                yield self.pending
+            self.pending = cue
+
+    @staticmethod
+    def get_declared_fps(cue):
+        try:
+            fps = float(cue.text)
+        except ValueError:
+            return None
+        return fps if cue.start_ms == cue.end_ms and 1 <= fps <= 120 else None
+
+    def check_fps(self):
+        if self.from_format is None or not self.from_format.frame_based:
+            return
+
+        fps = self.metadata.fps
+        if self.declared_fps is not None and abs(self.declared_fps - fps) > 0.01:
+            self.report.add(FPS, None, None, 'declares {0} fps, read at {1} fps'.format(self.declared_fps, fps))
+            return
+
+        if len(self.speeds) < FPS_MIN_CUES:
+            return
+        speeds = sorted(self.speeds)
+        speed = speeds[len(speeds) // 2]
+        if READING_SPEED[0] <= speed <= READING_SPEED[1]:
+            return
+
+        # times are frames * 1000 / fps, at the actual frame rate f speeds are speed * f / fps
+        best = min(STANDARD_FPS, key=lambda f: abs(math.log(speed * f / fps / TYPICAL_READING_SPEED)))
+        message = 'median reading speed is {0:.1f} characters per second at {1} fps'.format(speed, fps)
+        if READING_SPEED[0] <= speed * best / fps <= READING_SPEED[1]:
+            message += ', {0} fps may be right'.format(best)
+        self.report.add(FPS, None, None, message)
@@ -4,16 +4,22 @@ setup_requirements = ['pytest-runner']
 install_requirements = ['regex']
 test_requirements = ['pytest']
 dev_requirements = []
+numpy_requirements = ['numpy']
 
 setup(
     name='pysubconv',
-    packages=find_packages(),
+    version='0.1.0',
+    packages=find_packages(exclude=['tests', 'benchmarks']),
+    entry_points={
+        'console_scripts': ['pysubconv=pysubconv.cli:main']
+    },
 
     setup_requires=setup_requirements,
     install_requires=install_requirements,
     tests_require=test_requirements,
     extras_require={
         'test': test_requirements,
-        'dev': dev_requirements
+        'dev': dev_requirements,
+        'numpy': numpy_requirements
     }
 )
\ No newline at end of file
@@ -0,0 +1,63 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from pysubconv import convert
+from pysubconv.aio import convert_async, convert_stream_async, parse_cue_async
+from pysubconv.formats.srt import SrtFormat
+
+async def chunked(data, size):
+    for i in range(0, len(data), size):
+        await asyncio.sleep(0)
+        yield data[i:i + size]
+
+async def collect(chunks):
+    return ''.join([chunk async for chunk in chunks])
+
+def test_convert_async():
+    with open('tests/test_files/srt_sample_mix.txt', 'rb') as f:
+        data = f.read().replace(b'\n', b'\r\n') * 10
+
+    expected = StringIO()
+    convert(StringIO(data.decode('utf-8')), 'srt', 'microdvd', expected)
+
+    for size in (1, 7, 4096):
+        output = asyncio.run(collect(convert_async(chunked(data, size), None, 'microdvd', batch_size=3, chunk_size=100)))
+        assert output == expected.getvalue()
+
+    with ThreadPoolExecutor(2) as executor:
+        output = asyncio.run(collect(convert_async(chunked(data, 64), 'srt', 'microdvd', executor=executor)))
+    assert output == expected.getvalue()
+
+def test_parse_cue_async():
+    async def parse():
+        with open('tests/test_files/srt_sample.txt', 'rb') as f:
+            return [cue async for cue in parse_cue_async(SrtFormat, chunked(f.read(), 5), None)]
+
+    cues = asyncio.run(parse())
+    assert [cue.index for cue in cues] == list(range(1, 10))
+
+class Writer:
+    def __init__(self):
+        self.data = b''
+        self.drained = 0
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        self.drained += 1
+
+def test_convert_stream_async():
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b'[0][25]/Hello!\n[30][45]Hello!|How are you?')
+        reader.feed_eof()
+
+        writer = Writer()
+        await convert_stream_async(reader, writer, 'mpl2', 'srt')
+        return writer
+
+    writer = asyncio.run(run())
+    assert writer.drained == 1
+    assert writer.data == b'1\n00:00:00,000 --> 00:00:02,500\n<i>Hello!</i>\n\n2\n00:00:03,000 --> 00:00:04,500\nHello!\nHow are you?\n\n'
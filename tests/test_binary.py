@@ -0,0 +1,53 @@
+import mmap
+import pickle
+from io import StringIO
+
+from pysubconv import convert
+from pysubconv.binary import BinaryCues, dump
+from pysubconv.formats.base import Metadata
+from pysubconv.formats.detect import detect_format
+from pysubconv.utils.token import flatten_tree
+
+def read_cues(name):
+    with open('tests/test_files/' + name) as f:
+        from_format, stream = detect_format(f)
+        return from_format, list(from_format.parse_cue(stream, Metadata()))
+
+def test_round_trip():
+    for name in ('srt_sample_mix.txt', 'mdvd_sample_mix.txt', 'mpl2_sample.txt'):
+        from_format, cues = read_cues(name)
+        data = dump(cues)
+        assert len(data) < len(pickle.dumps(cues))
+
+        loaded = BinaryCues(data)
+        assert len(loaded) == len(cues)
+        for cue, copy in zip(cues, loaded.cues()):
+            assert (copy.index, copy.start_ms, copy.end_ms, copy.text) == (cue.index, cue.start_ms, cue.end_ms, cue.text)
+            assert flatten_tree(copy.tree) == flatten_tree(cue.tree)
+
+def test_write_from_mapped_file(tmp_path):
+    for name in ('srt_sample_mix.txt', 'mdvd_sample_mix.txt'):
+        from_format, cues = read_cues(name)
+        path = str(tmp_path / 'cues.bin')
+        with open(path, 'wb') as f:
+            f.write(dump(cues))
+
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            loaded = BinaryCues(buffer)
+            for to_format in ('srt', 'microdvd', 'mpl2'):
+                expected = StringIO()
+                with open('tests/test_files/' + name) as source:
+                    convert(source, from_format, to_format, expected)
+                out = StringIO()
+                assert loaded.write(to_format, out) == len(cues)
+                assert out.getvalue() == expected.getvalue()
+            del loaded
+
+def test_invalid_data():
+    data = dump(read_cues('srt_sample.txt')[1])
+    for invalid in (b'', b'XXXX' + data[4:], data[:-1]):
+        try:
+            BinaryCues(invalid)
+            assert False
+        except Exception as e:
+            assert 'binary cue file' in str(e)
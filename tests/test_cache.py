@@ -0,0 +1,65 @@
+import os
+import time
+from io import StringIO
+
+from pysubconv import convert
+from pysubconv.cache import ConversionCache
+from pysubconv.formats.base import Metadata
+from pysubconv.formats.microdvd import MicroDVDFormat
+from pysubconv.formats.mpl2 import MPL2Format
+
+TEXT = '[0][25]/Hello!\n[30][45]Hello!|How are you?\n'
+
+def test_cache_hit_skips_conversion(tmp_path, monkeypatch):
+    cache = ConversionCache(str(tmp_path))
+    first = StringIO()
+    assert convert(StringIO(TEXT), 'mpl2', 'microdvd', first, cache=cache) == 2
+
+    def fail(*args):
+        raise Exception('parsed on a cache hit')
+    monkeypatch.setattr(MPL2Format, 'parse_cue', fail)
+
+    second = StringIO()
+    assert convert(StringIO(TEXT), 'mpl2', 'microdvd', second, cache=cache) == 2
+    assert second.getvalue() == first.getvalue()
+
+def test_cache_key():
+    metadata = Metadata()
+    key = ConversionCache.key(TEXT, MPL2Format, MicroDVDFormat, metadata)
+    assert key == ConversionCache.key(TEXT, MPL2Format, MicroDVDFormat, Metadata())
+    assert key != ConversionCache.key(TEXT + '\n', MPL2Format, MicroDVDFormat, metadata)
+    assert key != ConversionCache.key(TEXT, MicroDVDFormat, MPL2Format, metadata)
+
+    metadata.fps = 25
+    assert key != ConversionCache.key(TEXT, MPL2Format, MicroDVDFormat, metadata)
+
+def test_lru_eviction(tmp_path):
+    cache = ConversionCache(str(tmp_path), max_size=2500)
+    keys = ['{0:064x}'.format(i) for i in range(4)]
+
+    for key in keys[:2]:
+        cache.put(key, 1, 'x' * 1000)
+    # the first entry is used more recently than the second one
+    old = time.time() - 10
+    os.utime(cache.get_path(keys[1]), (old, old))
+    assert cache.get(keys[0])
+
+    cache.put(keys[2], 1, 'x' * 1000)
+    assert cache.get(keys[0]) and cache.get(keys[2])
+    assert cache.get(keys[1]) is None
+    assert not [name for root, dirs, files in os.walk(str(tmp_path)) for name in files if name.endswith('.part')]
+
+def test_cli_scans_cache_once(tmp_path, monkeypatch):
+    from pysubconv import cli
+
+    scans = []
+    scan_size = ConversionCache.scan_size
+    monkeypatch.setattr(ConversionCache, 'scan_size', lambda self: scans.append(self) or scan_size(self))
+
+    for name in ('a', 'b'):
+        with open(str(tmp_path / (name + '.txt')), 'w') as f:
+            f.write(TEXT.replace('Hello', name))
+        result = cli.convert_file(str(tmp_path / (name + '.txt')), str(tmp_path / (name + '.sub')), 'mpl2', 'microdvd', None, None,
+                                  cache_dir=str(tmp_path / 'cache'))
+        assert result[3] is None
+    assert len(scans) == 1
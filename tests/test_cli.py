@@ -0,0 +1,54 @@
+import os
+import shutil
+
+from pysubconv.cli import main
+
+def test_convert_directory(tmp_path):
+    source = tmp_path / 'in'
+    os.makedirs(str(source / 'season'))
+    shutil.copy('tests/test_files/srt_sample.txt', str(source / 'a.srt'))
+    shutil.copy('tests/test_files/mpl2_sample.txt', str(source / 'season' / 'b.txt'))
+
+    output = tmp_path / 'out'
+    assert main([str(source), '-t', 'microdvd', '-o', str(output), '-j', '2', '-q']) == 0
+
+    with open(str(output / 'season' / 'b.sub')) as f:
+        assert f.read() == '{0}{60}{y:i}Hello!\n{24}{60}Hello!|How are you?\n{48}{60}Hello!|How are you?|{y:i}Hello?\n'
+    assert os.path.exists(str(output / 'a.sub'))
+
+def test_failures(tmp_path, capsys):
+    with open(str(tmp_path / 'bad.srt'), 'w') as f:
+        f.write('Hello!\n')
+    shutil.copy('tests/test_files/mpl2_sample.txt', str(tmp_path / 'good.txt'))
+
+    assert main([str(tmp_path / '*'), '-t', 'srt']) == 1
+    assert not os.path.exists(str(tmp_path / 'bad.srt.part'))
+    assert os.path.exists(str(tmp_path / 'good.srt'))
+    assert '1 converted, 1 failed' in capsys.readouterr().err
+
+def test_output_encoding(tmp_path):
+    with open(str(tmp_path / 'a.txt'), 'wb') as f:
+        f.write('[0][25]Zażółć\n'.encode('cp1250'))
+
+    assert main([str(tmp_path / 'a.txt'), '-t', 'srt', '--encoding', 'cp1250', '-q']) == 0
+    with open(str(tmp_path / 'a.srt'), encoding='utf-8') as f:
+        assert 'Zażółć' in f.read()
+
+    assert main([str(tmp_path / 'a.txt'), '-t', 'srt', '--encoding', 'cp1250', '--output-encoding', 'cp1250', '-q']) == 0
+    with open(str(tmp_path / 'a.srt'), encoding='cp1250') as f:
+        assert 'Zażółć' in f.read()
+
+def test_glob_output_paths(tmp_path, capsys):
+    for season in ('s1', 's2'):
+        os.makedirs(str(tmp_path / 'extra' / season))
+        shutil.copy('tests/test_files/mpl2_sample.txt', str(tmp_path / 'extra' / season / 'e01.txt'))
+    shutil.copy('tests/test_files/srt_sample.txt', str(tmp_path / 'extra' / 's1' / 'e01.srt'))
+
+    output = tmp_path / 'out'
+    assert main([str(tmp_path / 'extra' / '**' / '*.txt'), '-t', 'microdvd', '-o', str(output), '-q']) == 0
+    assert os.path.exists(str(output / 's1' / 'e01.sub')) and os.path.exists(str(output / 's2' / 'e01.sub'))
+
+    # e01.srt and e01.txt both map to e01.sub
+    capsys.readouterr()
+    assert main([str(tmp_path / 'extra' / 's1' / '*'), '-t', 'microdvd', '-o', str(output), '-q']) == 1
+    assert '1 converted, 1 failed' in capsys.readouterr().err
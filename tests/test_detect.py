@@ -0,0 +1,41 @@
+from io import StringIO
+
+from pysubconv.formats.detect import detect_format
+from pysubconv.formats.srt import SrtFormat
+from pysubconv.formats.microdvd import MicroDVDFormat
+from pysubconv.formats.mpl2 import MPL2Format
+
+def detect_file(name):
+    with open('tests/test_files/' + name) as f:
+        text = f.read()
+
+    sf, stream = detect_format(StringIO(text))
+    assert ''.join(stream) == text
+    return sf
+
+def test_detect_samples():
+    assert detect_file('srt_sample.txt') == SrtFormat
+    assert detect_file('srt_sample_mix.txt') == SrtFormat
+    assert detect_file('mdvd_sample.txt') == MicroDVDFormat
+    assert detect_file('mdvd_sample_mix.txt') == MicroDVDFormat
+    assert detect_file('mpl2_sample.txt') == MPL2Format
+
+def test_detect_reads_bounded_prefix():
+    consumed = []
+    def lines():
+        for i in range(10000):
+            consumed.append(i)
+            yield '[{0}][{1}]Hello!\n'.format(i * 10, i * 10 + 5)
+
+    sf, stream = detect_format(lines(), max_lines=16)
+    assert sf == MPL2Format
+    assert len(consumed) == 16
+    assert len(list(MPL2Format.parse_cue(stream, None))) == 10000
+
+def test_detect_unknown():
+    try:
+        detect_format(StringIO('Hello!\nHow are you?\n'))
+    except Exception as e:
+        assert 'detect' in str(e)
+    else:
+        assert False
@@ -0,0 +1,78 @@
+from io import StringIO
+
+from pysubconv.follow import Follower, follow
+
+CUES = ['1\n00:00:01,000 --> 00:00:02,000\nHello!\n\n', '2\n00:00:03,000 --> 00:00:04,000\n<i>How are you?</i>\n\n']
+
+def test_parses_appended_data_only(tmp_path):
+    path = str(tmp_path / 'live.srt')
+    follower = Follower(path)
+    with open(path, 'w') as f:
+        f.write(CUES[0][:20])
+    assert follower.poll() == []
+
+    with open(path, 'a') as f:
+        f.write(CUES[0][20:] + CUES[1][:-1])
+    assert [cue.text for cue in follower.poll()] == ['Hello!']
+    offset = follower.offset
+
+    with open(path, 'a') as f:
+        f.write('\n')
+    assert [cue.text for cue in follower.poll()] == ['<i>How are you?</i>']
+    assert follower.offset == offset + 1
+    assert follower.poll() == [] and follower.close() == []
+
+    # a replaced file is read from the start
+    with open(path, 'w') as f:
+        f.write(CUES[1][:-1])
+    assert follower.poll() == []
+    assert [cue.index for cue in follower.close()] == [2]
+
+def test_follow_converts_until_stopped(tmp_path):
+    path = str(tmp_path / 'live.txt')
+    with open(path, 'w') as f:
+        f.write('[0][25]/Hello!\n')
+
+    polls = []
+    def stop():
+        polls.append(None)
+        if len(polls) == 2:
+            with open(path, 'a') as f:
+                f.write('[30][45]Hello!|How are you?')
+        return len(polls) == 3
+
+    out = StringIO()
+    assert follow(path, 'mpl2', 'microdvd', out, interval=0, stop=stop) == 2
+    assert out.getvalue() == '{0}{60}{y:i}Hello!\n{72}{108}Hello!|How are you?\n'
+
+def test_encoding_guessed_again_after_ascii(tmp_path):
+    path = str(tmp_path / 'live.sub')
+    follower = Follower(path)
+    with open(path, 'wb') as f:
+        f.write(b'{0}{25}Hello!\n')
+    assert [cue.text for cue in follower.poll()] == ['Hello!']
+
+    with open(path, 'ab') as f:
+        f.write('{30}{50}Zażółć gęślą jaźń\n'.encode('cp1250'))
+    assert [cue.text for cue in follower.poll()] == ['Zażółć gęślą jaźń']
+
+    with open(path, 'ab') as f:
+        f.write('{60}{80}Źdźbło\n'.encode('cp1250'))
+    assert [cue.text for cue in follower.poll()] == ['Źdźbło']
+
+def test_encoding_guessed_again_from_complete_line(tmp_path):
+    path = str(tmp_path / 'live.sub')
+    follower = Follower(path)
+    with open(path, 'wb') as f:
+        f.write(b'{0}{25}Hello!\n')
+    assert [cue.text for cue in follower.poll()] == ['Hello!']
+
+    # the encoder flushed in the middle of a character
+    data = '{30}{50}Hi\n{50}{60}Zażółć gęślą jaźń\n'.encode('utf-8')
+    with open(path, 'ab') as f:
+        f.write(data[:-12])
+    assert [cue.text for cue in follower.poll()] == ['Hi']
+
+    with open(path, 'ab') as f:
+        f.write(data[-12:])
+    assert [cue.text for cue in follower.poll()] == ['Zażółć gęślą jaźń']
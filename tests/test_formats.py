@@ -5,34 +5,44 @@ from pysubconv.formats.srt import SrtFormat
 from pysubconv.formats.microdvd import MicroDVDFormat
 from pysubconv.formats.mpl2 import MPL2Format
 
-from pysubconv.utils.tokenizer import Tokenizer
+from pysubconv import convert
 
 metadata = Metadata()
 def convert_and_compare(from_format, to_format, text, expected=None):
-    cue = list(from_format.parse_cue(StringIO(text), metadata))
-    assert cue
-
     output = StringIO()
-    for c in cue:
-        c.tree = Tokenizer.tokenize(c)
-        to_format.write_cue(c, metadata, output)
+    assert convert(StringIO(text), from_format, to_format, output, metadata)
 
-    assert output.getvalue() == expected if expected else text
+    assert output.getvalue() == (expected if expected else text)
     output.close()
 
 def test_srt_srt():
-    with open('tests\\test_files\\srt_sample.txt') as f:
+    with open('tests/test_files/srt_sample.txt') as f:
         convert_and_compare(SrtFormat, SrtFormat, f.read())
 
 def test_mpl2_mpl2():
-    with open('tests\\test_files\\mpl2_sample.txt') as f:
+    with open('tests/test_files/mpl2_sample.txt') as f:
         convert_and_compare(MPL2Format, MPL2Format, f.read())
 
 def test_mdvd_mvdv():
-    with open('tests\\test_files\\mdvd_sample.txt') as f:
+    with open('tests/test_files/mdvd_sample.txt') as f:
         text = f.read()
 
-    with open('tests\\test_files\\mdvd_sample_expected.txt') as f:
+    with open('tests/test_files/mdvd_sample_expected.txt') as f:
         expected = f.read()
 
-    convert_and_compare(MicroDVDFormat, MicroDVDFormat, text, expected)
\ No newline at end of file
+    convert_and_compare(MicroDVDFormat, MicroDVDFormat, text, expected)
+
+def test_srt_time():
+    assert SrtFormat.parse_time('01:02:03,456') == 3723456
+    assert SrtFormat.parse_time('1:2:3,456') == 3723456
+    assert SrtFormat.parse_time('01:02:03.456') is None
+    assert SrtFormat.format_time(3723456) == '01:02:03,456'
+
+def test_exact_timings():
+    cue = next(MPL2Format.parse_cue(StringIO('[7][13]Hello!\n'), metadata))
+    assert (cue.start_ms, cue.end_ms) == (700, 1300)
+    assert cue.start.total_seconds() == 0.7
+
+    convert_and_compare(MPL2Format, MPL2Format, '[7][13]Hello!\n')
+    convert_and_compare(MPL2Format, SrtFormat, '[7][13]Hello!\n', '1\n00:00:00,700 --> 00:00:01,300\nHello!\n\n')
+    convert_and_compare(MicroDVDFormat, MicroDVDFormat, '{1}{100001}Hello!\n')
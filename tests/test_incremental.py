@@ -0,0 +1,49 @@
+import json
+import os
+from io import StringIO
+
+from pysubconv import convert
+from pysubconv.incremental import convert_incremental
+from pysubconv.utils.instrumentation import collect_stats
+from pysubconv.utils.tokenizer import Tokenizer
+
+def make_srt(texts):
+    return ''.join('{0}\n00:00:{0:02},000 --> 00:00:{0:02},500\n{1}\n\n'.format(i + 1, text) for i, text in enumerate(texts))
+
+def test_only_changed_cues_are_rendered(tmp_path, monkeypatch):
+    manifest = str(tmp_path / 'movie.srt.manifest')
+    texts = ['<i>Hello!</i>', 'How are you?', '<b>Fine</b>', 'Bye']
+
+    tokenized = []
+    tokenize = Tokenizer.tokenize
+    monkeypatch.setattr(Tokenizer, 'tokenize', lambda cue: tokenized.append(cue.text) or tokenize(cue))
+
+    for to_format in ('microdvd', 'srt'):
+        assert convert_incremental(StringIO(make_srt(texts)), 'srt', to_format, StringIO(), manifest) == 4
+    assert set(json.load(open(manifest))['targets']) == {'microdvd', 'srt'}
+
+    # one cue edited, one inserted and one deleted
+    texts = ['<i>Hello!</i>', 'New', 'How are you?', '<b>Fine!</b>']
+    for to_format in ('microdvd', 'srt'):
+        del tokenized[:]
+        output = StringIO()
+        with collect_stats() as stats:
+            assert convert_incremental(StringIO(make_srt(texts)), 'srt', to_format, output, manifest) == 4
+        assert stats.counters['incremental.reused'] == 2 and stats.counters['incremental.rendered'] == 2
+        assert sorted(tokenized) == ['<b>Fine!</b>', 'New']
+
+        expected = StringIO()
+        convert(StringIO(make_srt(texts)), 'srt', to_format, expected)
+        assert output.getvalue() == expected.getvalue()
+
+    assert len(json.load(open(manifest))['targets']['srt']) == 4
+
+def test_invalid_manifest_is_ignored(tmp_path):
+    manifest = str(tmp_path / 'manifest.json')
+    with open(manifest, 'w') as f:
+        f.write('{not json')
+
+    output = StringIO()
+    assert convert_incremental(StringIO('[0][25]/Hello!\n'), 'mpl2', 'srt', output, manifest) == 1
+    assert output.getvalue() == '1\n00:00:00,000 --> 00:00:02,500\n<i>Hello!</i>\n\n'
+    assert not [name for name in os.listdir(str(tmp_path)) if name.endswith('.part')]
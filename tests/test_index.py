@@ -0,0 +1,34 @@
+import random
+from datetime import timedelta
+from io import StringIO
+
+from pysubconv.formats.base import Cue
+from pysubconv.index import CueIndex
+
+def test_queries_match_linear_scan():
+    rng = random.Random(1)
+    cues = []
+    for i in range(500):
+        start = rng.randrange(0, 100000)
+        length = rng.choice([0, rng.randrange(1, 3000), rng.randrange(1, 60000)])
+        cues.append(Cue(i + 1, start, start + length, str(i)))
+    index = CueIndex(cues)
+    ordered = sorted(cues, key=lambda cue: cue.start_ms)
+
+    for time in [0, 50000, 99999, 200000] + [rng.randrange(0, 110000) for i in range(200)]:
+        assert index.at(time) == [cue for cue in ordered if cue.start_ms <= time < cue.end_ms]
+
+        end = time + rng.randrange(0, 10000)
+        # zero length cues are only found by the start of the range
+        assert index.between(time, end) == [cue for cue in ordered if time < end and
+                                            (cue.start_ms < end and cue.end_ms > time or time <= cue.start_ms < end)]
+
+def test_extract():
+    text = '[0][25]/Hello!\n[20][45]Hello!|How are you?\n[50][60]Bye\n'
+    index = CueIndex.read(StringIO(text))
+    assert [cue.index for cue in index.at(timedelta(seconds=2.2))] == [1, 2]
+
+    out = StringIO()
+    assert index.extract(timedelta(seconds=3), timedelta(seconds=6), 'srt', out, rebase=True) == 2
+    assert out.getvalue() == ('1\n00:00:00,000 --> 00:00:01,500\nHello!\nHow are you?\n\n'
+                              '2\n00:00:02,000 --> 00:00:03,000\nBye\n\n')
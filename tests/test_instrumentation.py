@@ -0,0 +1,42 @@
+from io import StringIO
+
+from pysubconv import convert
+from pysubconv.utils import instrumentation
+from pysubconv.utils.instrumentation import collect_stats
+
+def test_collect_stats():
+    reported = []
+    with open('tests/test_files/srt_sample.txt') as f, collect_stats(reported.append) as stats:
+        output = StringIO()
+        convert(f, 'srt', 'mpl2', output)
+
+    assert reported == [stats]
+    assert instrumentation.active.get() is None
+    assert stats.counters['parse.srt.cues'] == 9
+    assert stats.counters['write.mpl2.cues'] == 9
+    assert stats.counters['write.mpl2.chars'] == len(output.getvalue())
+    assert stats.counters['tokenize.tokens'] > 9
+    assert stats.counters['tokenize.regex_searches'] >= 9
+    assert set(stats.timers) == {'parse.srt', 'tokenize', 'write.mpl2'}
+
+def test_disabled_by_default():
+    with collect_stats() as stats:
+        pass
+
+    convert(StringIO('[0][25]/Hello!\n'), 'mpl2', 'srt', StringIO())
+    assert not stats.counters
+
+def test_stats_per_thread():
+    from threading import Thread
+
+    with collect_stats() as stats:
+        thread = Thread(target=convert, args=(StringIO('[0][25]/Hello!\n'), 'mpl2', 'srt', StringIO()))
+        thread.start()
+        thread.join()
+    assert not stats.counters
+
+    with collect_stats() as outer:
+        with collect_stats() as inner:
+            convert(StringIO('[0][25]/Hello!\n'), 'mpl2', 'srt', StringIO())
+        assert instrumentation.active.get() is outer
+    assert outer.counters == inner.counters and inner.counters['parse.mpl2.cues'] == 1
@@ -0,0 +1,69 @@
+from io import StringIO
+
+from pysubconv.formats.base import Cue, Metadata
+from pysubconv.merge import Track, merge, merge_cues
+from pysubconv.utils.token import StyleType
+
+SRT = '''1
+00:00:01,000 --> 00:00:04,000
+Hello
+there
+
+2
+00:00:05,000 --> 00:00:06,000
+<b>Bye</b>
+'''
+
+MDVD = '{50}{75}{y:i}Cześć|tam\n{100}{150}Pa\n'
+
+def tracks(style = None):
+    metadata = Metadata()
+    metadata.fps = 25
+    return [Track(StringIO(SRT)), Track(StringIO(MDVD), 'microdvd', metadata, style)]
+
+def test_merge():
+    output = StringIO()
+    assert merge(tracks(), 'mpl2', output) == 4
+    assert output.getvalue() == '[10][40]Hello|there\n[20][30]/Cześć|tam\n[40][60]Pa\n[50][60]Bye\n'
+
+    assert [cue.index for cue in merge_cues(tracks())] == [1, 2, 3, 4]
+
+def test_combine():
+    output = StringIO()
+    assert merge(tracks(StyleType.ITALICS_START), 'srt', output, combine=True) == 5
+    assert output.getvalue().split('\n\n')[1:5] == [
+        '2\n00:00:02,000 --> 00:00:03,000\nHello\nthere\n<i>Cześć</i>\n<i>tam</i>',
+        '3\n00:00:03,000 --> 00:00:04,000\nHello\nthere',
+        '4\n00:00:04,000 --> 00:00:05,000\n<i>Pa</i>',
+        '5\n00:00:05,000 --> 00:00:06,000\n<b>Bye</b>\n<i>Pa</i>',
+    ]
+
+    output = StringIO()
+    merge(tracks((StyleType.FONTCOLOR_START, (255, 255, 0))), 'microdvd', output, Metadata(), combine=True)
+    assert output.getvalue().split('\n')[1] == '{48}{72}Hello|there|{c:$00FFFF}{y:i}Cześć|{c:$00FFFF}tam'
+
+def test_merge_is_lazy():
+    read = [0, 0]
+    def cues(number):
+        for i in range(1000):
+            read[number] += 1
+            yield Cue(None, i * 1000 + number * 500, i * 1000 + number * 500 + 700, 'Track {0}'.format(number))
+
+    merged = merge_cues([cues(0), cues(1)], combine=True)
+    pieces = [next(merged) for i in range(10)]
+    assert max(read) <= 5
+
+    assert [(cue.start_ms, cue.end_ms, cue.text) for cue in pieces[:3]] == [
+        (0, 500, 'Track 0'), (500, 700, 'Track 0\nTrack 1'), (700, 1000, 'Track 1')]
+
+def test_combine_multiline_style():
+    metadata = Metadata()
+    metadata.fps = 25
+    srt = '1\n00:00:01,000 --> 00:00:02,000\n<b>Hello\n</b>there\n'
+    for to_format, expected in (('srt', '<i><b>Hello</b></i>\n<i>there</i>\n<i><b>a</b></i>\n<i><b>b</b></i>'),
+                                ('microdvd', '{y:i}{y:b}Hello|{y:i}there|{y:i}{Y:b}a|{y:i}{Y:b}b')):
+        output = StringIO()
+        merge([Track(StringIO(srt), style=StyleType.ITALICS_START),
+               Track(StringIO('{25}{50}{Y:b}a|b\n'), 'microdvd', metadata, StyleType.ITALICS_START)],
+              to_format, output, Metadata(), combine=True)
+        assert expected in output.getvalue()
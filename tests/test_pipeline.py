@@ -0,0 +1,94 @@
+from io import StringIO
+
+from pysubconv import convert, convert_many
+from pysubconv.formats.base import Metadata
+from pysubconv.formats.mpl2 import MPL2Format
+from pysubconv.formats.srt import SrtFormat
+from pysubconv.utils.instrumentation import collect_stats
+from pysubconv.utils.token import Token, flatten_tree, unflatten_tree
+from pysubconv.utils.tokenizer import Tokenizer
+
+class RecordingStream:
+    def __init__(self, consumed):
+        self.consumed = consumed
+        self.writes = []
+
+    def write(self, text):
+        self.writes.append((len(self.consumed), text))
+
+def test_convert_streams():
+    consumed = []
+    def lines():
+        for i in range(1000):
+            consumed.append(i)
+            yield '[{0}][{1}]/Hello!\n'.format(i * 10, i * 10 + 5)
+
+    out = RecordingStream(consumed)
+    assert convert(lines(), 'mpl2', 'microdvd', out, chunk_size=1024) == 1000
+
+    # output was written in chunks while the input was still being read
+    assert len(out.writes) > 10
+    assert out.writes[0][0] < 100
+    assert all(len(text) >= 1024 for consumed, text in out.writes[:-1])
+    assert ''.join(text for consumed, text in out.writes).startswith('{0}{12}{y:i}Hello!\n{24}{36}{y:i}Hello!\n')
+
+def test_convert_detects_format():
+    output = StringIO()
+    convert(StringIO('[0][25]/Hello!\n'), None, MPL2Format, output)
+    assert output.getvalue() == '[0][25]/Hello!\n'
+
+def test_parallel_tokenization():
+    for name in ('srt_sample.txt', 'srt_sample_mix.txt', 'mdvd_sample.txt'):
+        with open('tests/test_files/' + name) as f:
+            text = f.read() * 20
+
+        for to_format in ('srt', 'microdvd', 'mpl2'):
+            serial = StringIO()
+            parallel = StringIO()
+            convert(StringIO(text), None, to_format, serial)
+            with collect_stats() as stats:
+                count = convert(StringIO(text), None, to_format, parallel, jobs=2, job_chunk_size=7)
+            assert parallel.getvalue() == serial.getvalue()
+
+            # the workers write the output, the parent doesn't tokenize;
+            # MPL2 <-> MicroDVD is transcoded instead
+            if 'srt' in (to_format, name[:3]):
+                assert stats.counters['write.{0}.cues'.format(to_format)] == count > 0
+                assert 'render' in stats.timers and 'tokenize' not in stats.timers
+
+def test_flattened_trees():
+    with open('tests/test_files/srt_sample_mix.txt') as f:
+        for cue in SrtFormat.parse_cue(f, None):
+            root = Tokenizer.tokenize(cue)
+            copy = unflatten_tree(flatten_tree(root))
+            assert [repr(t) for t in Token.depth_first_generator(copy)] == [repr(t) for t in Token.depth_first_generator(root)]
+
+def test_convert_many():
+    with open('tests/test_files/srt_sample_mix.txt') as f:
+        text = f.read()
+    metadata = Metadata()
+    metadata.fps = 25
+
+    for threads in (False, True):
+        outputs = [StringIO(), StringIO(), StringIO(), StringIO()]
+        targets = [('srt', outputs[0]), ('microdvd', outputs[1]), ('microdvd', outputs[2], metadata), ('mpl2', outputs[3])]
+        with collect_stats() as stats:
+            assert convert_many(StringIO(text), None, targets, threads=threads) == stats.counters['parse.srt.cues']
+        assert stats.counters['write.microdvd.cues'] == 2 * stats.counters['parse.srt.cues']
+
+        for (to_format, out, *target_metadata), output in zip(targets, outputs):
+            expected = StringIO()
+            convert(StringIO(text), 'srt', to_format, expected, *target_metadata)
+            assert output.getvalue() == expected.getvalue()
+        assert outputs[1].getvalue() != outputs[2].getvalue()
+
+def test_convert_many_writer_error():
+    class FailingStream:
+        def write(self, text):
+            raise IOError('disk full')
+
+    try:
+        convert_many(StringIO('[0][25]/Hello!\n' * 1000), 'mpl2', [('srt', StringIO()), ('srt', FailingStream())], threads=True)
+        assert False
+    except IOError as e:
+        assert str(e) == 'disk full'
@@ -0,0 +1,101 @@
+from io import StringIO
+
+from pysubconv.cli import main
+from pysubconv.formats.base import Metadata
+from pysubconv.formats.microdvd import MicroDVDFormat
+from pysubconv.formats.mpl2 import MPL2Format
+from pysubconv.formats.srt import SrtFormat
+from pysubconv.pipeline import convert, convert_buffer
+from pysubconv.reader import map_file, parse_buffer, sniff_encoding
+
+POLISH = '{0}{25}Zażółć gęślą jaźń\n{30}{45}Źdźbło|łódź\n'
+RUSSIAN = '{0}{25}Съешь же ещё этих мягких французских булок\n'
+
+def get_cues(cues):
+    return [(cue.index, cue.start_ms, cue.end_ms, cue.text) for cue in cues]
+
+def test_sniff_encoding():
+    assert sniff_encoding(b'\xef\xbb\xbf[0][1]') == ('utf-8', 3)
+    assert sniff_encoding('﻿[0][1]'.encode('utf-16-le')) == ('utf-16-le', 2)
+    assert sniff_encoding('[0][1]Hello'.encode('utf-16-be')) == ('utf-16-be', 0)
+    assert sniff_encoding(POLISH.encode('utf-8')) == ('utf-8', 0)
+    assert sniff_encoding(POLISH.encode('cp1250')) == ('cp1250', 0)
+    assert sniff_encoding(RUSSIAN.encode('cp1251')) == ('cp1251', 0)
+
+def test_parse_buffer_matches_text_parser():
+    texts = [
+        (SrtFormat, open('tests/test_files/srt_sample_mix.txt').read()),
+        (MicroDVDFormat, open('tests/test_files/mdvd_sample_mix.txt').read()),
+        (MPL2Format, open('tests/test_files/mpl2_sample.txt').read()),
+        (MicroDVDFormat, POLISH + '  {50}{60} trailing \r\n'),
+        # unusual blocks are left to the line parser
+        (SrtFormat, '1\n\n0:0:1,000 --> 00:00:02,000 X1:10\n a \r\n b\n\n\n2\n00:00:03,000 --> 00:00:04,000\nżółw'),
+        # classic Mac line breaks
+        (MPL2Format, '[1][2]a\r[3][4]b\r'),
+        (MicroDVDFormat, '{1}{2}a\r\n{3}{4}b|c\r{5}{6}d'),
+        (SrtFormat, '1\r00:00:01,000 --> 00:00:02,000\ra\rb\r\r2\r00:00:03,000 --> 00:00:04,000\rc\r'),
+        # whitespace is stripped after decoding
+        (MPL2Format, '[1][2]Hello\u00a0\n[3][4]\u2003x\u3000 \n'),
+    ]
+    for from_format, text in texts:
+        for encoding in ('utf-8', 'utf-16'):
+            # as read from a file opened in text mode
+            expected = get_cues(from_format.parse_cue(StringIO(text, newline=None), Metadata()))
+            assert get_cues(parse_buffer(text.encode(encoding), from_format, Metadata())) == expected
+
+            # the transcoder reads the lines of the buffer too
+            output = StringIO()
+            convert(StringIO(text, newline=None), from_format, 'microdvd', output)
+            buffer_output = StringIO()
+            convert_buffer(text.encode(encoding), from_format, 'microdvd', buffer_output)
+            assert buffer_output.getvalue() == output.getvalue()
+
+def test_unicode_blank_lines():
+    for blank in ('\u00a0', ' \u00a0 ', '\u2003', '\u3000', '\x1c'):
+        text = '1\n00:00:01,000 --> 00:00:02,000\nA\n{0}\n2\n00:00:03,000 --> 00:00:04,000\n{0}\n3\n00:00:05,000 --> 00:00:06,000\nB\n'.format(blank)
+        for encoding in ('utf-8', 'utf-16', 'cp1250'):
+            try:
+                data = text.encode(encoding)
+            except UnicodeEncodeError:
+                continue
+
+            expected = StringIO()
+            output = StringIO()
+            assert convert(StringIO(text), 'srt', 'srt', expected) == 3
+            assert convert_buffer(data, 'srt', 'srt', output, encoding=encoding) == 3
+            assert output.getvalue() == expected.getvalue()
+
+def test_lines_left_to_the_line_parser():
+    for from_format, text in ((MPL2Format, '[0][10]A\n\u00a0[10][20]B\n\u2003 [20][30]C'),
+                              (MicroDVDFormat, '\u00a0{0}{10}A\n{10}{20}B\n')):
+        for encoding in ('utf-8', 'cp1250'):
+            try:
+                data = text.encode(encoding)
+            except UnicodeEncodeError:
+                continue
+            expected = get_cues(from_format.parse_cue(StringIO(text), Metadata()))
+            assert get_cues(parse_buffer(data, from_format, Metadata(), encoding)) == expected
+
+def test_invalid_line():
+    try:
+        list(parse_buffer(b'[0][25]Hello!\nHello!\n', MPL2Format, Metadata()))
+        assert False
+    except Exception as e:
+        assert str(e) == 'Invalid line format: Hello!'
+
+def test_convert_mapped_file(tmp_path):
+    path = str(tmp_path / 'polish.sub')
+    with open(path, 'w', encoding='cp1250') as f:
+        f.write(POLISH)
+
+    with map_file(path) as buffer:
+        output = StringIO()
+        assert convert_buffer(buffer, None, 'microdvd', output) == 2
+
+    expected = StringIO()
+    convert(StringIO(POLISH), 'microdvd', 'microdvd', expected)
+    assert output.getvalue() == expected.getvalue()
+
+    assert main([path, '-t', 'mpl2', '-q']) == 0
+    with open(str(tmp_path / 'polish.txt'), encoding='utf-8') as f:
+        assert f.read().startswith('[0][10]Zażółć gęślą jaźń\n')
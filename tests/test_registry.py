@@ -0,0 +1,45 @@
+from io import StringIO
+
+import regex as re
+
+from pysubconv.formats import format_registry
+from pysubconv.formats.base import Cue, SubtitleFormat
+from pysubconv.formats.registry import FormatRegistry
+from pysubconv.formats.srt import SrtFormat
+from pysubconv.formats.microdvd import MicroDVDFormat
+from pysubconv.formats.mpl2 import MPL2Format
+from pysubconv.utils.token import StyleToken, StyleType
+from pysubconv.utils.tokenizer import Tokenizer
+
+def test_lookup():
+    assert format_registry.get('srt') == SrtFormat
+    assert format_registry.get('MicroDVD') == MicroDVDFormat
+    assert format_registry.get_by_extension('.srt') == [SrtFormat]
+    assert format_registry.get_by_extension('TXT') == [MicroDVDFormat, MPL2Format]
+    assert list(format_registry) == [MicroDVDFormat, MPL2Format, SrtFormat]
+
+class StarFormat(SubtitleFormat):
+    style_re = re.compile(r'\*')
+    style_patterns = ((style_re, 'process_style'),)
+
+    @classmethod
+    def process_style(cls, match, current):
+        return current.append(StyleToken(cls, StyleType.BOLD_START))
+
+def test_third_party_format():
+    registry = FormatRegistry()
+    for sf in format_registry:
+        registry.register(sf, sf.name, sf.extensions)
+    registry.register(StarFormat, 'star', ['.star'])
+
+    cue = Cue(1, None, None, '*Hello!')
+    output = StringIO()
+    try:
+        Tokenizer.registry = registry
+        cue.tree = Tokenizer.tokenize(cue)
+    finally:
+        Tokenizer.registry = format_registry
+
+    MicroDVDFormat.write_tokens(cue.tree.depth_first_generator(cue.tree), output)
+    assert output.getvalue() == '{y:b}Hello!'
+    assert registry.get_by_extension('.star') == [StarFormat]
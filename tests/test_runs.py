@@ -0,0 +1,102 @@
+from io import StringIO
+
+import pytest
+
+from pysubconv import convert
+from pysubconv.formats import format_registry
+from pysubconv.formats.base import Cue, Metadata, SubtitleFormat
+from pysubconv.formats.detect import detect_format
+from pysubconv.pipeline import STYLE_MODELS, convert_cues
+from pysubconv.utils.runs import StyleRuns
+from pysubconv.utils.token import Token
+from pysubconv.utils.tokenizer import Tokenizer
+
+TEXTS = [
+    '', 'Hello\nthere', 'a\n\nb', '<i>abc', '<i><b>x</i>y</b>', '<i>a\nb</i>\nc', '<i>Hello\n</i>World',
+    '<font color="#0080FF"><font face="Arial"><i>x</i></font></font> y',
+    '{y:i,b}a\nb', '{Y:i}a\nb', '{c:$0000FF}{y:i}a\n{y:b}b', '/a\n/b',
+]
+
+# runs write the tags of the style changes between texts, not the tags of the
+# text, so they differ from the tree where styles are empty, repeated or
+# closed out of order
+REWRITTEN = [
+    ('<i></i>x', 'x', 'x', 'x'),
+    ('<i>a</i><i>b</i>', '<i>ab</i>', '{y:i}ab', '/ab'),
+    ('<b><i>x</b></i>', '<b><i>x</i></b>', '{y:b}{y:i}x', '/x'),
+    ('<i>a<i>b</i>c</i>', '<i>abc</i>', '{y:i}abc', '/abc'),
+    ('<font color="#FF0000">a<font color="#0000FF">b</font>c</font>',
+     '<font color="#FF0000">a</font><font color="#0000FF">b</font>c', '{c:$0000FF}abc', 'abc'),
+]
+
+def write(sf, runs):
+    output = StringIO()
+    sf.write_runs(runs, output)
+
+    # formats without write_runs get the tokens of the runs
+    fallback = StringIO()
+    SubtitleFormat.write_runs.__func__(sf, runs, fallback)
+    assert fallback.getvalue() == output.getvalue(), sf.name
+    return output.getvalue()
+
+def test_writers_match_tree():
+    for text in TEXTS:
+        tree = Tokenizer.tokenize(Cue(None, 0, 0, text))
+        runs = StyleRuns.from_cue(Cue(None, 0, 0, text))
+        assert runs.text == StyleRuns.from_tree(tree).text
+        assert [run[:3] for run in runs.runs] == [run[:3] for run in StyleRuns.from_tree(tree).runs], text
+        for sf in format_registry:
+            expected = StringIO()
+            sf.write_tokens(Token.depth_first_generator(tree), expected)
+            assert write(sf, runs) == expected.getvalue(), (text, sf.name)
+
+def test_rewritten_styles():
+    for text, srt, microdvd, mpl2 in REWRITTEN:
+        runs = StyleRuns.from_cue(Cue(None, 0, 0, text))
+        outputs = {sf.name: write(sf, runs) for sf in format_registry}
+        assert outputs == {'srt': srt, 'microdvd': microdvd, 'mpl2': mpl2}, text
+
+def test_runs():
+    cue = Cue(None, 0, 0, '<i><b>x</i>y</b>')
+    runs = StyleRuns.from_cue(cue)
+    italic, bold = runs.runs[0][3]
+    assert runs.text == 'xy'
+    assert [run[:3] for run in runs.runs] == [(0, 1, 0b110), (1, 1, 0b100), (2, 0, 0)]
+    assert runs.runs[1][3] == (bold,) and runs.runs[2][3] == ()
+
+    # the text is scanned without a tree, the start tokens are not linked to any
+    assert not cue.is_tokenized
+    assert italic.parent is None and italic.children == () and bold.children == ()
+
+    # a nested start of an active kind replaces its data until its end
+    runs = StyleRuns.from_cue(Cue(None, 0, 0, '<font color="#FF0000">a<font color="#0000FF">b</font>c'))
+    assert [(run[:3], [token.style_data for token in run[3]]) for run in runs.runs] == [
+        ((0, 1, 0b1000000), [(255, 0, 0)]), ((1, 1, 0b1000000), [(0, 0, 255)]), ((2, 1, 0), [])]
+
+    cue = Cue(None, 0, 0, 'Hello\nthere')
+    runs = StyleRuns.from_cue(cue)
+    assert runs.text is cue.text and runs.runs == [(0, 11, 0, ())]
+    assert not cue.is_tokenized
+
+def test_convert_style_model():
+    for name in ('srt_sample.txt', 'srt_sample_mix.txt', 'mdvd_sample.txt', 'mdvd_sample_mix.txt', 'mpl2_sample.txt'):
+        with open('tests/test_files/' + name) as f:
+            text = f.read()
+
+        from_format = detect_format(StringIO(text))[0]
+        for to_format in format_registry:
+            # convert_cues, convert would transcode MPL2 <-> MicroDVD without either model
+            outputs = []
+            for style_model in STYLE_MODELS:
+                output = StringIO()
+                convert_cues(from_format.parse_cue(StringIO(text), Metadata()), from_format, to_format, output, Metadata(),
+                             style_model=style_model)
+                outputs.append(output.getvalue())
+            assert outputs[0] == outputs[1]
+
+            output = StringIO()
+            convert(StringIO(text), None, to_format, output, style_model='runs', jobs=2, job_chunk_size=2)
+            assert output.getvalue() == outputs[0]
+
+    with pytest.raises(Exception, match='Unknown style model'):
+        convert(StringIO('1\n00:00:01,000 --> 00:00:02,000\nHi\n'), 'srt', 'srt', StringIO(), style_model='spans')
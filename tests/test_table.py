@@ -0,0 +1,48 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pysubconv import convert
+from pysubconv.formats.base import Metadata
+from pysubconv.table import CueTable
+
+TEXT = '[0][25]/Hello!\n[30][45]Hello!|How are you?\n'
+
+def test_retiming():
+    table = CueTable.read(StringIO(TEXT))
+    assert table.start.tolist() == [0, 3000] and table.end.tolist() == [2500, 4500]
+
+    table.shift(timedelta(seconds=-1))
+    assert table.start.tolist() == [0, 2000] and table.end.tolist() == [1500, 3500]
+
+    table.scale(2, origin=1000)
+    assert table.start.tolist() == [0, 3000] and table.end.tolist() == [2000, 6000]
+
+    table.sync(0, 1000, 3000, 7000)
+    assert table.start.tolist() == [1000, 7000] and table.end.tolist() == [5000, 13000]
+
+def test_convert_fps_keeps_frames():
+    metadata = Metadata()
+    table = CueTable.read(StringIO('{0}{25}Hello!\n{1000}{1100}Hello!\n'), 'microdvd', metadata)
+    table.convert_fps(metadata.fps, 25)
+
+    metadata.fps = 25
+    out = StringIO()
+    assert table.write('microdvd', out, metadata) == 2
+    assert out.getvalue() == '{0}{25}Hello!\n{1000}{1100}Hello!\n'
+
+def test_write_matches_convert():
+    for name in ('srt_sample_mix.txt', 'mdvd_sample_mix.txt'):
+        with open('tests/test_files/' + name) as f:
+            text = f.read()
+
+        table = CueTable.read(StringIO(text))
+        for to_format in ('srt', 'microdvd', 'mpl2'):
+            expected = StringIO()
+            convert(StringIO(text), None, to_format, expected)
+            out = StringIO()
+            table.write(to_format, out)
+            assert out.getvalue() == expected.getvalue()
@@ -0,0 +1,104 @@
+import sys
+from io import StringIO
+from contextlib import redirect_stdout
+
+from pysubconv.formats.base import Metadata, Cue
+from pysubconv.formats.detect import detect_format
+from pysubconv.formats.srt import SrtFormat
+from pysubconv.utils.token import StyleToken, StyleType, Token, flatten_tree
+from pysubconv.utils.tokenizer import Tokenizer
+
+def compare_trees(name):
+    with open('tests/test_files/' + name + '.txt') as f:
+        sf, stream = detect_format(f)
+        output = StringIO()
+        with redirect_stdout(output):
+            for c in sf.parse_cue(stream, Metadata()):
+                Tokenizer.tokenize(c).print_tree()
+
+    with open('tests/test_files/' + name + '_tree.txt') as f:
+        assert output.getvalue() == f.read()
+
+def test_srt_trees():
+    compare_trees('srt_sample')
+    compare_trees('srt_sample_mix')
+
+def test_mdvd_trees():
+    compare_trees('mdvd_sample')
+    compare_trees('mdvd_sample_mix')
+
+def test_mpl2_trees():
+    compare_trees('mpl2_sample')
+
+def test_mpl2_style_after_closed_style():
+    root = Tokenizer.tokenize(Cue(1, None, None, '<i>a</i>/b/c'))
+    assert [repr(t) for t in root.depth_first_generator(root)] == [
+        '[ROOT]',
+        '[STYLE][ITALICS_START, None, None]',
+        '[TEXT][a]',
+        '[STYLE][ITALICS_END, None, None]',
+        '[STYLE][ITALICS_START, None, None]',
+        '[TEXT][b/c]',
+        '[STYLE][ITALICS_END, None, None]',
+        '[END]',
+    ]
+
+def test_shared_tokens():
+    first = Tokenizer.tokenize(Cue(1, None, None, '{y:i}Hello!\nHow are you?'))
+    second = Tokenizer.tokenize(Cue(2, None, None, '{y:i}Hello!\nHow are you?'))
+
+    # closing style, newline and end
+    for index in (1, 2, 4):
+        assert first.children[index] is second.children[index]
+    assert first.children[3] is not second.children[3]
+    assert not hasattr(first.children[0], '__dict__')
+    assert first.children[2].children == ()
+
+    # closing tokens with style data and opening tokens aren't interned
+    color = StyleToken.shared(None, StyleType.FONTCOLOR_END, (255, 0, 0))
+    assert color is not StyleToken.shared(None, StyleType.FONTCOLOR_END, (255, 0, 0))
+    assert StyleToken.shared(None, StyleType.ITALICS_START) is not StyleToken.shared(None, StyleType.ITALICS_START)
+
+    try:
+        first.children[2].parent = first
+    except AttributeError:
+        pass
+    else:
+        assert False
+
+def test_walk_events():
+    root = Tokenizer.tokenize(Cue(1, None, None, '<b>Hello!</b>'))
+    events = [(event.name, token.type.name) for event, token in Token.walk(root)]
+    assert events == [
+        ('ENTER', 'ROOT'),
+        ('ENTER', 'STYLE'), ('ENTER', 'TEXT'), ('EXIT', 'TEXT'), ('EXIT', 'STYLE'),
+        ('ENTER', 'STYLE'), ('EXIT', 'STYLE'),
+        ('ENTER', 'END'), ('EXIT', 'END'),
+        ('EXIT', 'ROOT'),
+    ]
+
+def test_deep_nesting():
+    depth = sys.getrecursionlimit() * 2
+    cue = Cue(1, None, None, '{y:i}' * depth + 'Hello!')
+    cue.tree = Tokenizer.tokenize(cue)
+
+    output = StringIO()
+    SrtFormat.write_tokens(Token.depth_first_generator(cue.tree), output)
+    assert output.getvalue() == '<i>' * depth + 'Hello!' + '</i>' * depth
+
+def test_plain_text_fast_path(monkeypatch):
+    texts = ['Hello!', 'Hello!\nHow are you?', '\nHello!\n\n', '', 'a > b, 50% off!']
+    fast = [flatten_tree(Tokenizer.tokenize(Cue(1, 0, 0, text))) for text in texts]
+
+    monkeypatch.setattr(Tokenizer.registry, 'trigger_chars', None)
+    assert fast == [flatten_tree(Tokenizer.tokenize(Cue(1, 0, 0, text))) for text in texts]
+
+def test_lazy_tree():
+    cue = Cue(1, 0, 0, '<i>Hello!</i>')
+    assert not cue.is_tokenized
+    tree = cue.tree
+    assert cue.is_tokenized and cue.tree is tree
+
+    cue.text = 'Hello!'
+    assert not cue.is_tokenized
+    assert flatten_tree(cue.tree) == flatten_tree(Tokenizer.tokenize(cue))
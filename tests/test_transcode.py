@@ -0,0 +1,48 @@
+import random
+from io import StringIO
+
+from pysubconv import convert
+from pysubconv.formats.base import Metadata
+from pysubconv.formats.microdvd import MicroDVDFormat
+from pysubconv.formats.mpl2 import MPL2Format
+from pysubconv.pipeline import convert_buffer, convert_cues
+from pysubconv.utils.instrumentation import collect_stats
+
+PARTS = ['', 'Hello!', '/Hello!', '//Hello', ' /Hello', 'a/b', '{y:i}Hello!', '{Y:i}Hello!', '{y:i}/Hello',
+         '{y:b}Hello', '{y:i,b}Hello', 'Hello {y:i}there', '<i>Hello</i>', '{c:$0000FF}Hello', '{i}Hello{/i}']
+
+def generate(format_class, lines):
+    rng = random.Random(2)
+    template = '[{0}][{1}]{2}\n' if format_class is MPL2Format else '{{{0}}}{{{1}}}{2}\n'
+    text = ''
+    for i in range(lines):
+        parts = [rng.choice(PARTS) for j in range(rng.randrange(1, 4))]
+        text += template.format(i * 37, i * 37 + rng.randrange(0, 50), '|'.join(parts))
+    return text
+
+def test_same_output_as_general_path():
+    for from_format, to_format in ((MPL2Format, MicroDVDFormat), (MicroDVDFormat, MPL2Format)):
+        text = generate(from_format, 500)
+        expected = StringIO()
+        convert_cues(from_format.parse_cue(StringIO(text), Metadata()), from_format, to_format, expected, Metadata())
+
+        output = StringIO()
+        with collect_stats() as stats:
+            assert convert(StringIO(text), from_format, to_format, output) == 500
+        assert output.getvalue() == expected.getvalue()
+        assert 0 < stats.counters['transcode.fallbacks'] < 500
+
+        # nothing to tokenize in parallel, jobs don't turn the transcoder off
+        output = StringIO()
+        with collect_stats() as stats:
+            assert convert(StringIO(text), from_format, to_format, output, jobs=2) == 500
+            assert convert_buffer(text.encode('utf-8'), from_format, to_format, StringIO(), jobs=2) == 500
+        assert output.getvalue() == expected.getvalue()
+        assert 'tokenize' not in stats.timers and stats.counters['transcode.fallbacks'] > 0
+
+def test_invalid_line():
+    try:
+        convert(StringIO('[0][25]Hello!\nHello!\n'), 'mpl2', 'microdvd', StringIO())
+        assert False
+    except Exception as e:
+        assert str(e) == 'Invalid line format: Hello!'
@@ -0,0 +1,90 @@
+import os
+from io import StringIO
+
+from pysubconv import convert
+from pysubconv.cli import main
+from pysubconv.formats.base import Cue, Metadata
+from pysubconv.formats.microdvd import MicroDVDFormat
+from pysubconv.validate import Validator
+
+SRT = '''1
+00:00:01,000 --> 00:00:03,000
+A
+
+3
+00:00:02,000 --> 00:00:04,000
+B
+
+2
+00:00:00,500 --> 00:00:00,400
+C
+
+4
+00:00:05,000 --> 00:00:05,000
+D
+'''
+
+def kinds(report):
+    return [(issue.position, issue.kind, issue.fixed) for issue in report.issues]
+
+def test_check_keeps_cues():
+    validator = Validator()
+    output = StringIO()
+    assert convert(StringIO(SRT), 'srt', 'srt', output, validator=validator) == 4
+    assert output.getvalue() == SRT + '\n'
+
+    report = validator.report
+    assert kinds(report) == [(2, 'index', False), (2, 'overlap', False), (3, 'negative', False), (3, 'order', False),
+                             (3, 'index', False), (4, 'zero_length', False), (4, 'index', False)]
+    assert not report.ok and report.cues == 4
+    assert report.as_dict()['counts'] == {'index': 3, 'overlap': 1, 'negative': 1, 'order': 1, 'zero_length': 1}
+
+def test_fix():
+    validator = Validator(fix=True)
+    output = StringIO()
+    convert(StringIO(SRT), 'srt', 'mpl2', output, validator=validator)
+    assert output.getvalue() == '[4][5]C\n[10][20]A\n[20][40]B\n[50][50]D\n'
+
+    report = validator.report
+    assert report.ok
+    assert all(issue.fixed for issue in report.issues if issue.kind != 'zero_length')
+
+def test_reorder_window():
+    cues = [Cue(None, i * 1000, i * 1000 + 500, str(i)) for i in range(10)]
+    cues.insert(6, cues.pop(1))
+    validator = Validator(fix=True, window=2)
+    fixed = list(validator.validate(cues))
+
+    # the cue 5 positions late can't be moved back through a window of 2
+    assert [cue.text for cue in fixed] == ['0', '2', '3', '4', '1', '5', '6', '7', '8', '9']
+    assert [cue.index for cue in fixed] == list(range(1, 11))
+    assert kinds(validator.report) == [(7, 'order', False)]
+
+    validator = Validator(fix=True, window=8)
+    assert [cue.text for cue in validator.validate(cues)] == [str(i) for i in range(10)]
+    assert validator.report.ok
+
+def test_frame_rate():
+    # frames made at 60 fps, read at 23.976: every cue looks 2.5 times longer
+    lines = ['{{{0}}}{{{1}}}Short line\n'.format(i * 300 + 300, i * 300 + 400) for i in range(30)]
+    validator = Validator()
+    list(validator.validate(MicroDVDFormat.parse_cue(lines, Metadata()), MicroDVDFormat, Metadata()))
+    assert [str(issue) for issue in validator.report.issues] == [
+        'file: fps: median reading speed is 2.4 characters per second at 23.976 fps, 60 fps may be right']
+
+    validator = Validator()
+    list(validator.validate(MicroDVDFormat.parse_cue(['{1}{1}25.000\n'] + lines, Metadata()), MicroDVDFormat, Metadata()))
+    assert [str(issue) for issue in validator.report.issues] == ['file: fps: declares 25.0 fps, read at 23.976 fps']
+
+def test_cli(tmp_path, capsys):
+    path = str(tmp_path / 'a.srt')
+    with open(path, 'w') as f:
+        f.write(SRT)
+
+    assert main([path, '-t', 'microdvd', '--validate', '-q']) == 1
+    assert not os.path.exists(str(tmp_path / 'a.sub'))
+    assert 'cue 2: overlap: starts at 2000 ms, before cue 1 ends at 3000 ms' in capsys.readouterr().err
+
+    assert main([path, '-t', 'microdvd', '--fix', '-q']) == 0
+    with open(str(tmp_path / 'a.sub')) as f:
+        assert f.read().startswith('{10}{12}C\n')